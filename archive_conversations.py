@@ -0,0 +1,99 @@
+"""
+archive_conversations.py
+
+Moves cold conversations out of DynamoDB. Every conversation whose updated_at
+is older than CONVERSATION_ARCHIVE_DAYS (or --days) is written to the S3
+bucket as one gzipped JSONL object, its ConversationMessages items are
+deleted, and the Conversations header is kept as a small stub pointing at the
+archive. Opening an archived conversation reads it back from S3, and
+continuing it moves it back into DynamoDB.
+
+Run periodically (e.g. a nightly cron / scheduled task):
+    python archive_conversations.py --days 90
+    python archive_conversations.py --dry-run
+"""
+import argparse
+import datetime
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from config import CONVERSATION_ARCHIVE_DAYS
+from aws.dynamodb import (
+    conversations_table, get_conversation, archive_key, encode_archive, delete_message_items
+)
+from aws.s3 import put_s3_object
+
+
+def idle_conversations(cutoff_iso):
+    """Yields header keys of live (not yet archived) conversations last updated before the cutoff."""
+    kwargs = {
+        "FilterExpression":     Attr("updated_at").lt(cutoff_iso) & Attr("archived_key").not_exists(),
+        "ProjectionExpression": "conv_id, uid, updated_at",
+    }
+    while True:
+        resp = conversations_table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def archive_conversation(uid, conv_id, seen_updated_at) -> int:
+    """Archives one conversation; returns the compressed size in bytes (0 if skipped)."""
+    conv = get_conversation(uid, conv_id)
+    if not conv or not conv.get("messages"):
+        return 0
+    key  = archive_key(uid, conv_id)
+    body = encode_archive(conv["messages"])
+    put_s3_object(key, body, content_type="application/gzip")
+
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    try:
+        # Only stub it if nobody wrote a new turn while the archive was uploading
+        conversations_table.update_item(
+            Key={"conv_id": conv_id, "uid": uid},
+            UpdateExpression="SET archived_key = :k, archived_at = :a, message_count = :n REMOVE messages",
+            ConditionExpression="updated_at = :seen",
+            ExpressionAttributeValues={
+                ":k": key, ":a": now, ":n": len(conv["messages"]), ":seen": seen_updated_at,
+            },
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            print(f"  ↪ {conv_id} changed during archival — left in DynamoDB")
+            return 0
+        raise
+    delete_message_items(conv_id)
+    return len(body)
+
+
+def main(days: int, dry_run: bool):
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    cutoff_iso = cutoff.isoformat()
+    print(f"Archiving conversations idle since before {cutoff_iso}{' (dry run)' if dry_run else ''}...")
+
+    archived, failed, total_bytes = 0, 0, 0
+    for header in idle_conversations(cutoff_iso):
+        if dry_run:
+            print(f"  would archive {header['conv_id']} (updated {header['updated_at']})")
+            archived += 1
+            continue
+        try:
+            size = archive_conversation(header["uid"], header["conv_id"], header["updated_at"])
+            if size:
+                archived += 1
+                total_bytes += size
+        except Exception as e:
+            failed += 1
+            print(f"  ❌ {header['conv_id']}: {e}")
+
+    print(f"✅ Archived {archived} conversation(s), {total_bytes / 1024:.1f} KB in S3, {failed} failure(s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=CONVERSATION_ARCHIVE_DAYS, help="Idle age before archiving")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be archived")
+    args = parser.parse_args()
+    main(args.days, args.dry_run)
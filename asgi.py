@@ -0,0 +1,5 @@
+from sc_assistant.asgi import create_asgi_app
+
+# Async serving mode: /chat/get streams on the event loop, everything else is the Flask app
+#   gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8080 asgi:app
+app = create_asgi_app()
@@ -8,8 +8,10 @@ from config import COGNITO_USER_POOL_ID, COGNITO_CLIENT_ID, AWS_REGION
 
 # Ensure you add COGNITO_CLIENT_SECRET to your config.py and .env
 from config import COGNITO_CLIENT_SECRET 
+from src.metrics import instrument_boto3
 
 cognito_client = boto3.client("cognito-idp", region_name=AWS_REGION)
+instrument_boto3(cognito_client)
 
 COGNITO_ERROR_MESSAGES = {
     "UsernameExistsException": "This username or email is already registered. Please try logging in.",
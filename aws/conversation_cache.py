@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from config import CONVERSATION_CACHE_SIZE
+from src.metrics import count_cache
+from src.memory import memory_registry, approx_bytes, evict_oldest
+
+# ====== Conversation Cache ======
+# Per-worker, write-through LRU of full conversations keyed by (uid, conv_id).
+# Every entry carries the conversation's updated_at as its version: the worker
+# that finishes a turn caches exactly what it queued for DynamoDB, and the next
+# turn only re-reads DynamoDB if the version it expects (kept in the user's
+# session cookie, so it follows the user across workers) is different. That
+# read is version-checked as well: an older copy is re-read until the expected
+# version lands, never cached or served (sc_assistant.chat.load_conversation).
+
+
+class ConversationCache:
+    def __init__(self, max_entries: int = CONVERSATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+
+    def get(self, uid: str, conv_id: str, version: Optional[str] = None) -> Optional[dict]:
+        """Cached conversation, or None on a miss or when it is not at `version` (if given)."""
+        key = (uid, conv_id)
+        with self._lock:
+            conv = self._entries.get(key)
+            if conv is None:
+                self._misses += 1
+                count_cache("conversation", "miss")
+                return None
+            if version is not None and conv.get("updated_at") != version:
+                self._stale += 1
+                count_cache("conversation", "stale")
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            count_cache("conversation", "hit")
+            return conv
+
+    def put(self, conv: dict):
+        """Stores a full conversation (header fields + every message); older versions are ignored."""
+        key = (conv["uid"], conv["conv_id"])
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and (current.get("updated_at") or "") > (conv.get("updated_at") or ""):
+                return
+            self._entries[key] = conv
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, uid: str, conv_id: str):
+        with self._lock:
+            self._entries.pop((uid, conv_id), None)
+
+    def memory_usage(self):
+        with self._lock:
+            return len(self._entries), approx_bytes(self._entries)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses + self._stale
+            return {
+                "entries":  len(self._entries),
+                "hits":     self._hits,
+                "misses":   self._misses,
+                "stale":    self._stale,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else None,
+            }
+
+
+conversation_cache = ConversationCache()
+memory_registry.register(
+    "conversation_cache", conversation_cache.memory_usage,
+    evict_oldest(conversation_cache._entries, conversation_cache._lock),
+)
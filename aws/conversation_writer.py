@@ -0,0 +1,238 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import PERSIST_FLUSH_INTERVAL_S, PERSIST_BATCH_SIZE, PERSIST_MAX_ATTEMPTS
+from aws.dynamodb import put_conversations
+from src.memory import memory_registry, approx_bytes
+
+logger = logging.getLogger(__name__)
+
+# ====== Write-behind Conversation Persistence ======
+# The end of a chat stream used to block on a DynamoDB put_item. Finished turns
+# are now handed to a per-worker queue instead: a background thread writes them
+# in BatchWriteItem batches, retries failures with backoff, and, when several
+# turns of the same conversation are waiting, only writes the newest version.
+# The queue is drained when the worker shuts down gracefully.
+#
+# Items come from aws.dynamodb.conversation_item: the full history plus how many
+# of its messages are already stored ("persisted"). Coalescing two versions keeps
+# the lower of the two so no appended message is skipped.
+#
+# The next turn of a conversation may land on another worker before this queue
+# flushes. It then waits for the version its session expects to show up in
+# DynamoDB (see sc_assistant.chat.read_current_conversation) instead of building
+# on an older copy, which would overwrite the queued turn's messages.
+
+ConvKey = Tuple[str, str]   # (uid, conv_id)
+
+
+class _Pending:
+    __slots__ = ("item", "enqueued_at", "attempts", "not_before")
+
+    def __init__(self, item: dict, enqueued_at: float):
+        self.item = item
+        self.enqueued_at = enqueued_at
+        self.attempts = 0
+        self.not_before = 0.0
+
+
+class ConversationWriter:
+    def __init__(
+        self,
+        write_batch: Callable[[List[dict]], None],
+        flush_interval_s: float = PERSIST_FLUSH_INTERVAL_S,
+        batch_size: int = PERSIST_BATCH_SIZE,
+        max_attempts: int = PERSIST_MAX_ATTEMPTS,
+    ):
+        """
+        :param write_batch: writes a list of conversation items (raises on failure)
+        :param flush_interval_s: how long the first queued write waits for others to batch with
+        :param batch_size: most items written per call
+        :param max_attempts: attempts before a write is dropped (and logged)
+        """
+        self.write_batch = write_batch
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+        self._cond = threading.Condition()
+        self._pending: "OrderedDict[ConvKey, _Pending]" = OrderedDict()
+        self._inflight: Dict[ConvKey, dict] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self._latencies = deque(maxlen=200)
+        self._submitted = 0
+        self._coalesced = 0
+        self._written = 0
+        self._batches = 0
+        self._retries = 0
+        self._dropped = 0
+
+    @staticmethod
+    def _key(item: dict) -> ConvKey:
+        return item["uid"], item["conv_id"]
+
+    @staticmethod
+    def _merge(older: dict, newer: dict) -> dict:
+        if older.get("persisted", 0) < newer.get("persisted", 0):
+            newer = dict(newer, persisted=older["persisted"])
+        if older.get("rehydrated_from") and not newer.get("rehydrated_from"):
+            newer = dict(newer, rehydrated_from=older["rehydrated_from"])
+        return newer
+
+    def submit(self, item: dict):
+        """Queues a conversation item; replaces any older queued version of it."""
+        key = self._key(item)
+        with self._cond:
+            self._submitted += 1
+            entry = self._pending.get(key)
+            if entry is not None:
+                self._coalesced += 1
+                entry.item = self._merge(entry.item, item)
+                entry.attempts = 0
+                entry.not_before = 0.0
+            else:
+                self._pending[key] = _Pending(item, time.monotonic())
+            self._ensure_started()
+            self._cond.notify_all()
+
+    def pending_item(self, uid: str, conv_id: str) -> Optional[dict]:
+        """The newest not-yet-persisted version of a conversation, if any (read-your-writes)."""
+        with self._cond:
+            entry = self._pending.get((uid, conv_id))
+            if entry is not None:
+                return entry.item
+            return self._inflight.get((uid, conv_id))
+
+    def discard(self, uid: str, conv_id: str):
+        """Drops a queued write, e.g. because the conversation is being deleted."""
+        with self._cond:
+            self._pending.pop((uid, conv_id), None)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name="conversation-writer")
+            self._thread.start()
+
+    def _next_batch(self) -> List[Tuple[ConvKey, _Pending]]:
+        """Blocks until a batch is due. Called with the condition held."""
+        while True:
+            now = time.monotonic()
+            ready = [(k, e) for k, e in self._pending.items() if e.not_before <= now]
+            if ready:
+                oldest = min(e.enqueued_at for _, e in ready)
+                batch_due = (
+                    self._stopping
+                    or len(ready) >= self.batch_size
+                    or now - oldest >= self.flush_interval_s
+                )
+                if batch_due:
+                    batch = ready[:self.batch_size]
+                    for key, _ in batch:
+                        del self._pending[key]
+                    return batch
+                wait = self.flush_interval_s - (now - oldest)
+            elif self._pending:
+                wait = min(e.not_before for e in self._pending.values()) - now
+            else:
+                wait = None
+            self._cond.wait(timeout=None if wait is None else max(0.01, wait))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+                for key, entry in batch:
+                    self._inflight[key] = entry.item
+
+            start = time.monotonic()
+            error = None
+            try:
+                self.write_batch([entry.item for _, entry in batch])
+            except Exception as e:
+                error = e
+            elapsed = time.monotonic() - start
+
+            with self._cond:
+                self._latencies.append(elapsed)
+                self._batches += 1
+                for key, entry in batch:
+                    self._inflight.pop(key, None)
+                if error is None:
+                    self._written += len(batch)
+                else:
+                    logger.warning("Conversation batch of %d failed: %s", len(batch), error, extra={"stage": "persistence"})
+                    for key, entry in batch:
+                        if key in self._pending:
+                            # A newer version was queued meanwhile; it takes over this write
+                            newer = self._pending[key]
+                            newer.item = self._merge(entry.item, newer.item)
+                            continue
+                        entry.attempts += 1
+                        if entry.attempts >= self.max_attempts:
+                            self._dropped += 1
+                            logger.error("Dropping conversation %s after %d attempts", key[1], entry.attempts, extra={"stage": "persistence"})
+                            continue
+                        self._retries += 1
+                        entry.not_before = time.monotonic() + min(30.0, 0.5 * 2 ** entry.attempts)
+                        self._pending[key] = entry
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Waits until every queued write has been attempted. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            try:
+                while self._pending or self._inflight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(timeout=remaining)
+                return True
+            finally:
+                self._stopping = False
+
+    def shutdown(self, timeout: float = 10.0):
+        with self._cond:
+            queued = len(self._pending) + len(self._inflight)
+        if queued:
+            logger.info("Flushing %d queued conversation writes before exit", queued, extra={"stage": "persistence"})
+            if not self.flush(timeout):
+                logger.error("%d conversation writes lost at shutdown", len(self._pending), extra={"stage": "persistence"})
+
+    def memory_usage(self):
+        with self._cond:
+            items = [e.item for e in self._pending.values()] + list(self._inflight.values())
+        return len(items), approx_bytes(items)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            latencies = sorted(self._latencies)
+            pick = lambda p: round(latencies[min(len(latencies) - 1, int(p * (len(latencies) - 1)))] * 1000, 1)
+            return {
+                "queue_depth":      len(self._pending),
+                "inflight":         len(self._inflight),
+                "oldest_pending_s": round(max((now - e.enqueued_at for e in self._pending.values()), default=0.0), 2),
+                "submitted":        self._submitted,
+                "coalesced":        self._coalesced,
+                "written":          self._written,
+                "batches":          self._batches,
+                "retries":          self._retries,
+                "dropped":          self._dropped,
+                "write_ms":         {"p50": pick(0.5), "p95": pick(0.95), "max": pick(1.0)} if latencies else None,
+            }
+
+
+conversation_writer = ConversationWriter(put_conversations)
+# Gunicorn workers exit through sys.exit on SIGTERM, so atexit covers graceful shutdown
+atexit.register(conversation_writer.shutdown)
+# Queued writes are never evicted: dropping them would lose conversations
+memory_registry.register("conversation_writes", conversation_writer.memory_usage)
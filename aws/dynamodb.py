@@ -1,13 +1,31 @@
+import base64
 import boto3
 import datetime
+import gzip
+import json
+import logging
 import uuid
 from boto3.dynamodb.conditions import Key
-from config import AWS_REGION
+from config import AWS_REGION, MESSAGE_CODEC, MESSAGE_COMPRESS_MIN_BYTES
+from aws.s3 import get_s3_object, delete_file_from_s3
+from src.metrics import instrument_boto3
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+    _zstd_compressor   = zstandard.ZstdCompressor(level=6)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+except ImportError:
+    zstandard = None
 
 dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
+instrument_boto3(dynamodb.meta.client)
 files_table         = dynamodb.Table("Files")
 conversations_table = dynamodb.Table("Conversations")
+messages_table      = dynamodb.Table("ConversationMessages")
 reports_table       = dynamodb.Table("SCAssistantReports")
+usage_table         = dynamodb.Table("SCAssistantUsage")
 
 
 # ── Files ────────────────────────────────────────────────────
@@ -23,41 +41,279 @@ def save_file_metadata(filename, uid):
 
 # ── Conversations ────────────────────────────────────────────
 
+# Layout: one small header item per conversation in `Conversations` (title,
+# timestamps, message_count) and one item per message in `ConversationMessages`
+# (conv_id + seq). A turn only writes its new messages and the header, so write
+# cost no longer grows with the conversation. Old single-item conversations
+# (header with a "messages" list) are still read, and are split into message
+# items the next time they are written.
+
+HEADER_FIELDS = ("conv_id", "uid", "title", "created_at", "updated_at", "message_count")
+
+# ⚡ Message codec: long message bodies (answers with Markdown tables, mostly) are
+# stored compressed in a binary "body" attribute next to a "codec" flag such as
+# "zstd:1" (algorithm:format version). Short bodies, and every item written
+# before the codec existed, keep the plain "content" string and are read as-is.
+CODEC_FORMAT = 1
+
+
+def _active_codec() -> str:
+    if MESSAGE_CODEC == "zstd" and zstandard is None:
+        return "gzip"
+    return MESSAGE_CODEC if MESSAGE_CODEC in ("zstd", "gzip") else "none"
+
+
+ACTIVE_CODEC = _active_codec()
+if ACTIVE_CODEC != MESSAGE_CODEC:
+    logger.warning("MESSAGE_CODEC=%s unavailable, storing messages with '%s'", MESSAGE_CODEC, ACTIVE_CODEC)
+
+
+def encode_message_body(content: str, codec: str = None) -> dict:
+    """Attributes holding a message body: {"content": str} or {"body": bytes, "codec": "zstd:1"}."""
+    codec = codec or ACTIVE_CODEC
+    raw = content.encode("utf-8")
+    if codec == "none" or len(raw) < MESSAGE_COMPRESS_MIN_BYTES:
+        return {"content": content}
+    if codec == "zstd":
+        packed = _zstd_compressor.compress(raw)
+    else:
+        packed = gzip.compress(raw, compresslevel=6, mtime=0)
+    if len(packed) >= len(raw):
+        return {"content": content}
+    return {"body": packed, "codec": f"{codec}:{CODEC_FORMAT}"}
+
+
+def decode_message_body(item: dict) -> str:
+    """Reverses encode_message_body; plain (legacy) items pass straight through."""
+    if "body" not in item:
+        return item.get("content", "")
+    packed = item["body"]
+    packed = getattr(packed, "value", packed)   # boto3 wraps binary attributes in Binary
+    algorithm, _, version = str(item.get("codec", "gzip:1")).partition(":")
+    if version and int(version) > CODEC_FORMAT:
+        raise ValueError(f"Unsupported message codec version {item['codec']}")
+    if algorithm == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed messages")
+        return _zstd_decompressor.decompress(packed).decode("utf-8")
+    if algorithm == "gzip":
+        return gzip.decompress(packed).decode("utf-8")
+    raise ValueError(f"Unknown message codec {item['codec']}")
+
+
+def conversation_item(uid, conv_id, history, created_at, persisted=0, updated_at=None):
+    """
+    Builds a conversation write: the header fields plus the full history, of which
+    `history[persisted:]` still has to be stored as message items.
+    """
+    title = next((m["content"][:40] for m in history if m["role"] == "user"), "Untitled Chat")
+    return {
+        "conv_id":       conv_id,
+        "uid":           uid,
+        "title":         title,
+        "created_at":    created_at,
+        "updated_at":    updated_at or datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "message_count": len(history),
+        "messages":      history,
+        "persisted":     persisted,
+    }
+
+
+def put_conversations(items):
+    """Appends each conversation's unsaved messages, then rewrites the small header items."""
+    with messages_table.batch_writer(overwrite_by_pkeys=["conv_id", "seq"]) as batch:
+        for item in items:
+            for seq in range(item["persisted"], len(item["messages"])):
+                msg = item["messages"][seq]
+                batch.put_item(Item={
+                    "conv_id": item["conv_id"],
+                    "seq":     seq,
+                    "role":    msg["role"],
+                    **encode_message_body(msg["content"]),
+                })
+    # A put (not update) also drops the legacy "messages" attribute once it has been split out,
+    # and the "archived_key" of a conversation rehydrated from S3
+    with conversations_table.batch_writer(overwrite_by_pkeys=["conv_id", "uid"]) as batch:
+        for item in items:
+            batch.put_item(Item={k: item[k] for k in HEADER_FIELDS})
+    for item in items:
+        if item.get("rehydrated_from"):
+            delete_file_from_s3(item["rehydrated_from"])
+
+
 def upsert_conversation(uid, conv_id, history, created_at):
-    """Creates or updates a conversation in DynamoDB."""
+    """Creates or updates a conversation in DynamoDB (writes every message)."""
     if not history:
         return
-    title = next((m["content"][:40] for m in history if m["role"] == "user"), "Untitled Chat")
-    item = {
-        "conv_id":    conv_id,
-        "uid":        uid,
-        "messages":   history,
-        "title":      title,
-        "created_at": created_at,
-        "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+    put_conversations([conversation_item(uid, conv_id, history, created_at)])
+
+
+def page_messages(messages, limit=None, before=None):
+    """
+    Slices an in-memory message list like get_conversation pages the table:
+    the latest `limit` messages with seq < `before`. Returns (messages, next_before).
+    """
+    end = len(messages) if before is None else max(0, min(int(before), len(messages)))
+    start = 0 if not limit else max(0, end - int(limit))
+    return messages[start:end], (start if start > 0 else None)
+
+
+def _query_messages(conv_id, limit=None, before=None):
+    """Latest messages of a conversation (newest-first query), returned oldest-first."""
+    condition = Key("conv_id").eq(conv_id)
+    if before is not None:
+        condition = condition & Key("seq").lt(int(before))
+    kwargs = {"KeyConditionExpression": condition, "ScanIndexForward": False, "ConsistentRead": True}
+    items = []
+    while True:
+        if limit:
+            kwargs["Limit"] = int(limit) - len(items)
+        resp = messages_table.query(**kwargs)
+        items += resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp or (limit and len(items) >= int(limit)):
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    items.reverse()
+    return items
+
+
+# Sidebar index: uid + updated_at, projecting only the title (create_conversation_index.py)
+SUMMARY_INDEX = "uid-updated-index"
+
+
+def _encode_cursor(key: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key, default=str).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid conversation cursor")
+
+
+def list_conversation_summaries(uid, limit=20, cursor=None):
+    """
+    One page of a user's conversations, most recently updated first, as
+    (summaries, next_cursor). Summaries only carry conv_id, title and updated_at.
+    """
+    kwargs = {
+        "IndexName":              SUMMARY_INDEX,
+        "KeyConditionExpression": Key("uid").eq(uid),
+        "ScanIndexForward":       False,
+        "Limit":                  limit,
     }
-    conversations_table.put_item(Item=item)
+    if cursor:
+        start_key = _decode_cursor(cursor)
+        if start_key.get("uid") != uid:
+            raise ValueError("Invalid conversation cursor")
+        kwargs["ExclusiveStartKey"] = start_key
+    resp = conversations_table.query(**kwargs)
+    summaries = [
+        {"conv_id": i["conv_id"], "title": i.get("title", "Untitled Chat"), "updated_at": i.get("updated_at")}
+        for i in resp.get("Items", [])
+    ]
+    last_key = resp.get("LastEvaluatedKey")
+    return summaries, (_encode_cursor(last_key) if last_key else None)
 
 
 def list_conversations(uid):
-    """Lists all conversations for a given user."""
-    resp = conversations_table.query(
-        IndexName="uid-index",
-        KeyConditionExpression=Key("uid").eq(uid),
-        ScanIndexForward=False
-    )
-    return resp.get("Items", [])
+    """Lists all conversations (summaries only) for a given user."""
+    summaries, cursor = list_conversation_summaries(uid, limit=100)
+    while cursor:
+        page, cursor = list_conversation_summaries(uid, limit=100, cursor=cursor)
+        summaries += page
+    return summaries
+
+
+def get_conversation(uid, conv_id, limit=None, before=None):
+    """
+    Retrieves a conversation with its latest `limit` messages (all by default) older
+    than seq `before`. `next_before` is the cursor for the previous page, or None.
+    """
+    # Strongly consistent: a turn that another worker just flushed must be visible to the next one
+    resp = conversations_table.get_item(Key={"conv_id": conv_id, "uid": uid}, ConsistentRead=True)
+    conv = resp.get("Item")
+    if not conv:
+        return None
+    if "messages" in conv:
+        # Legacy single-item conversation
+        conv["messages"], conv["next_before"] = page_messages(conv["messages"], limit, before)
+        return conv
+    if conv.get("archived_key"):
+        # Cold conversation: the stub points at its JSONL.gz archive in S3
+        conv["messages"], conv["next_before"] = page_messages(read_archived_messages(conv["archived_key"]), limit, before)
+        return conv
+    items = _query_messages(conv_id, limit, before)
+    conv["messages"] = [{"role": m["role"], "content": decode_message_body(m)} for m in items]
+    first_seq = int(items[0]["seq"]) if items else 0
+    conv["next_before"] = first_seq if first_seq > 0 else None
+    return conv
+
+
+# ── Conversation archive ─────────────────────────────────────
+# Conversations idle for CONVERSATION_ARCHIVE_DAYS are moved to S3 by
+# archive_conversations.py as one gzipped JSONL object (a line per message).
+# The header stays behind as a stub with "archived_key"; reads load the
+# messages from S3, and the next turn writes them back as message items
+# (the header put drops the stub marker), which rehydrates the conversation.
+
+ARCHIVE_PREFIX = "conversation-archive/"
+
 
+def archive_key(uid, conv_id) -> str:
+    return f"{ARCHIVE_PREFIX}{uid}/{conv_id}.jsonl.gz"
 
-def get_conversation(uid, conv_id):
-    """Retrieves a specific conversation from DynamoDB."""
-    resp = conversations_table.get_item(Key={"conv_id": conv_id, "uid": uid})
-    return resp.get("Item")
+
+def encode_archive(messages) -> bytes:
+    lines = (json.dumps({"seq": seq, "role": m["role"], "content": m["content"]}, ensure_ascii=False)
+             for seq, m in enumerate(messages))
+    return gzip.compress("\n".join(lines).encode("utf-8"), compresslevel=9, mtime=0)
+
+
+def read_archived_messages(key):
+    raw = gzip.decompress(get_s3_object(key)).decode("utf-8")
+    rows = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    rows.sort(key=lambda r: r["seq"])
+    return [{"role": r["role"], "content": r["content"]} for r in rows]
+
+
+def get_conversation_version(uid, conv_id):
+    """updated_at of a conversation from its header alone (None if it does not exist)."""
+    resp = conversations_table.get_item(
+        Key={"conv_id": conv_id, "uid": uid},
+        ProjectionExpression="updated_at",
+        ConsistentRead=True,
+    )
+    item = resp.get("Item")
+    return item.get("updated_at") if item else None
 
 
 def delete_conversation_from_db(uid, conv_id):
-    """Deletes a conversation from DynamoDB."""
-    conversations_table.delete_item(Key={"conv_id": conv_id, "uid": uid})
+    """Deletes a conversation (header and message items) from DynamoDB."""
+    resp = conversations_table.delete_item(Key={"conv_id": conv_id, "uid": uid}, ReturnValues="ALL_OLD")
+    # Message items are keyed by conv_id only, so only touch them if this user owned the header
+    if "Attributes" not in resp:
+        return
+    if resp["Attributes"].get("archived_key"):
+        delete_file_from_s3(resp["Attributes"]["archived_key"])
+    delete_message_items(conv_id)
+
+
+def delete_message_items(conv_id):
+    """Deletes every ConversationMessages item of a conversation."""
+    kwargs = {
+        "KeyConditionExpression": Key("conv_id").eq(conv_id),
+        "ProjectionExpression":   "conv_id, seq",
+    }
+    with messages_table.batch_writer() as batch:
+        while True:
+            resp = messages_table.query(**kwargs)
+            for key in resp.get("Items", []):
+                batch.delete_item(Key=key)
+            if "LastEvaluatedKey" not in resp:
+                break
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
 
 
 def delete_file_from_db(filename):
@@ -110,4 +366,43 @@ def update_report_status(report_id: str, status: str):
             ":s": status,
             ":r": datetime.datetime.now(datetime.timezone.utc).isoformat(),
         }
-    )
\ No newline at end of file
+    )
+
+
+# ── Usage ────────────────────────────────────────────────────
+
+def add_usage(day: str, user_key: str, counters: dict):
+    """Atomically adds `counters` to the (day, user) usage item, creating it if needed."""
+    names, values, parts = {}, {}, []
+    for i, (attr, value) in enumerate(counters.items()):
+        names[f"#a{i}"]  = attr
+        values[f":v{i}"] = value
+        parts.append(f"#a{i} :v{i}")
+    usage_table.update_item(
+        Key={"day": day, "user_key": user_key},
+        UpdateExpression="ADD " + ", ".join(parts),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def get_usage_day(day: str) -> list:
+    """Every usage item recorded on `day`."""
+    resp  = usage_table.query(KeyConditionExpression=Key("day").eq(day))
+    items = resp.get("Items", [])
+    while "LastEvaluatedKey" in resp:
+        resp   = usage_table.query(KeyConditionExpression=Key("day").eq(day), ExclusiveStartKey=resp["LastEvaluatedKey"])
+        items += resp.get("Items", [])
+    return items
+
+
+def get_usage_items(user_key: str, days: list) -> list:
+    """One user's usage items for the given days (days without usage are skipped)."""
+    items = []
+    for start in range(0, len(days), 100):   # BatchGetItem takes at most 100 keys
+        request = {usage_table.name: {"Keys": [{"day": d, "user_key": user_key} for d in days[start:start + 100]]}}
+        while request:
+            resp    = dynamodb.batch_get_item(RequestItems=request)
+            items  += resp.get("Responses", {}).get(usage_table.name, [])
+            request = resp.get("UnprocessedKeys") or None
+    return items
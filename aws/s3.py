@@ -1,8 +1,10 @@
 import boto3
+import logging
 import mimetypes
 from botocore.exceptions import ClientError
 from botocore.client import Config
 from config import S3_BUCKET_NAME, AWS_REGION
+from src.metrics import instrument_boto3
 
 # Explicitly set the region and signature version so URLs work on EC2!
 s3_client = boto3.client(
@@ -10,6 +12,9 @@ s3_client = boto3.client(
     region_name=AWS_REGION,
     config=Config(signature_version='s3v4')
 )
+instrument_boto3(s3_client)
+
+logger = logging.getLogger(__name__)
 
 def upload_file_to_s3(file_path, object_name):
     """
@@ -35,7 +40,7 @@ def upload_file_to_s3(file_path, object_name):
             ExtraArgs=extra_args  # --- NEW: Add ExtraArgs ---
         )
     except ClientError as e:
-        print(f"Error uploading to S3: {e}")
+        logger.warning("Error uploading to S3: %s", e)
         return False
     return True
 
@@ -49,7 +54,7 @@ def delete_file_from_s3(object_name):
     try:
         s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=object_name)
     except ClientError as e:
-        print(f"Error deleting from S3: {e}")
+        logger.warning("Error deleting from S3: %s", e)
         return False
     return True
 
@@ -80,5 +85,16 @@ def get_s3_presigned_url(object_name, for_download=False, expiration=3600):
         )
         return response
     except Exception as e:
-        print(f"Error generating presigned URL: {e}")
-        return None
\ No newline at end of file
+        logger.warning("Error generating presigned URL: %s", e)
+        return None
+
+def put_s3_object(object_name, body: bytes, content_type='application/octet-stream', content_encoding=None):
+    """Writes raw bytes to the bucket (raises on failure)."""
+    extra = {'ContentType': content_type}
+    if content_encoding:
+        extra['ContentEncoding'] = content_encoding
+    s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=object_name, Body=body, **extra)
+
+def get_s3_object(object_name) -> bytes:
+    """Reads a whole object from the bucket (raises on failure)."""
+    return s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=object_name)['Body'].read()
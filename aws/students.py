@@ -1,18 +1,23 @@
 import boto3
+import logging
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from config import AWS_REGION
+from src.metrics import instrument_boto3
 
 dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
+instrument_boto3(dynamodb.meta.client)
 students_table = dynamodb.Table("StudentRecords")
 
+logger = logging.getLogger(__name__)
+
 
 def get_student_by_uid(uid):
     try:
         resp = students_table.get_item(Key={"student_id": uid})
         return resp.get("Item")
     except ClientError as e:
-        print(f"[students] get_student_by_uid error: {e}")
+        logger.warning("get_student_by_uid failed: %s", e)
         return None
 
 
@@ -30,7 +35,7 @@ def get_student_by_email(email):
             items = resp.get("Items", [])
             return items[0] if items else None
         except ClientError as e2:
-            print(f"[students] get_student_by_email error: {e2}")
+            logger.warning("get_student_by_email failed: %s", e2)
             return None
 
 
@@ -39,7 +44,7 @@ def upsert_student(record):
         students_table.put_item(Item=record)
         return True
     except ClientError as e:
-        print(f"[students] upsert_student error: {e}")
+        logger.warning("upsert_student failed: %s", e)
         return False
 
 
@@ -48,7 +53,7 @@ def list_all_students():
         resp = students_table.scan()
         return resp.get("Items", [])
     except ClientError as e:
-        print(f"[students] list_all_students error: {e}")
+        logger.warning("list_all_students failed: %s", e)
         return []
 
 
@@ -340,8 +345,7 @@ def format_student_context(student):
         L.append("</student_record>")
         return "\n".join(L)
 
-    except Exception as e:
-        import traceback
-        print(f"[format_student_context] Error: {e}\n{traceback.format_exc()}")
+    except Exception:
+        logger.exception("format_student_context failed, falling back to the summary record")
         n=student.get("full_name","N/A"); g=student.get("gpa","N/A"); b=student.get("balance","N/A")
         return f"<student_record>\nName: {n}\nGPA: {g}\nBalance: PHP {b}\n</student_record>"
\ No newline at end of file
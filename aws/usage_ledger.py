@@ -0,0 +1,148 @@
+import atexit
+import datetime
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import USAGE_FLUSH_INTERVAL_S
+from aws.dynamodb import add_usage, get_usage_day, get_usage_items
+
+logger = logging.getLogger(__name__)
+
+# ====== Usage Ledger ======
+# Rolls the per-turn RequestUsage rows (rag/usage.py) up into one DynamoDB item
+# per (day, user) in the SCAssistantUsage table (keys: day, user_key; see
+# create_usage_table.py). Every item holds flat counters named
+# "<stage>#<model>#calls|prompt|completion" plus overall calls / prompt_tokens /
+# completion_tokens. A "__all__" item per day carries the day's totals.
+#
+# Turns only add to an in-memory tally; a background thread writes it with
+# atomic ADD updates every USAGE_FLUSH_INTERVAL_S, so the admin view lags by
+# at most that long and a chat turn never waits on DynamoDB for accounting.
+
+ALL_USERS = "__all__"
+GUEST_USER = "guest"
+
+DayUser = Tuple[str, str]   # (YYYY-MM-DD, user key)
+
+
+def usage_day(now: Optional[datetime.datetime] = None) -> str:
+    return (now or datetime.datetime.now(datetime.timezone.utc)).strftime("%Y-%m-%d")
+
+
+def _counters(rows: List[dict]) -> Dict[str, int]:
+    counters: Dict[str, int] = {}
+    for r in rows:
+        prefix = f"{r['stage']}#{r['model']}#"
+        for field, value in (("calls", r["calls"]), ("prompt", r["prompt_tokens"]), ("completion", r["completion_tokens"])):
+            counters[prefix + field] = counters.get(prefix + field, 0) + value
+        counters["calls"] = counters.get("calls", 0) + r["calls"]
+        counters["prompt_tokens"] = counters.get("prompt_tokens", 0) + r["prompt_tokens"]
+        counters["completion_tokens"] = counters.get("completion_tokens", 0) + r["completion_tokens"]
+    return counters
+
+
+def shape_usage_item(item: dict) -> dict:
+    """A stored usage item as {day, user_key, totals, stages: [...]}, heaviest stage first."""
+    stages: Dict[Tuple[str, str], dict] = {}
+    for attr, value in item.items():
+        parts = attr.split("#")
+        if len(parts) != 3:
+            continue
+        stage, model, field = parts
+        entry = stages.setdefault((stage, model), {
+            "stage": stage, "model": model, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+        })
+        entry[{"calls": "calls", "prompt": "prompt_tokens", "completion": "completion_tokens"}[field]] = int(value)
+    return {
+        "day":      item["day"],
+        "user_key": item["user_key"],
+        "totals": {
+            "calls":             int(item.get("calls", 0)),
+            "prompt_tokens":     int(item.get("prompt_tokens", 0)),
+            "completion_tokens": int(item.get("completion_tokens", 0)),
+        },
+        "stages": sorted(stages.values(), key=lambda s: -(s["prompt_tokens"] + s["completion_tokens"])),
+    }
+
+
+class UsageLedger:
+    def __init__(self, write: Callable[[str, str, Dict[str, int]], None], flush_interval_s: float):
+        """
+        :param write: adds a counter dict to one (day, user) item (raises on failure)
+        :param flush_interval_s: how often the tally is written out
+        """
+        self.write = write
+        self.flush_interval_s = flush_interval_s
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._tally: Dict[DayUser, Dict[str, int]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._flushes = 0
+        self._failures = 0
+
+    def add(self, user_key: Optional[str], rows: List[dict]):
+        """Books one turn's usage rows for `user_key` (guests share one key) under today."""
+        if not rows:
+            return
+        counters = _counters(rows)
+        day = usage_day()
+        with self._lock:
+            for key in ((day, user_key or GUEST_USER), (day, ALL_USERS)):
+                tally = self._tally.setdefault(key, {})
+                for attr, value in counters.items():
+                    tally[attr] = tally.get(attr, 0) + value
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="usage-ledger")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=self.flush_interval_s)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            tally, self._tally = self._tally, {}
+        for (day, user_key), counters in tally.items():
+            try:
+                self.write(day, user_key, counters)
+            except Exception as e:
+                # Keep the counts for the next flush rather than losing them
+                logger.warning("Usage write for %s/%s failed: %s", day, user_key, e)
+                with self._lock:
+                    self._failures += 1
+                    pending = self._tally.setdefault((day, user_key), {})
+                    for attr, value in counters.items():
+                        pending[attr] = pending.get(attr, 0) + value
+        with self._lock:
+            self._flushes += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pending_items": len(self._tally),
+                "flushes":       self._flushes,
+                "failures":      self._failures,
+                "flush_interval_s": self.flush_interval_s,
+            }
+
+
+def daily_usage(day: str) -> List[dict]:
+    """Every user's usage on `day` (the "__all__" item first), heaviest users first."""
+    items = [shape_usage_item(i) for i in get_usage_day(day)]
+    items.sort(key=lambda i: (i["user_key"] != ALL_USERS, -(i["totals"]["prompt_tokens"] + i["totals"]["completion_tokens"])))
+    return items
+
+
+def user_usage(user_key: str, days: int) -> List[dict]:
+    """One user's usage for each of the last `days` days that has any, newest first."""
+    today = datetime.datetime.now(datetime.timezone.utc)
+    keys = [usage_day(today - datetime.timedelta(days=n)) for n in range(days)]
+    items = [shape_usage_item(i) for i in get_usage_items(user_key, keys)]
+    return sorted(items, key=lambda i: i["day"], reverse=True)
+
+
+usage_ledger = UsageLedger(add_usage, flush_interval_s=USAGE_FLUSH_INTERVAL_S)
+atexit.register(usage_ledger.flush)
@@ -0,0 +1,299 @@
+"""
+Offline full-stack load test. Boots create_app() in this process against the
+local stand-ins in benchmarks/local_stack.py: moto for DynamoDB, S3 and
+Cognito, a fake Pinecone index and a fake OpenRouter server. No quota is
+spent and no AWS account is touched. The embedding model and BM25 encoder
+are the real local ones (run download_model.py once beforehand).
+
+Virtual users loop over a weighted mix of scripted scenarios until --duration
+runs out:
+
+  guest_faq          guest session, one handbook question
+  student_balance    Cognito login, then a balance question and a follow-up
+  image_upload       guest question with an uploaded image (vision call)
+  long_conversation  student session, --long-turns questions in one conversation
+
+The report gives throughput and p50/p95/p99 of time to first chunk (TTFT)
+and of total turn latency, per scenario and overall.
+
+    python -m benchmarks.full_stack_load_test --users 16 --duration 60
+    python -m benchmarks.full_stack_load_test --mode asgi --users 64 --llm-error-rate 0.05 \\
+        --mix guest_faq=6 student_balance=3 image_upload=1
+
+The app runs as a single worker: compare runs with each other, and do not
+read the numbers as a gunicorn deployment's capacity. Admission limits,
+profiles and the other config.py settings come from the environment, as in
+production. --openrouter-rpm defaults high so the local rate limiter does
+not throttle the fake model. Lower it to test the limiter itself.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.local_stack import LLMBehavior, free_port, start_local_stack
+from benchmarks.sse_load_test import _percentile
+
+FAQ_QUESTIONS = [
+    "What programs does the College of Business offer?",
+    "What are the admission requirements for freshmen?",
+    "When is the enrollment period for the first semester?",
+    "Where is the registrar's office?",
+    "How much is the tuition fee per unit?",
+    "What scholarships are available?",
+]
+STUDENT_QUESTIONS = [
+    ("How much is my remaining balance?", "When is my next payment due?"),
+    ("What subjects am I enrolled in this semester?", "Who teaches the first one?"),
+    ("What is my GPA?", "Am I on track to graduate?"),
+]
+LONG_CONVERSATION = [
+    "What programs does the College of Computer Studies offer?",
+    "How long is the BSIT program?",
+    "What subjects are in the first year?",
+    "Which of them are major subjects?",
+    "How much is the laboratory fee for those?",
+    "Can I pay that in installments?",
+    "What happens if I miss a payment?",
+    "Who do I talk to about a promissory note?",
+    "Where is that office?",
+    "What are its office hours?",
+]
+SCENARIOS = ["guest_faq", "student_balance", "image_upload", "long_conversation"]
+
+
+def _sample_image() -> bytes:
+    """A small PNG "screenshot" to upload, as the chat page would."""
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", (640, 360), "white")
+    draw = ImageDraw.Draw(img)
+    for row in range(8):
+        draw.text((20, 20 + row * 40), f"ASSESSMENT  IT 30{row}  3 units  PHP {1850 + row * 75}.00", fill="black")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# ====== Serving ======
+
+def serve(mode: str, port: int):
+    """Builds the app the way run.py / asgi.py do and serves it on a background thread."""
+    if mode == "asgi":
+        import uvicorn
+        from sc_assistant.asgi import create_asgi_app
+        server = uvicorn.Server(uvicorn.Config(create_asgi_app(), host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True, name="app-server").start()
+        while not server.started:
+            time.sleep(0.05)
+        return lambda: setattr(server, "should_exit", True)
+
+    from werkzeug.serving import make_server
+    from sc_assistant import create_app
+    server = make_server("127.0.0.1", port, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name="app-server").start()
+    return server.shutdown
+
+
+# ====== Scenarios ======
+
+async def chat_turn(client: httpx.AsyncClient, scenario: str, msg: str, image: bytes = None) -> dict:
+    """One POST /chat/get, read to the end of its SSE stream."""
+    start = time.perf_counter()
+    ttft = None
+    chunks = 0
+    outcome = None
+    files = {"image": ("assessment.png", image, "image/png")} if image else None
+    try:
+        async with client.stream("POST", "/chat/get", data={"msg": msg}, files=files) as resp:
+            if resp.status_code != 200:
+                outcome = f"http_{resp.status_code}"
+            else:
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if event["type"] == "chunk":
+                        chunks += 1
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                    elif event["type"] in ("busy", "error"):
+                        outcome = event["type"]
+                    elif event["type"] == "done":
+                        break
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    if outcome is None:
+        outcome = "ok" if chunks else "empty"
+    return {"scenario": scenario, "outcome": outcome, "ttft": ttft, "total": time.perf_counter() - start}
+
+
+async def _guest(client: httpx.AsyncClient):
+    (await client.post("/guest")).raise_for_status()
+
+
+async def _login(client: httpx.AsyncClient, student: dict):
+    resp = await client.post("/login", data={"email": student["email"], "password": student["password"]})
+    resp.raise_for_status()
+    if not resp.json().get("success"):
+        raise RuntimeError(f"Login failed for {student['email']}: {resp.json().get('message')}")
+
+
+async def run_scenario(name: str, client: httpx.AsyncClient, ctx: dict) -> List[dict]:
+    rng: random.Random = ctx["rng"]
+    if name == "guest_faq":
+        await _guest(client)
+        return [await chat_turn(client, name, rng.choice(FAQ_QUESTIONS))]
+    if name == "image_upload":
+        await _guest(client)
+        return [await chat_turn(client, name, "What does this assessment say I owe?", image=ctx["image"])]
+    await _login(client, rng.choice(ctx["students"]))
+    if name == "student_balance":
+        return [await chat_turn(client, name, q) for q in rng.choice(STUDENT_QUESTIONS)]
+    return [await chat_turn(client, name, q) for q in LONG_CONVERSATION[:ctx["long_turns"]]]
+
+
+async def virtual_user(url: str, ctx: dict, mix: Dict[str, int], stop_at: float, timeout: float, results: list):
+    names, weights = zip(*mix.items())
+    while time.monotonic() < stop_at:
+        name = ctx["rng"].choices(names, weights)[0]
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            try:
+                results.extend(await run_scenario(name, client, ctx))
+            except (httpx.HTTPError, RuntimeError) as e:
+                results.append({"scenario": name, "outcome": f"setup:{type(e).__name__}", "ttft": None, "total": 0.0})
+
+
+# ====== Report ======
+
+def summarize(rows: List[dict], wall_s: float) -> dict:
+    ok = [r for r in rows if r["outcome"] == "ok"]
+    ttft = [r["ttft"] for r in ok if r["ttft"] is not None]
+    total = [r["total"] for r in ok]
+    outcomes: Dict[str, int] = {}
+    for r in rows:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    return {
+        "turns":      len(rows),
+        "ok":         len(ok),
+        "turns_per_s": len(ok) / wall_s if wall_s else 0.0,
+        "ttft":  {f"p{p}": _percentile(ttft, p) for p in (50, 95, 99)},
+        "total": {f"p{p}": _percentile(total, p) for p in (50, 95, 99)},
+        "total_mean": statistics.mean(total) if total else 0.0,
+        "outcomes":   outcomes,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{'Scenario':<19} {'Turns':>6} {'OK':>6} {'Turn/s':>7} "
+          f"{'TTFT p50':>9} {'p95':>6} {'p99':>6} {'Total p50':>10} {'p95':>6} {'p99':>6}  Other outcomes")
+    print("-" * 110)
+    for name, s in report["scenarios"].items():
+        other = ", ".join(f"{k}={v}" for k, v in s["outcomes"].items() if k != "ok")
+        print(
+            f"{name:<19} {s['turns']:>6} {s['ok']:>6} {s['turns_per_s']:>7.2f} "
+            f"{s['ttft']['p50']:>9.2f} {s['ttft']['p95']:>6.2f} {s['ttft']['p99']:>6.2f} "
+            f"{s['total']['p50']:>10.2f} {s['total']['p95']:>6.2f} {s['total']['p99']:>6.2f}  {other}"
+        )
+    print(f"\nWall time {report['wall_s']:.1f}s with {report['users']} users ({report['mode']}).")
+    print(f"Stand-in calls: {json.dumps(report['stack'])}")
+
+
+async def main(args) -> dict:
+    behavior = LLMBehavior(
+        ttft_ms=args.llm_ttft_ms, ttft_jitter_ms=args.llm_ttft_jitter_ms, tokens_per_s=args.llm_tokens_per_s,
+        answer_tokens=args.llm_answer_tokens, rerank_ms=args.rerank_ms, error_rate=args.llm_error_rate,
+        rate_limit_rate=args.llm_429_rate, stall_rate=args.llm_stall_rate, stall_s=args.llm_stall_s,
+    )
+    os.environ.setdefault("OPENROUTER_RPM", str(args.openrouter_rpm))
+    os.environ.setdefault("OPENROUTER_BURST", str(max(5, int(args.openrouter_rpm // 60))))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    stack = start_local_stack(behavior, aws_latency_ms=args.aws_latency_ms, pinecone_latency_ms=args.pinecone_latency_ms)
+
+    port = free_port()
+    stop_server = serve(args.mode, port)
+    url = f"http://127.0.0.1:{port}"
+    mix = {name: weight for name, weight in args.mix.items() if weight > 0}
+    ctx = {
+        "rng": random.Random(args.seed), "students": stack.students,
+        "image": _sample_image(), "long_turns": args.long_turns,
+    }
+    results: List[dict] = []
+    print(f"Serving on {url} ({args.mode}); {args.users} users for {args.duration:.0f}s, mix {mix}")
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(
+            virtual_user(url, ctx, mix, started + args.duration, args.timeout, results) for _ in range(args.users)
+        ))
+    finally:
+        wall = time.monotonic() - started
+        stop_server()
+        # Drain the write-behind queues while the stand-ins are still up
+        from aws.conversation_writer import conversation_writer
+        from aws.usage_ledger import usage_ledger
+        conversation_writer.flush(timeout=30)
+        usage_ledger.flush()
+        stack.stop()
+
+    report = {
+        "mode": args.mode, "users": args.users, "wall_s": wall, "behavior": vars(behavior),
+        "scenarios": {name: summarize([r for r in results if r["scenario"] == name], wall) for name in mix},
+        "stack": stack.stats(),
+    }
+    report["scenarios"]["all"] = summarize(results, wall)
+    return report
+
+
+def _mix(values: List[str]) -> Dict[str, int]:
+    mix = {name: 0 for name in SCENARIOS}
+    for value in values:
+        name, _, weight = value.partition("=")
+        if name not in mix:
+            raise ValueError(f"Unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["wsgi", "asgi"], default="wsgi", help="Serve create_app() (threaded) or the ASGI app")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to keep starting new scenarios")
+    parser.add_argument("--mix", nargs="+", default=["guest_faq=5", "student_balance=3", "image_upload=1", "long_conversation=1"],
+                        help="Scenario weights as name=weight")
+    parser.add_argument("--long-turns", type=int, default=8, help="Questions in a long_conversation scenario")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Also write the report to this file")
+
+    fake = parser.add_argument_group("stand-in behaviour")
+    fake.add_argument("--llm-ttft-ms", type=float, default=600.0)
+    fake.add_argument("--llm-ttft-jitter-ms", type=float, default=300.0)
+    fake.add_argument("--llm-tokens-per-s", type=float, default=60.0)
+    fake.add_argument("--llm-answer-tokens", type=int, default=120)
+    fake.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of OpenRouter calls answered 500")
+    fake.add_argument("--llm-429-rate", type=float, default=0.0, help="Share of OpenRouter calls answered 429")
+    fake.add_argument("--llm-stall-rate", type=float, default=0.0, help="Share of streams that stall after 4 tokens")
+    fake.add_argument("--llm-stall-s", type=float, default=20.0)
+    fake.add_argument("--rerank-ms", type=float, default=150.0)
+    fake.add_argument("--pinecone-latency-ms", type=float, default=40.0)
+    fake.add_argument("--aws-latency-ms", type=float, default=8.0, help="Added to every DynamoDB/S3/Cognito call")
+    fake.add_argument("--openrouter-rpm", type=float, default=100000.0, help="OPENROUTER_RPM for the app under test")
+    args = parser.parse_args()
+    try:
+        args.mix = _mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = asyncio.run(main(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
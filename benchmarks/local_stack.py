@@ -0,0 +1,392 @@
+"""
+Local stand-ins for every external service the app calls, so the whole stack
+can be load tested offline (see benchmarks/full_stack_load_test.py):
+
+- AWS (DynamoDB, S3, Cognito): an in-memory moto server. boto3 reaches it
+  through AWS_ENDPOINT_URL, so the app's own clients run unchanged. The tables,
+  the bucket and a user pool are created, and the seeded students from
+  seed_students.py are given Cognito accounts.
+- Pinecone: FakePinecone replaces pinecone.Pinecone before the app imports it.
+  Its index answers hybrid queries from pages of data/Samar-College-2024.pdf.
+  Scores come from random page vectors, so relevance is not modelled.
+- OpenRouter: FakeOpenRouter is a local HTTP server that speaks the chat
+  completions API (streamed and not) and the rerank API. Time to first token,
+  token rate and error mix are configurable.
+
+start_local_stack() has to run before anything imports config or the app.
+moto is a dev-only dependency:  pip install -r requirements-dev.txt
+"""
+import json
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HANDBOOK_PDF = os.path.join(BASE_DIR, "data", "Samar-College-2024.pdf")
+STUDENT_PASSWORD = "LoadTest#2024"
+
+ANSWER = (
+    "Samar College offers programs through its College of Business, College of Education, "
+    "College of Computer Studies and College of Criminal Justice. **Enrollment** for the first "
+    "semester runs in June; bring your Form 138, PSA birth certificate and two ID photos to the "
+    "Registrar's Office. Tuition depends on the number of enrolled units and laboratory fees, so "
+    "please visit the Accounting Office for an official assessment [Source: Samar-College-2024.pdf, Pg 12]."
+)
+
+# ====== AWS (moto) ======
+
+TABLES = [
+    {"TableName": "Files", "KeySchema": [("filename", "HASH", "S")]},
+    {"TableName": "Conversations", "KeySchema": [("conv_id", "HASH", "S"), ("uid", "RANGE", "S")],
+     "Indexes": {"uid-updated-index": [("uid", "HASH", "S"), ("updated_at", "RANGE", "S")]}},
+    {"TableName": "ConversationMessages", "KeySchema": [("conv_id", "HASH", "S"), ("seq", "RANGE", "N")]},
+    {"TableName": "SCAssistantReports", "KeySchema": [("report_id", "HASH", "S")],
+     "Indexes": {"status-created-index": [("status", "HASH", "S"), ("created_at", "RANGE", "S")]}},
+    {"TableName": "SCAssistantUsage", "KeySchema": [("day", "HASH", "S"), ("user_key", "RANGE", "S")]},
+    {"TableName": "StudentRecords", "KeySchema": [("student_id", "HASH", "S")],
+     "Indexes": {"email-index": [("email", "HASH", "S")],
+                 "student-number-index": [("student_number", "HASH", "S")]}},
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _create_table(client, spec: dict):
+    attrs = {name: kind for name, _key, kind in spec["KeySchema"]}
+    indexes = []
+    for index_name, keys in spec.get("Indexes", {}).items():
+        attrs.update({name: kind for name, _key, kind in keys})
+        indexes.append({
+            "IndexName":  index_name,
+            "KeySchema":  [{"AttributeName": name, "KeyType": key} for name, key, _kind in keys],
+            "Projection": {"ProjectionType": "ALL"},
+        })
+    kwargs = {
+        "TableName":            spec["TableName"],
+        "KeySchema":            [{"AttributeName": name, "KeyType": key} for name, key, _kind in spec["KeySchema"]],
+        "AttributeDefinitions": [{"AttributeName": name, "AttributeType": kind} for name, kind in attrs.items()],
+        "BillingMode":          "PAY_PER_REQUEST",
+    }
+    if indexes:
+        kwargs["GlobalSecondaryIndexes"] = indexes
+    client.create_table(**kwargs)
+
+
+def start_aws(region: str, latency_ms: float = 0.0):
+    """Starts an in-memory moto server and points boto3 (env) at it. Returns the server."""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        raise SystemExit('The offline load test needs moto: pip install -r requirements-dev.txt')
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)     # moto's per-request access log
+    port = free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    os.environ.update({
+        "AWS_ENDPOINT_URL":      f"http://127.0.0.1:{port}",
+        "AWS_ACCESS_KEY_ID":     "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_REGION":            region,
+        "AWS_DEFAULT_REGION":    region,
+    })
+
+    import boto3
+    boto3.setup_default_session(region_name=region)
+    if latency_ms:
+        # Every AWS call made through the default session (the app's clients included) waits this long
+        boto3.DEFAULT_SESSION.events.register("before-send", lambda **_: time.sleep(latency_ms / 1000))
+    return server
+
+
+def provision_aws(bucket: str) -> List[dict]:
+    """Creates the tables, bucket and user pool, seeds the students. Returns their logins."""
+    import boto3
+
+    dynamodb = boto3.client("dynamodb")
+    for spec in TABLES:
+        _create_table(dynamodb, spec)
+    boto3.client("s3").create_bucket(Bucket=bucket)
+
+    cognito = boto3.client("cognito-idp")
+    pool_id = cognito.create_user_pool(
+        PoolName="sc-assistant-loadtest",
+        Schema=[
+            {"Name": "role", "AttributeDataType": "String", "Mutable": True},
+            {"Name": "data_consent", "AttributeDataType": "String", "Mutable": True},
+        ],
+    )["UserPool"]["Id"]
+    app_client = cognito.create_user_pool_client(
+        UserPoolId=pool_id, ClientName="sc-assistant", GenerateSecret=True,
+        ExplicitAuthFlows=["ALLOW_USER_PASSWORD_AUTH", "ALLOW_REFRESH_TOKEN_AUTH"],
+    )["UserPoolClient"]
+    os.environ.update({
+        "COGNITO_USER_POOL_ID":  pool_id,
+        "COGNITO_CLIENT_ID":     app_client["ClientId"],
+        "COGNITO_CLIENT_SECRET": app_client["ClientSecret"],
+    })
+
+    # Same records seed_students.py writes, keyed by the Cognito sub like link_students.py does
+    from seed_students import DUMMY_STUDENTS, build_student_record
+    students = boto3.resource("dynamodb").Table("StudentRecords")
+    logins = []
+    for idx, (_seed_id, student_number, name, email, gender) in enumerate(DUMMY_STUDENTS):
+        user = cognito.admin_create_user(
+            UserPoolId=pool_id, Username=email, MessageAction="SUPPRESS",
+            UserAttributes=[
+                {"Name": "email", "Value": email},
+                {"Name": "email_verified", "Value": "true"},
+                {"Name": "name", "Value": name},
+                {"Name": "custom:role", "Value": "user"},
+                {"Name": "custom:data_consent", "Value": "true"},
+            ],
+        )["User"]
+        cognito.admin_set_user_password(UserPoolId=pool_id, Username=email, Password=STUDENT_PASSWORD, Permanent=True)
+        sub = next(a["Value"] for a in user["Attributes"] if a["Name"] == "sub")
+        students.put_item(Item=build_student_record(idx, sub, student_number, name, email, gender))
+        logins.append({"email": email, "password": STUDENT_PASSWORD, "uid": sub})
+    return logins
+
+
+# ====== Pinecone ======
+
+def handbook_chunks(chunk_chars: int = 900, limit: int = 400) -> List[dict]:
+    """Page-sized chunks of the bundled handbook (or filler text without PyMuPDF)."""
+    chunks = []
+    try:
+        import fitz
+        with fitz.open(HANDBOOK_PDF) as pdf:
+            for page_no, page in enumerate(pdf, start=1):
+                text = " ".join(page.get_text().split())
+                for start in range(0, len(text), chunk_chars):
+                    chunks.append({"context": text[start:start + chunk_chars],
+                                   "source": "Samar-College-2024.pdf", "page": page_no})
+    except Exception:
+        chunks = [{"context": ANSWER, "source": "Samar-College-2024.pdf", "page": n} for n in range(1, 81)]
+    return chunks[:limit]
+
+
+class FakeIndex:
+    def __init__(self, chunks: List[dict], dimension: int, latency_ms: float):
+        rng = random.Random(7)
+        self.latency_s = latency_ms / 1000
+        self.chunks = chunks
+        self.vectors = []
+        for _ in chunks:
+            v = [rng.gauss(0, 1) for _ in range(dimension)]
+            norm = math.sqrt(sum(x * x for x in v))
+            self.vectors.append([x / norm for x in v])
+        self.queries = 0
+
+    def query(self, vector=None, sparse_vector=None, top_k: int = 10, include_metadata: bool = True, **_):
+        time.sleep(self.latency_s)
+        self.queries += 1
+        scored = sorted(
+            ((sum(a * b for a, b in zip(vector, v)), i) for i, v in enumerate(self.vectors)),
+            reverse=True,
+        )[:top_k]
+        return {"matches": [
+            {"id": f"chunk-{i}", "score": score, "metadata": dict(self.chunks[i]) if include_metadata else {}}
+            for score, i in scored
+        ]}
+
+    def upsert(self, vectors=None, **_):
+        return {"upserted_count": len(vectors or [])}
+
+    def delete(self, **_):
+        return {}
+
+    def describe_index_stats(self, **_):
+        return {"dimension": len(self.vectors[0]) if self.vectors else 0, "total_vector_count": len(self.chunks)}
+
+
+class FakePinecone:
+    """Drop-in for pinecone.Pinecone: every index name maps to the same in-memory index."""
+    index: Optional[FakeIndex] = None
+
+    def __init__(self, api_key: Optional[str] = None, **_):
+        pass
+
+    def Index(self, name: str, **_) -> FakeIndex:
+        return FakePinecone.index
+
+    def list_indexes(self):
+        return []
+
+
+def install_fake_pinecone(dimension: int = 384, latency_ms: float = 0.0) -> FakeIndex:
+    import pinecone
+    FakePinecone.index = FakeIndex(handbook_chunks(), dimension, latency_ms)
+    pinecone.Pinecone = FakePinecone
+    return FakePinecone.index
+
+
+# ====== OpenRouter ======
+
+@dataclass
+class LLMBehavior:
+    ttft_ms: float = 600.0          # delay before the first streamed token (and before non-streamed replies)
+    ttft_jitter_ms: float = 300.0   # uniform extra delay on top of ttft_ms
+    tokens_per_s: float = 60.0
+    answer_tokens: int = 120
+    rerank_ms: float = 150.0
+    error_rate: float = 0.0         # share of calls answered HTTP 500
+    rate_limit_rate: float = 0.0    # share of calls answered HTTP 429 (Retry-After: 2)
+    stall_rate: float = 0.0         # share of streams that go silent after a few tokens...
+    stall_s: float = 20.0           # ...for this long
+
+
+class FakeOpenRouter:
+    def __init__(self, behavior: LLMBehavior):
+        self.behavior = behavior
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/api/v1"
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), self._handler())
+        self._server.daemon_threads = True
+
+    def count(self, key: str):
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-openrouter").start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status: int, payload: dict, headers: Optional[dict] = None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                endpoint = self.path.rsplit("/", 1)[-1]
+                b = fake.behavior
+                roll = random.random()
+                if roll < b.rate_limit_rate:
+                    fake.count(f"{endpoint} 429")
+                    return self._json(429, {"error": {"message": "Rate limit exceeded", "code": 429}}, {"Retry-After": "2"})
+                if roll < b.rate_limit_rate + b.error_rate:
+                    fake.count(f"{endpoint} 500")
+                    return self._json(500, {"error": {"message": "Upstream error", "code": 500}})
+                stall = bool(body.get("stream")) and roll > 1 - b.stall_rate
+                fake.count(f"{endpoint} {'stall' if stall else 200}")
+
+                if endpoint == "rerank":
+                    time.sleep(b.rerank_ms / 1000)
+                    documents = body.get("documents", [])
+                    top_n = min(body.get("top_n") or len(documents), len(documents))
+                    return self._json(200, {
+                        "results": [{"index": i, "relevance_score": 1 - i / max(1, len(documents))} for i in range(top_n)],
+                        "usage": {"total_tokens": sum(len(d) for d in documents) // 4},
+                    })
+                if endpoint != "completions":
+                    return self._json(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+                time.sleep((b.ttft_ms + random.uniform(0, b.ttft_jitter_ms)) / 1000)
+                model = body.get("model", "fake")
+                prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+                words = (ANSWER.split(" ") * (b.answer_tokens // len(ANSWER.split(" ")) + 1))[:b.answer_tokens]
+                completion_id = f"gen-{uuid.uuid4().hex[:12]}"
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                         "total_tokens": prompt_tokens + len(words)}
+
+                if not body.get("stream"):
+                    return self._json(200, {
+                        "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": " ".join(words)}}],
+                        "usage": usage,
+                    })
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+                def send(choices: list, **extra):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": choices, **extra}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+
+                try:
+                    for n, word in enumerate(words):
+                        delta = {"role": "assistant", "content": word + " "} if n == 0 else {"content": word + " "}
+                        send([{"index": 0, "delta": delta, "finish_reason": None}])
+                        if stall and n == 3:
+                            time.sleep(b.stall_s)
+                        time.sleep(1 / b.tokens_per_s)
+                    send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        send([], usage=usage)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    fake.count("completions client_closed")
+
+        return Handler
+
+
+# ====== Everything ======
+
+class LocalStack:
+    def __init__(self, aws_server, openrouter: FakeOpenRouter, index: FakeIndex, students: List[dict]):
+        self.aws_server = aws_server
+        self.openrouter = openrouter
+        self.index = index
+        self.students = students
+
+    def stats(self) -> dict:
+        return {"openrouter": dict(sorted(self.openrouter.calls.items())), "pinecone_queries": self.index.queries}
+
+    def stop(self):
+        self.openrouter.stop()
+        self.aws_server.stop()
+
+
+def start_local_stack(
+    behavior: LLMBehavior,
+    aws_latency_ms: float = 0.0,
+    pinecone_latency_ms: float = 0.0,
+    region: str = "us-east-1",
+) -> LocalStack:
+    """Starts every stand-in and sets the env config.py reads. Call before importing the app."""
+    aws_server = start_aws(region, aws_latency_ms)
+    students = provision_aws(bucket="sc-assistant-bucket")    # config.S3_BUCKET_NAME
+    index = install_fake_pinecone(latency_ms=pinecone_latency_ms)
+    openrouter = FakeOpenRouter(behavior).start()
+    os.environ.update({
+        "OPENROUTER_BASE_URL": openrouter.base_url,
+        "OPENROUTER_API_KEY":  "local",
+        "PINECONE_API_KEY":    "local",
+        "FLASK_SECRET_KEY":    os.getenv("FLASK_SECRET_KEY") or uuid.uuid4().hex,
+    })
+    return LocalStack(aws_server, openrouter, index, students)
@@ -0,0 +1,159 @@
+"""
+Compares stored message encodings (plain, gzip, zstd) on chat transcripts:
+DynamoDB item size, write/read capacity units per message, and encode/decode
+time. With --live it also writes each transcript to the ConversationMessages
+table and measures put and paginated-read latency (items are deleted after).
+
+Transcripts default to synthetic registrar-style answers with Markdown
+tables; pass --transcripts with a JSONL file of {"messages": [...]} lines
+(e.g. exported from /chat/conversation/<id>) to use real ones.
+
+    python -m benchmarks.message_codec_benchmark
+    python -m benchmarks.message_codec_benchmark --transcripts convs.jsonl --live
+"""
+import argparse
+import json
+import math
+import statistics
+import time
+import uuid
+
+from aws.dynamodb import (
+    encode_message_body, decode_message_body, messages_table, zstandard, _query_messages
+)
+
+PROGRAMS = [
+    ("BS Information Technology", "College of Computer Studies", 4, "₱18,500"),
+    ("BS Business Administration", "College of Business", 4, "₱16,200"),
+    ("BS Secondary Education", "College of Education", 4, "₱15,800"),
+    ("BS Criminology", "College of Criminal Justice", 4, "₱17,100"),
+    ("BS Nursing", "College of Nursing", 4, "₱24,900"),
+    ("BS Hospitality Management", "College of Business", 4, "₱16,900"),
+]
+
+
+def _table_answer(n_rows: int) -> str:
+    rows = "\n".join(
+        f"| {name} | {college} | {years} years | {fee} per semester |"
+        for name, college, years, fee in (PROGRAMS * 4)[:n_rows]
+    )
+    return (
+        "Here are the programs currently offered at Samar College, based on the student handbook "
+        "[Source: Student_Handbook.pdf, Pg 12]:\n\n"
+        "| Program | College | Duration | Estimated Tuition |\n"
+        "|---|---|---|---|\n"
+        f"{rows}\n\n"
+        "**Note:** Tuition depends on the number of enrolled units and laboratory fees. "
+        "Please visit the Registrar's Office or the Accounting Office for an official assessment."
+    )
+
+
+def synthetic_transcripts(count: int = 20):
+    transcripts = []
+    for i in range(count):
+        messages = []
+        for turn in range(3 + i % 5):
+            messages.append({"role": "user", "content": f"What are the programs and fees for year {turn + 1}?"})
+            if turn % 2 == 0:
+                messages.append({"role": "assistant", "content": _table_answer(4 + (i + turn) % 12)})
+            else:
+                messages.append({"role": "assistant", "content": "The enrollment period for the first semester "
+                                 "usually starts in June. Bring your Form 138, PSA birth certificate and "
+                                 "two 2x2 ID pictures to the Registrar's Office."})
+        transcripts.append(messages)
+    return transcripts
+
+
+def load_transcripts(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["messages"] for line in f if line.strip()]
+
+
+def item_size(item: dict) -> int:
+    """DynamoDB item size: attribute names plus values (strings UTF-8, binary raw, numbers ~digits/2+1)."""
+    size = 0
+    for name, value in item.items():
+        size += len(name.encode("utf-8"))
+        if isinstance(value, bytes):
+            size += len(value)
+        elif isinstance(value, (int, float)):
+            size += len(str(value)) // 2 + 1
+        else:
+            size += len(str(value).encode("utf-8"))
+    return size
+
+
+def _message_item(conv_id: str, seq: int, msg: dict, codec: str) -> dict:
+    return {"conv_id": conv_id, "seq": seq, "role": msg["role"], **encode_message_body(msg["content"], codec)}
+
+
+def run_offline(transcripts, codecs):
+    print(f"\n{'Codec':<6} {'Bytes/msg':>10} {'WCU/msg':>8} {'RCU/msg':>8} {'Ratio':>7} {'Enc us':>8} {'Dec us':>8}")
+    print("-" * 62)
+    baseline = None
+    for codec in codecs:
+        sizes, wcu, rcu, enc, dec = [], [], [], [], []
+        for messages in transcripts:
+            for seq, msg in enumerate(messages):
+                start = time.perf_counter()
+                item = _message_item("00000000-0000-0000-0000-000000000000", seq, msg, codec)
+                enc.append((time.perf_counter() - start) * 1e6)
+                start = time.perf_counter()
+                decode_message_body(item)
+                dec.append((time.perf_counter() - start) * 1e6)
+                size = item_size(item)
+                sizes.append(size)
+                wcu.append(math.ceil(size / 1024))
+                rcu.append(math.ceil(size / 4096) / 2)   # eventually consistent reads
+        mean_size = statistics.mean(sizes)
+        baseline = baseline or mean_size
+        print(
+            f"{codec:<6} {mean_size:>10.0f} {statistics.mean(wcu):>8.2f} {statistics.mean(rcu):>8.2f} "
+            f"{baseline / mean_size:>7.2f} {statistics.mean(enc):>8.1f} {statistics.mean(dec):>8.1f}"
+        )
+
+
+def run_live(transcripts, codecs, page: int):
+    print(f"\n{'Codec':<6} {'Put ms/msg':>11} {'Read p50 ms':>12} {'Read p95 ms':>12}")
+    print("-" * 45)
+    for codec in codecs:
+        put_ms, read_ms = [], []
+        conv_ids = []
+        try:
+            for messages in transcripts:
+                conv_id = f"benchmark-{uuid.uuid4()}"
+                conv_ids.append((conv_id, len(messages)))
+                start = time.perf_counter()
+                with messages_table.batch_writer() as batch:
+                    for seq, msg in enumerate(messages):
+                        batch.put_item(Item=_message_item(conv_id, seq, msg, codec))
+                put_ms.append((time.perf_counter() - start) * 1000 / max(len(messages), 1))
+
+                start = time.perf_counter()
+                for item in _query_messages(conv_id, limit=page):
+                    decode_message_body(item)
+                read_ms.append((time.perf_counter() - start) * 1000)
+        finally:
+            with messages_table.batch_writer() as batch:
+                for conv_id, count in conv_ids:
+                    for seq in range(count):
+                        batch.delete_item(Key={"conv_id": conv_id, "seq": seq})
+        ordered = sorted(read_ms)
+        print(
+            f"{codec:<6} {statistics.mean(put_ms):>11.1f} {ordered[len(ordered) // 2]:>12.1f} "
+            f"{ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transcripts", help="JSONL file with one {\"messages\": [...]} per line")
+    parser.add_argument("--live", action="store_true", help="Also time writes/reads against DynamoDB")
+    parser.add_argument("--page", type=int, default=20, help="Messages per paginated read in --live mode")
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcripts) if args.transcripts else synthetic_transcripts()
+    codecs = ["none", "gzip"] + (["zstd"] if zstandard is not None else [])
+    run_offline(transcripts, codecs)
+    if args.live:
+        run_live(transcripts, codecs, args.page)
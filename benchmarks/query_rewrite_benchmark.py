@@ -0,0 +1,112 @@
+"""
+Compares the local query rewriter with the LLM rewriter on scripted follow-up
+questions: retrieval recall (does any retrieved chunk mention the expected
+terms?) and rewrite latency.
+
+Requires the same .env as the app (Pinecone + OpenRouter keys).
+
+    python -m benchmarks.query_rewrite_benchmark --repeat 3
+"""
+import argparse
+import statistics
+import time
+
+from rag.chain import retriever, contextualize_query
+
+# Each case: prior turns, the follow-up question, and terms a relevant chunk must contain
+CASES = [
+    {
+        "history": [
+            {"role": "user", "content": "What programs does the College of Business offer?"},
+            {"role": "assistant", "content": "The College of Business offers BS in Business Administration majoring in Marketing and Financial Management."},
+        ],
+        "question": "What are the admission requirements for it?",
+        "expected": ["business administration"],
+    },
+    {
+        "history": [
+            {"role": "user", "content": "How much is the tuition fee for BSIT?"},
+            {"role": "assistant", "content": "Tuition for BS Information Technology depends on the number of units enrolled."},
+        ],
+        "question": "What about for BSED?",
+        "expected": ["secondary education"],
+    },
+    {
+        "history": [
+            {"role": "user", "content": "Who is the president of Samar College?"},
+        ],
+        "question": "When was the college founded?",
+        "expected": ["founded", "established"],
+    },
+    {
+        "history": [
+            {"role": "user", "content": "Does Samar College have a scholarship program?"},
+            {"role": "assistant", "content": "Yes, Samar College grants academic and athletic scholarships."},
+        ],
+        "question": "How do I apply for that?",
+        "expected": ["scholarship"],
+    },
+    {
+        "history": [],
+        "question": "What is the grading system of Samar College?",
+        "expected": ["grading", "grade"],
+    },
+    {
+        "history": [
+            {"role": "user", "content": "What are the library hours?"},
+            {"role": "assistant", "content": "The library is open Monday to Saturday."},
+            {"role": "user", "content": "Where is the registrar's office?"},
+        ],
+        "question": "and its office hours?",
+        "expected": ["registrar"],
+    },
+]
+
+
+def _hit(docs, expected) -> bool:
+    return any(term in d.page_content.lower() for d in docs for term in expected)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def run(repeat: int):
+    modes = ["raw", "local", "hybrid", "llm"]
+    results = {m: {"hits": 0, "total": 0, "latency_ms": []} for m in modes}
+
+    for _ in range(repeat):
+        for case in CASES:
+            for mode in modes:
+                start = time.perf_counter()
+                if mode == "raw":
+                    query = case["question"]
+                else:
+                    query = contextualize_query(case["question"], case["history"], mode=mode)
+                results[mode]["latency_ms"].append((time.perf_counter() - start) * 1000)
+
+                docs = retriever.invoke(query)
+                results[mode]["total"] += 1
+                results[mode]["hits"] += int(_hit(docs, case["expected"]))
+
+    print(f"\n{'Mode':<8} {'Recall':>8} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10}")
+    print("-" * 50)
+    for mode in modes:
+        r = results[mode]
+        recall = r["hits"] / max(r["total"], 1)
+        lat = r["latency_ms"]
+        print(
+            f"{mode:<8} {recall:>8.2%} {_percentile(lat, 50):>10.1f} "
+            f"{_percentile(lat, 95):>10.1f} {statistics.mean(lat):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the case set")
+    args = parser.parse_args()
+    run(args.repeat)
@@ -0,0 +1,143 @@
+"""
+Concurrent SSE capacity test for POST /chat/get. Opens guest sessions, then
+ramps up the number of simultaneous chat streams and reports time-to-first-
+chunk, completed streams, streams turned away as busy and how many streams
+were actually open at once.
+
+Every stream asks a distinct question, so single-flight coalescing (which
+would answer identical guest questions with one generation) does not apply.
+Admission control does: each worker runs at most CHAT_MAX_CONCURRENT
+generations and queues CHAT_QUEUE_SIZE more, and answers the rest "busy".
+To measure the serving mode rather than those limits, raise them for the run.
+Run it against each serving mode of the same build:
+
+    export CHAT_MAX_CONCURRENT=512 CHAT_QUEUE_SIZE=512
+    gunicorn --bind 0.0.0.0:8080 --workers 2 --threads 4 --timeout 120 run:app
+    gunicorn --bind 0.0.0.0:8080 --workers 2 --timeout 120 -k uvicorn.workers.UvicornWorker asgi:app
+
+    python -m benchmarks.sse_load_test --url http://localhost:8080 --levels 8 32 128 256
+
+With the sync workers the peak stays at workers x threads (8) and the rest
+queue behind them; with the ASGI workers peak concurrency follows the level.
+With the default limits, the ASGI peak stops at workers x (8 + 16) and the
+rest of each level shows up under "Busy".
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+QUESTIONS = [
+    "What programs does the College of Business offer?",
+    "What are the admission requirements?",
+    "When is the enrollment period?",
+    "Where is the registrar's office?",
+]
+
+
+class Gauge:
+    def __init__(self):
+        self.open = 0
+        self.peak = 0
+
+    def enter(self):
+        self.open += 1
+        self.peak = max(self.peak, self.open)
+
+    def leave(self):
+        self.open -= 1
+
+
+async def _guest_client(url: str, timeout: float) -> httpx.AsyncClient:
+    client = httpx.AsyncClient(base_url=url, timeout=timeout)
+    resp = await client.post("/guest")
+    resp.raise_for_status()
+    return client
+
+
+async def _one_stream(client: httpx.AsyncClient, question: str, gauge: Gauge) -> dict:
+    start = time.perf_counter()
+    ttfc = None
+    chunks = 0
+    try:
+        async with client.stream("POST", "/chat/get", data={"msg": question}) as resp:
+            if resp.status_code != 200:
+                return {"ok": False, "error": f"HTTP {resp.status_code}"}
+            gauge.enter()
+            try:
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if event["type"] == "chunk":
+                        chunks += 1
+                        if ttfc is None:
+                            ttfc = time.perf_counter() - start
+                    elif event["type"] == "busy":
+                        return {"ok": False, "busy": True, "error": None}
+                    elif event["type"] == "error":
+                        return {"ok": False, "error": "stream error event"}
+            finally:
+                gauge.leave()
+    except httpx.HTTPError as e:
+        return {"ok": False, "error": type(e).__name__}
+    return {"ok": chunks > 0, "ttfc": ttfc, "total": time.perf_counter() - start, "error": None if chunks else "no chunks"}
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+async def run_level(url: str, concurrency: int, timeout: float) -> dict:
+    clients = await asyncio.gather(*(_guest_client(url, timeout) for _ in range(concurrency)))
+    gauge = Gauge()
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            # The stream number keeps the questions distinct, so none are coalesced
+            _one_stream(c, f"{QUESTIONS[i % len(QUESTIONS)]} (stream {i})", gauge)
+            for i, c in enumerate(clients)
+        ))
+        wall = time.perf_counter() - start
+    finally:
+        await asyncio.gather(*(c.aclose() for c in clients))
+
+    ttfc = [r["ttfc"] for r in results if r.get("ttfc") is not None]
+    return {
+        "concurrency": concurrency,
+        "ok":          sum(1 for r in results if r["ok"]),
+        "busy":        sum(1 for r in results if r.get("busy")),
+        "errors":      sum(1 for r in results if not r["ok"] and not r.get("busy")),
+        "peak_open":   gauge.peak,
+        "ttfc_p50":    _percentile(ttfc, 50),
+        "ttfc_p95":    _percentile(ttfc, 95),
+        "ttfc_mean":   statistics.mean(ttfc) if ttfc else 0.0,
+        "wall_s":      wall,
+    }
+
+
+async def main(url: str, levels, timeout: float):
+    print(f"\n{'Streams':>8} {'OK':>6} {'Busy':>6} {'Errors':>7} {'Peak open':>10} {'TTFC p50':>10} {'TTFC p95':>10} {'Wall s':>8}")
+    print("-" * 73)
+    for level in levels:
+        r = await run_level(url, level, timeout)
+        print(
+            f"{r['concurrency']:>8} {r['ok']:>6} {r['busy']:>6} {r['errors']:>7} {r['peak_open']:>10} "
+            f"{r['ttfc_p50']:>10.2f} {r['ttfc_p95']:>10.2f} {r['wall_s']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8080", help="Base URL of the running server")
+    parser.add_argument("--levels", type=int, nargs="+", default=[8, 32, 128], help="Concurrent streams per step")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.levels, args.timeout))
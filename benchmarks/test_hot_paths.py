@@ -0,0 +1,138 @@
+"""
+Micro-benchmarks for the pure, CPU-bound functions that run on every
+ingestion or chat turn (pip install -r requirements-dev.txt):
+
+  ingestion   src.helper.clean_text, smart_chunking, is_low_value_chunk,
+              store_index.detect_columns
+  chat turn   rag.chain.docs_to_context, safe_prompt,
+              aws.students.format_student_context
+
+Fixtures are real data: pages of data/Samar-College-2024.pdf, the chunks
+ingestion makes from them, and the seeded records from seed_students.py.
+Importing rag.chain loads the local embedding model (run download_model.py
+once). Pinecone is replaced by the local stand-in, so no key or network is
+needed. If rag.chain cannot be imported, its two benchmarks are skipped.
+
+Baselines are kept in benchmarks/baselines, one folder per machine/Python.
+Record one before an optimization, then compare against it:
+
+    pytest benchmarks/test_hot_paths.py --benchmark-storage=benchmarks/baselines --benchmark-save=baseline
+    pytest benchmarks/test_hot_paths.py --benchmark-storage=benchmarks/baselines \\
+        --benchmark-compare --benchmark-compare-fail=min:15%
+
+Only compare runs from the same machine: the stored numbers are absolute
+timings. Compare on min. On a shared or busy machine the means of the
+microsecond-scale benchmarks drift by tens of percent between runs.
+"""
+import os
+import zlib
+
+import pytest
+
+os.environ.setdefault("PINECONE_API_KEY", "local")
+os.environ.setdefault("OPENROUTER_API_KEY", "local")
+
+import fitz  # PyMuPDF
+
+from benchmarks.local_stack import HANDBOOK_PDF, install_fake_pinecone
+from src.helper import clean_text, smart_chunking, is_low_value_chunk
+from aws.students import format_student_context
+from store_index import detect_columns
+
+# Pages with prose, tables and the two-column course listings
+SAMPLE_PAGES = [5, 12, 20, 36, 38, 45, 60, 75, 90, 120]
+
+
+@pytest.fixture(scope="module")
+def handbook():
+    with fitz.open(HANDBOOK_PDF) as pdf:
+        yield pdf
+
+
+@pytest.fixture(scope="module")
+def raw_pages(handbook):
+    return [handbook[n].get_text() for n in SAMPLE_PAGES if n < handbook.page_count]
+
+
+@pytest.fixture(scope="module")
+def chunks(handbook):
+    """Every chunk ingestion makes from the handbook (store_index defaults)."""
+    header = "General College Information"
+    out = []
+    for page in handbook:
+        page_chunks, header = smart_chunking(page.get_text(), running_header=header)
+        out.extend(page_chunks)
+    return out
+
+
+@pytest.fixture(scope="module")
+def students():
+    import seed_students
+    # build_student_record seeds random with hash(name), which changes with every process;
+    # pin it so each run formats the same records
+    seed_students.hash = lambda name: zlib.crc32(name.encode())
+    return [seed_students.build_student_record(idx, *s) for idx, s in enumerate(seed_students.DUMMY_STUDENTS)]
+
+
+@pytest.fixture(scope="module")
+def chain():
+    install_fake_pinecone()
+    try:
+        import rag.chain
+    except Exception as e:
+        pytest.skip(f"rag.chain unavailable here: {e}")
+    return rag.chain
+
+
+@pytest.fixture(scope="module")
+def retrieved_docs(chunks):
+    from langchain_core.documents import Document
+    return [
+        Document(page_content=text, metadata={"source": "Samar-College-2024.pdf", "page": i + 1})
+        for i, text in enumerate(chunks[::7])
+    ]
+
+
+# ====== Ingestion ======
+
+def test_clean_text(benchmark, raw_pages):
+    benchmark(lambda: [clean_text(raw) for raw in raw_pages])
+
+
+def test_smart_chunking(benchmark, raw_pages):
+    def chunk_all():
+        header = "General College Information"
+        for raw in raw_pages:
+            _chunks, header = smart_chunking(raw, running_header=header)
+    benchmark(chunk_all)
+
+
+def test_is_low_value_chunk(benchmark, chunks):
+    benchmark(lambda: [is_low_value_chunk(c) for c in chunks])
+
+
+def test_detect_columns(benchmark, handbook):
+    pages = [handbook[n] for n in SAMPLE_PAGES if n < handbook.page_count]
+    benchmark(lambda: [detect_columns(page) for page in pages])
+
+
+# ====== Chat turn ======
+
+@pytest.mark.parametrize("top_k", [5, 10])
+def test_docs_to_context(benchmark, chain, retrieved_docs, top_k):
+    benchmark(chain.docs_to_context, retrieved_docs[:top_k])
+
+
+def test_safe_prompt(benchmark, chain, retrieved_docs, students):
+    from src.prompt import system_prompt
+    context = chain.docs_to_context(retrieved_docs[:5])
+    history = "\n".join(f"USER: question {n}\nASSISTANT: {retrieved_docs[n].page_content[:400]}" for n in range(6))
+    benchmark(
+        chain.safe_prompt, system_prompt,
+        retrieved_docs=context, chat_history=history,
+        student_context=format_student_context(students[0]), current_date="June 10, 2025",
+    )
+
+
+def test_format_student_context(benchmark, students):
+    benchmark(lambda: [format_student_context(s) for s in students])
@@ -17,6 +17,13 @@ INDEX_NAME = "rag-google-v1"
 
 # Express Mode API Key
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")  # point at a stand-in for offline load tests
+
+# OpenRouter Request Scheduler (see src/rate_limiter.py) — limits are per worker process
+OPENROUTER_RPM = float(os.getenv("OPENROUTER_RPM", "20"))
+OPENROUTER_BURST = int(os.getenv("OPENROUTER_BURST", "5"))
+OPENROUTER_INGESTION_RESERVE = int(os.getenv("OPENROUTER_INGESTION_RESERVE", "2"))
+OPENROUTER_INTERACTIVE_WAIT_S = float(os.getenv("OPENROUTER_INTERACTIVE_WAIT_S", "2"))
 
 # Flask Configuration
 FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "your_default_secret_key")
@@ -26,5 +33,97 @@ CHAT_MODEL_NAME = "nvidia/nemotron-3-ultra-550b-a55b:free"
 FALLBACK_MODEL_NAME = "nvidia/nemotron-3-super-120b-a12b:free"
 SUMMARIZER_MODEL_NAME = "nvidia/nemotron-3-nano-omni-30b-a3b-reasoning:free"
 
+# Query Contextualization
+# "hybrid" = local rewriter first, LLM only for ambiguous follow-ups | "local" | "llm"
+QUERY_REWRITE_MODE = os.getenv("QUERY_REWRITE_MODE", "hybrid")
+LOCAL_REWRITE_MIN_SIMILARITY = float(os.getenv("LOCAL_REWRITE_MIN_SIMILARITY", "0.25"))
+
+# Pipeline Profiles (see rag/profiles.py)
+PIPELINE_PROFILE_OVERRIDES = os.getenv("PIPELINE_PROFILES", "")
+# Guests switch to the "lite" profile once this many chat requests are in flight on a worker
+LITE_PROFILE_THRESHOLD = int(os.getenv("LITE_PROFILE_THRESHOLD", "6"))
+# Student contexts kept per worker for requests whose deadline is too tight to read DynamoDB
+STUDENT_CONTEXT_CACHE_SIZE = int(os.getenv("STUDENT_CONTEXT_CACHE_SIZE", "1024"))
+
+# Chat Admission Control (see rag/admission.py) — limits are per worker process
+CHAT_MAX_CONCURRENT = int(os.getenv("CHAT_MAX_CONCURRENT", "8"))    # generations running at once
+CHAT_PER_USER_LIMIT = int(os.getenv("CHAT_PER_USER_LIMIT", "2"))    # per uid (students) / session (guests)
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "16"))
+CHAT_QUEUE_WAIT_S = float(os.getenv("CHAT_QUEUE_WAIT_S", "10"))     # then answer "busy, retry in N s"
+
+# Hedged Streaming (see rag/hedging.py)
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))  # of the primary model's TTFT
+HEDGE_DEFAULT_DELAY_S = float(os.getenv("HEDGE_DEFAULT_DELAY_S", "6"))
+HEDGE_MIN_DELAY_S = float(os.getenv("HEDGE_MIN_DELAY_S", "1.5"))
+HEDGE_MAX_DELAY_S = float(os.getenv("HEDGE_MAX_DELAY_S", "12"))
+
+# SSE Frame Coalescing (see sc_assistant/stream_writer.py)
+# Tokens are batched into one frame per window; clients may ask for their own window via `frame_ms`
+SSE_FRAME_MS = int(os.getenv("SSE_FRAME_MS", "30"))
+SSE_FRAME_BYTES = int(os.getenv("SSE_FRAME_BYTES", "256"))
+SSE_MAX_FRAME_MS = int(os.getenv("SSE_MAX_FRAME_MS", "250"))
+
+# Resumable Streams (see sc_assistant/replay.py) — answers keep generating after a disconnect
+REPLAY_MAX_FRAMES = int(os.getenv("REPLAY_MAX_FRAMES", "2048"))
+REPLAY_TTL_S = float(os.getenv("REPLAY_TTL_S", "120"))  # how long a finished stream stays resumable
+SSE_KEEPALIVE_S = float(os.getenv("SSE_KEEPALIVE_S", "15"))
+
+# Single-Flight Coalescing (see sc_assistant/replay.py) — identical guest questions share one answer
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+CORPUS_VERSION = os.getenv("CORPUS_VERSION", INDEX_NAME)  # bump after re-ingesting into the same index
+
+# Write-behind Conversation Persistence (see aws/conversation_writer.py)
+PERSIST_FLUSH_INTERVAL_S = float(os.getenv("PERSIST_FLUSH_INTERVAL_S", "0.25"))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "25"))  # BatchWriteItem maximum
+PERSIST_MAX_ATTEMPTS = int(os.getenv("PERSIST_MAX_ATTEMPTS", "6"))
+# How long a turn waits for another worker's queued write of its conversation to land
+CONVERSATION_FRESH_WAIT_S = float(os.getenv("CONVERSATION_FRESH_WAIT_S", "3"))
+# A version still missing this long after its turn started is treated as lost (the writer gives up after ~30 s of retries)
+CONVERSATION_LOST_AFTER_S = float(os.getenv("CONVERSATION_LOST_AFTER_S", "60"))
+
+# Conversation Cache (see aws/conversation_cache.py) — full conversations kept per worker
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "256"))
+
+# Conversation Archival (see archive_conversations.py) — idle conversations move to S3
+CONVERSATION_ARCHIVE_DAYS = int(os.getenv("CONVERSATION_ARCHIVE_DAYS", "90"))
+
+# Stored Message Compression (see aws/dynamodb.py) — "zstd" | "gzip" | "none"
+MESSAGE_CODEC = os.getenv("MESSAGE_CODEC", "zstd")
+MESSAGE_COMPRESS_MIN_BYTES = int(os.getenv("MESSAGE_COMPRESS_MIN_BYTES", "512"))
+
+# Slow-Request Flight Recorder (see src/tracing.py) — kept traces are shared by all workers
+TRACE_DB_PATH = os.getenv("TRACE_DB_PATH", "/tmp/sc_assistant_traces.sqlite3")
+TRACE_SLOWEST_N = int(os.getenv("TRACE_SLOWEST_N", "50"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.02"))  # fraction of all requests kept as a baseline
+TRACE_SAMPLED_KEEP = int(os.getenv("TRACE_SAMPLED_KEEP", "200"))
+
+# Token Usage Accounting (see rag/usage.py) — per-user daily rollups in the SCAssistantUsage table
+USAGE_FLUSH_INTERVAL_S = float(os.getenv("USAGE_FLUSH_INTERVAL_S", "30"))
+
+# Structured Logging (see src/logs.py) — JSON lines on stdout, written off the request thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")  # DEBUG adds per-document retrieval/rerank detail
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records beyond this are dropped, never waited on
+
+# On-demand Profiling (see src/profiling.py) — admin-only, one capture at a time per worker
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "5"))  # stack depth kept per allocation
+
+# Memory Accounting (see src/memory.py) — soft limits evict cache entries before the container OOMs
+MEMORY_CHECK_INTERVAL_S = float(os.getenv("MEMORY_CHECK_INTERVAL_S", "30"))
+MEMORY_SOFT_LIMIT_MB = int(os.getenv("MEMORY_SOFT_LIMIT_MB", "0"))  # per-worker RSS; 0 disables
+MEMORY_STRUCTURE_LIMITS_MB = os.getenv("MEMORY_LIMITS", "")  # JSON, e.g. '{"graph_checkpoints": 300}'
+MEMORY_EVICT_FRACTION = float(os.getenv("MEMORY_EVICT_FRACTION", "0.25"))  # share of entries dropped per over-limit check
+
+# Prometheus Metrics (see src/metrics.py) — set PROMETHEUS_MULTIPROC_DIR to merge gunicorn workers
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # if set, /metrics requires "Authorization: Bearer <token>"
+
+# Circuit Breakers (see rag/circuit_breaker.py)
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_MAX_OPEN_SECONDS = float(os.getenv("BREAKER_MAX_OPEN_SECONDS", "300"))
+
 if not PINECONE_API_KEY:
     raise ValueError("PINECONE_API_KEY is not set. Please check your .env file.")
\ No newline at end of file
@@ -0,0 +1,58 @@
+import boto3
+import os
+from botocore.exceptions import ClientError
+from config import AWS_REGION # This triggers the dotenv load from your config
+
+def create_conversation_index():
+    """
+    Adds the uid-updated-index GSI to the Conversations table. It projects only
+    the conversation title, so the chat sidebar can page through a user's
+    conversations without reading their messages.
+    """
+    session = boto3.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=AWS_REGION
+    )
+    dynamodb = session.client("dynamodb")
+
+    try:
+        print(f"Adding uid-updated-index to Conversations in {AWS_REGION}...")
+
+        dynamodb.update_table(
+            TableName="Conversations",
+            AttributeDefinitions=[
+                {"AttributeName": "uid",        "AttributeType": "S"},
+                {"AttributeName": "updated_at", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexUpdates=[
+                {
+                    "Create": {
+                        "IndexName": "uid-updated-index",
+                        "KeySchema": [
+                            {"AttributeName": "uid",        "KeyType": "HASH"},
+                            {"AttributeName": "updated_at", "KeyType": "RANGE"},
+                        ],
+                        "Projection": {
+                            "ProjectionType":   "INCLUDE",
+                            "NonKeyAttributes": ["title"],
+                        },
+                    }
+                }
+            ],
+        )
+
+        waiter = dynamodb.get_waiter('table_exists')
+        waiter.wait(TableName='Conversations')
+        print("✅ uid-updated-index is being built (it becomes queryable once backfilled).")
+
+    except ClientError as e:
+        if "already exists" in e.response['Error']['Message']:
+            print("ℹ️  Index 'uid-updated-index' already exists — skipping.")
+        else:
+            print(f"❌ AWS Client Error: {e.response['Error']['Message']}")
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}")
+
+if __name__ == "__main__":
+    create_conversation_index()
\ No newline at end of file
@@ -0,0 +1,46 @@
+import boto3
+import os
+from botocore.exceptions import ClientError
+from config import AWS_REGION # This triggers the dotenv load from your config
+
+def create_messages_table():
+    """
+    Creates the ConversationMessages DynamoDB table (one item per chat message,
+    keyed by conv_id + seq) used by aws/dynamodb.py.
+    """
+    session = boto3.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=AWS_REGION
+    )
+    dynamodb = session.client("dynamodb")
+
+    try:
+        print(f"Creating ConversationMessages table in {AWS_REGION}...")
+        
+        dynamodb.create_table(
+            TableName="ConversationMessages",
+            AttributeDefinitions=[
+                {"AttributeName": "conv_id", "AttributeType": "S"},
+                {"AttributeName": "seq",     "AttributeType": "N"},
+            ],
+            KeySchema=[
+                {"AttributeName": "conv_id", "KeyType": "HASH"},
+                {"AttributeName": "seq",     "KeyType": "RANGE"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        
+        waiter = dynamodb.get_waiter('table_exists')
+        waiter.wait(TableName='ConversationMessages')
+        print("✅ ConversationMessages table created successfully.")
+
+    except dynamodb.exceptions.ResourceInUseException:
+        print("ℹ️  Table 'ConversationMessages' already exists — skipping.")
+    except ClientError as e:
+        print(f"❌ AWS Client Error: {e.response['Error']['Message']}")
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}")
+
+if __name__ == "__main__":
+    create_messages_table()
\ No newline at end of file
@@ -0,0 +1,46 @@
+import boto3
+import os
+from botocore.exceptions import ClientError
+from config import AWS_REGION # This triggers the dotenv load from your config
+
+def create_usage_table():
+    """
+    Creates the SCAssistantUsage DynamoDB table (one item per day and user,
+    keyed by day + user_key) that aws/usage_ledger.py rolls token usage into.
+    """
+    session = boto3.Session(
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=AWS_REGION
+    )
+    dynamodb = session.client("dynamodb")
+
+    try:
+        print(f"Creating SCAssistantUsage table in {AWS_REGION}...")
+
+        dynamodb.create_table(
+            TableName="SCAssistantUsage",
+            AttributeDefinitions=[
+                {"AttributeName": "day",      "AttributeType": "S"},
+                {"AttributeName": "user_key", "AttributeType": "S"},
+            ],
+            KeySchema=[
+                {"AttributeName": "day",      "KeyType": "HASH"},
+                {"AttributeName": "user_key", "KeyType": "RANGE"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+        waiter = dynamodb.get_waiter('table_exists')
+        waiter.wait(TableName='SCAssistantUsage')
+        print("✅ SCAssistantUsage table created successfully.")
+
+    except dynamodb.exceptions.ResourceInUseException:
+        print("ℹ️  Table 'SCAssistantUsage' already exists — skipping.")
+    except ClientError as e:
+        print(f"❌ AWS Client Error: {e.response['Error']['Message']}")
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}")
+
+if __name__ == "__main__":
+    create_usage_table()
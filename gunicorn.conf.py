@@ -0,0 +1,20 @@
+# gunicorn.conf.py — picked up automatically by gunicorn from the working directory.
+# Server options stay on the command line (see Dockerfile); this file only holds
+# the hooks Prometheus multiprocess mode needs (see src/metrics.py).
+import os
+import shutil
+
+
+def on_starting(server):
+    """Starts every deploy with an empty metrics directory."""
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drops a dead worker's live gauges (e.g. in-flight streams) from /metrics."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
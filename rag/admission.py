@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from config import (
+    CHAT_MAX_CONCURRENT, CHAT_PER_USER_LIMIT, CHAT_QUEUE_SIZE, CHAT_QUEUE_WAIT_S
+)
+from src.metrics import ADMISSION_QUEUE_SECONDS, ADMISSION_REJECTIONS
+
+# ====== Chat Admission Control ======
+# Every chat generation holds a worker thread (or event-loop task) and an
+# OpenRouter slot for tens of seconds. Without a limit, a burst queues up
+# invisibly inside gunicorn until requests hit the 120s timeout. Instead, at
+# most CHAT_MAX_CONCURRENT generations run per worker, each user gets at most
+# CHAT_PER_USER_LIMIT of them, and the rest wait in a bounded queue where
+# logged-in students are served before guests. A request that cannot get in
+# fails fast with a "busy, retry in N s" estimate, and the pipeline degrades
+# to the lite profile while anyone is queued.
+#
+# Limits are per process: the box-wide limit is workers x CHAT_MAX_CONCURRENT.
+
+STUDENT = 0   # logged-in students and admins
+GUEST   = 1
+
+CLASS_NAMES = {STUDENT: "student", GUEST: "guest"}
+
+
+class Ticket:
+    """Proof of admission; hand it back to release() when the generation ends."""
+
+    def __init__(self, user_key: str, priority: int, queued_s: float):
+        self.user_key = user_key
+        self.priority = priority
+        self.queued_s = queued_s
+        self.admitted_at = time.monotonic()
+
+
+class Rejection:
+    def __init__(self, reason: str, retry_after_s: int):
+        self.reason = reason            # "user_limit" | "queue_full" | "timeout"
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionController:
+    def __init__(self, capacity: int, per_user: int, queue_size: int, max_wait_s: float):
+        self.capacity = capacity
+        self.per_user = per_user
+        self.queue_size = queue_size
+        self.max_wait_s = max_wait_s
+        self._cond = threading.Condition()
+        self._active = 0
+        self._per_user: Dict[str, int] = {}     # admitted generations per user
+        self._queued: Dict[str, int] = {}       # requests per user waiting for a slot
+        self._waiters = []          # [priority, seq] entries, lowest sorts first
+        self._seq = itertools.count()
+        self._service_s = 20.0      # EWMA of how long one generation holds a slot
+        self._queue_times = deque(maxlen=512)
+        self._admitted = {p: 0 for p in CLASS_NAMES}
+        self._rejected = {"user_limit": 0, "queue_full": 0, "timeout": 0}
+
+    def _retry_after(self) -> int:
+        """Rough seconds until a slot frees up for a request joining the back of the queue."""
+        ahead = len(self._waiters) + 1
+        return max(1, math.ceil(self._service_s * ahead / max(1, self.capacity)))
+
+    def _reject(self, reason: str) -> Rejection:
+        self._rejected[reason] += 1
+        ADMISSION_REJECTIONS.labels(reason=reason).inc()
+        return Rejection(reason, self._retry_after())
+
+    def admit(self, user_key: str, priority: int, timeout: Optional[float] = None):
+        """Waits for a generation slot; returns a Ticket, or a Rejection saying why not."""
+        timeout = self.max_wait_s if timeout is None else timeout
+        started = time.monotonic()
+        with self._cond:
+            # Queued requests count too, or a user's burst would queue up and be admitted together
+            if self._per_user.get(user_key, 0) + self._queued.get(user_key, 0) >= self.per_user:
+                return self._reject("user_limit")
+            if self._waiters and len(self._waiters) >= self.queue_size:
+                return self._reject("queue_full")
+
+            entry = [priority, next(self._seq)]
+            self._waiters.append(entry)
+            self._queued[user_key] = self._queued.get(user_key, 0) + 1
+            try:
+                while True:
+                    if self._active < self.capacity and min(self._waiters) == entry:
+                        break
+                    remaining = started + timeout - time.monotonic()
+                    if remaining <= 0:
+                        return self._reject("timeout")
+                    self._cond.wait(timeout=remaining)
+            finally:
+                self._waiters.remove(entry)
+                self._queued[user_key] -= 1
+                if not self._queued[user_key]:
+                    del self._queued[user_key]
+                self._cond.notify_all()
+
+            self._active += 1
+            self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+            self._admitted[priority] += 1
+            queued_s = time.monotonic() - started
+            self._queue_times.append(queued_s)
+            ADMISSION_QUEUE_SECONDS.labels(priority=CLASS_NAMES[priority]).observe(queued_s)
+            return Ticket(user_key, priority, queued_s)
+
+    async def admit_async(self, user_key: str, priority: int, timeout: Optional[float] = None):
+        """admit() for the event loop: takes a free slot inline, only waits in a thread."""
+        with self._cond:
+            if not self._waiters and self._active < self.capacity:
+                return self.admit(user_key, priority, timeout=0)
+        return await asyncio.to_thread(self.admit, user_key, priority, timeout)
+
+    def release(self, ticket: Ticket):
+        with self._cond:
+            self._active = max(0, self._active - 1)
+            held = self._per_user.get(ticket.user_key, 0) - 1
+            if held > 0:
+                self._per_user[ticket.user_key] = held
+            else:
+                self._per_user.pop(ticket.user_key, None)
+            self._service_s = 0.8 * self._service_s + 0.2 * (time.monotonic() - ticket.admitted_at)
+            self._cond.notify_all()
+
+    @property
+    def overloaded(self) -> bool:
+        """True while requests are waiting for a slot."""
+        return bool(self._waiters)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            waits = sorted(self._queue_times)
+            waiting = {name: 0 for name in CLASS_NAMES.values()}
+            for priority, _ in self._waiters:
+                waiting[CLASS_NAMES[priority]] += 1
+
+            def pct(q):
+                return round(waits[min(len(waits) - 1, int(q * len(waits)))], 3) if waits else None
+
+            return {
+                "active":      self._active,
+                "capacity":    self.capacity,
+                "waiting":     waiting,
+                "admitted":    {CLASS_NAMES[p]: n for p, n in self._admitted.items()},
+                "rejected":    dict(self._rejected),
+                "queue_time_s": {"p50": pct(0.50), "p95": pct(0.95), "max": round(waits[-1], 3) if waits else None},
+                "service_s":   round(self._service_s, 1),
+                "retry_after_s": self._retry_after(),
+            }
+
+
+chat_admission = AdmissionController(
+    capacity=CHAT_MAX_CONCURRENT,
+    per_user=CHAT_PER_USER_LIMIT,
+    queue_size=CHAT_QUEUE_SIZE,
+    max_wait_s=CHAT_QUEUE_WAIT_S,
+)
@@ -1,9 +1,15 @@
 import os
+import time
+import threading
 import requests
+import logging
 import concurrent.futures
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import InMemorySaver
 from typing import TypedDict, List, Dict, Optional
@@ -15,14 +21,29 @@ from pinecone_text.sparse import BM25Encoder
 
 from src.helper import get_local_embeddings
 from src.prompt import system_prompt
+from src.rate_limiter import (
+    openrouter_scheduler, call_openrouter, report_rate_limit, INTERACTIVE, RERANK
+)
+from rag.query_rewriter import LocalQueryRewriter
+from rag.profiles import PipelineProfile, get_profile
+from rag.deadline import deadline_from_config
+from rag.circuit_breaker import get_breaker, CircuitOpenError
+from src.metrics import stage_timer, count_cache
+from src.tracing import trace_from_config, estimate_tokens
+from src.logs import in_request_context
+from src.memory import memory_registry, approx_bytes, evict_oldest
+from rag.usage import RequestUsage, usage_from_config
 from config import (
     INDEX_NAME, CHAT_MODEL_NAME, FALLBACK_MODEL_NAME, SUMMARIZER_MODEL_NAME,
-    PINECONE_API_KEY, OPENROUTER_API_KEY
+    PINECONE_API_KEY, OPENROUTER_API_KEY, OPENROUTER_BASE_URL,
+    QUERY_REWRITE_MODE, LOCAL_REWRITE_MIN_SIMILARITY, STUDENT_CONTEXT_CACHE_SIZE
 )
 
 # Student records
 from aws.students import get_student_by_uid, get_student_by_email, format_student_context
 
+logger = logging.getLogger(__name__)
+
 # ====== Setup ======
 embeddings = get_local_embeddings()
 pinecone = Pinecone(api_key=PINECONE_API_KEY)
@@ -33,7 +54,7 @@ bm25_path = "bm25_values.json"
 if os.path.exists(bm25_path):
     bm25 = BM25Encoder().load(bm25_path)
 else:
-    print("WARNING: bm25_values.json not found. Using default BM25.")
+    logger.warning("bm25_values.json not found. Using default BM25.")
     bm25 = BM25Encoder().default()
 
 # ⚡ OPTIMIZATION: Reduced top_k from 20 to 8 to avoid RRF data-sprawl latency
@@ -58,14 +79,50 @@ retriever = EnsembleRetriever(
     weights=[0.4, 0.6],
 )
 
+# Profiles ask for different candidate counts; retrievers are cheap wrappers around
+# the shared index/encoders, so one ensemble per top_k is built lazily and reused.
+_retrievers_by_top_k = {10: retriever}
+_retrievers_lock = threading.Lock()
+
+
+def get_retriever(top_k: int) -> EnsembleRetriever:
+    with _retrievers_lock:
+        if top_k not in _retrievers_by_top_k:
+            _retrievers_by_top_k[top_k] = EnsembleRetriever(
+                retrievers=[
+                    PineconeHybridSearchRetriever(
+                        embeddings=embeddings, sparse_encoder=bm25, index=index, top_k=top_k, alpha=0.0,
+                    ),
+                    PineconeHybridSearchRetriever(
+                        embeddings=embeddings, sparse_encoder=bm25, index=index, top_k=top_k, alpha=1.0,
+                    ),
+                ],
+                weights=[0.4, 0.6],
+            )
+        return _retrievers_by_top_k[top_k]
+
 # ⚡ OPTIMIZATION: Shifted from heavy local CPU CrossEncoder to ultra-fast OpenRouter Reranker
 RERANK_MODEL = "nvidia/llama-nemotron-rerank-vl-1b-v2:free"
 RERANK_TOP_K = 5  # ⚡ OPTIMIZATION: Reduced from 15 to 8 to maximize LLM generation speed
 
 
-def rerank_docs(query: str, docs: list) -> list:
+# ⚡ Breakers skip a degraded dependency immediately instead of waiting out its timeout
+rerank_breaker     = get_breaker("rerank", slow_call_s=4.0)
+summarizer_breaker = get_breaker("summarizer")
+vision_breaker     = get_breaker("vision")
+
+
+def rerank_docs(query: str, docs: list, top_k: int = RERANK_TOP_K, timeout: float = 6,
+                usage: Optional[RequestUsage] = None) -> list:
     if not docs:
         return docs
+    if not rerank_breaker.allow():
+        logger.info("Reranker circuit open, using initial order", extra={"stage": "rerank"})
+        return docs[:top_k]
+    # Rerank is optional: if the shared OpenRouter quota is busy with live chat, skip it
+    if not openrouter_scheduler.acquire(RERANK, timeout=min(1.0, timeout)):
+        logger.info("OpenRouter quota busy, skipping rerank", extra={"stage": "rerank"})
+        return docs[:top_k]
         
     doc_texts = [doc.page_content for doc in docs]
     headers = {
@@ -78,18 +135,24 @@ def rerank_docs(query: str, docs: list) -> list:
         "model": RERANK_MODEL,
         "query": query,
         "documents": doc_texts,
-        "top_n": RERANK_TOP_K  # Since boosting is removed, we just request the exact Top K needed
+        "top_n": top_k  # Since boosting is removed, we just request the exact Top K needed
     }
     
+    started = time.monotonic()
     try:
         response = requests.post(
-            "https://openrouter.ai/api/v1/rerank",
+            f"{OPENROUTER_BASE_URL}/rerank",
             headers=headers,
             json=payload,
-            timeout=6
+            timeout=timeout
         )
+        report_rate_limit(response)
         response.raise_for_status()
-        api_results = response.json().get("results", [])
+        body = response.json()
+        api_results = body.get("results", [])
+        if usage is not None:
+            reported = body.get("usage") or {}
+            usage.record("rerank", RERANK_MODEL, reported.get("total_tokens") or estimate_tokens(query + "".join(doc_texts)))
         
         # Map returned indices back to the original documents
         top_docs = []
@@ -98,41 +161,151 @@ def rerank_docs(query: str, docs: list) -> list:
             if doc_idx < len(docs):
                 top_docs.append(docs[doc_idx])
                 
-        print(f"Reranked via OpenRouter {len(docs)} → top {len(top_docs)} docs")
+        rerank_breaker.record_success(time.monotonic() - started)
+        logger.debug("Reranked via OpenRouter", extra={"stage": "rerank", "docs_in": len(docs), "docs_out": len(top_docs)})
         return top_docs
         
     except Exception as e:
-        print(f"OpenRouter Reranking API failed (falling back to initial order): {e}")
-        return docs[:RERANK_TOP_K]
+        rerank_breaker.record_failure(time.monotonic() - started)
+        logger.warning("Rerank failed, using initial order: %s", e, extra={"stage": "rerank"})
+        return docs[:top_k]
 
 
 # --- MODEL INSTANTIATION ---
 primary_model = ChatOpenAI(
     model=CHAT_MODEL_NAME,
     openai_api_key=OPENROUTER_API_KEY,
-    openai_api_base="https://openrouter.ai/api/v1",
+    openai_api_base=OPENROUTER_BASE_URL,
     temperature=0.2,
     timeout=30,
+    stream_usage=True,   # token counts arrive on the last streamed chunk (see rag/usage.py)
 )
 
 fallback_model = ChatOpenAI(
     model=FALLBACK_MODEL_NAME,
     openai_api_key=OPENROUTER_API_KEY,
-    openai_api_base="https://openrouter.ai/api/v1",
+    openai_api_base=OPENROUTER_BASE_URL,
     temperature=0.3,
     timeout=30,
+    stream_usage=True,
 )
 
 chatModel = primary_model.with_fallbacks([fallback_model])
 
+_chat_models_by_profile = {}
+
+
+def _bind_max_tokens(model, max_tokens: Optional[int]):
+    return model.bind(max_tokens=max_tokens) if max_tokens else model
+
+
+def get_chat_model(profile: PipelineProfile):
+    """Returns the streaming chat runnable for a profile (model choice + max_tokens)."""
+    key = (profile.chat_model, profile.max_tokens)
+    if key not in _chat_models_by_profile:
+        model = fallback_model if profile.chat_model == "fallback" else chatModel
+        _chat_models_by_profile[key] = _bind_max_tokens(model, profile.max_tokens)
+    return _chat_models_by_profile[key]
+
+
+def get_chat_candidates(profile: PipelineProfile) -> List[tuple]:
+    """(model name, runnable) pairs in hedging order for a profile."""
+    fallback = (FALLBACK_MODEL_NAME, _bind_max_tokens(fallback_model, profile.max_tokens))
+    if profile.chat_model == "fallback":
+        return [fallback]
+    return [(CHAT_MODEL_NAME, _bind_max_tokens(primary_model, profile.max_tokens)), fallback]
+
 summarizer = ChatOpenAI(
     model=SUMMARIZER_MODEL_NAME,
     openai_api_key=OPENROUTER_API_KEY,
-    openai_api_base="https://openrouter.ai/api/v1",
+    openai_api_base=OPENROUTER_BASE_URL,
     temperature=0,
     timeout=30,
 )
 
+query_rewriter = LocalQueryRewriter(embeddings, min_similarity=LOCAL_REWRITE_MIN_SIMILARITY)
+
+# Last student context built per (uid, consent), reused when the deadline is too tight for DynamoDB.
+# An LRU of STUDENT_CONTEXT_CACHE_SIZE entries, filled and read from the pipeline's worker threads.
+_student_context_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_student_context_lock = threading.Lock()
+
+
+def _cached_student_context(key: tuple) -> Optional[str]:
+    with _student_context_lock:
+        context = _student_context_cache.get(key)
+        if context is not None:
+            _student_context_cache.move_to_end(key)
+        return context
+
+
+def _remember_student_context(key: tuple, context: str):
+    with _student_context_lock:
+        _student_context_cache[key] = context
+        _student_context_cache.move_to_end(key)
+        while len(_student_context_cache) > STUDENT_CONTEXT_CACHE_SIZE:
+            _student_context_cache.popitem(last=False)
+
+
+def _measure_student_contexts():
+    with _student_context_lock:
+        return len(_student_context_cache), approx_bytes(_student_context_cache)
+
+
+# Chat state per thread_id. Guests' history lives only here, so evicting a thread
+# (see src/memory.py) makes that guest's next turn start a fresh conversation.
+checkpointer = InMemorySaver()
+
+
+# ====== Memory Accounting ======
+def _serialized_len(value) -> int:
+    """Bytes inside a checkpointer record: serde output is (type, bytes), nested in tuples."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_serialized_len(v) for v in value)
+    return 0
+
+
+def _measure_checkpoints():
+    records = [
+        record for namespaces in list(checkpointer.storage.values())
+        for checkpoints in list(namespaces.values()) for record in list(checkpoints.values())
+    ]
+    size = _serialized_len(records)
+    size += sum(_serialized_len(list(w.values())) for w in list(checkpointer.writes.values()))
+    size += _serialized_len(list(checkpointer.blobs.values()))
+    return len(checkpointer.storage), size
+
+
+def _evict_checkpoints(fraction: float) -> int:
+    """Deletes the least recently updated threads (checkpoint ids are uuid6, so they sort by time)."""
+    latest = {
+        thread_id: max((cid for ns in list(namespaces.values()) for cid in list(ns)), default="")
+        for thread_id, namespaces in list(checkpointer.storage.items())
+    }
+    victims = sorted(latest, key=latest.get)[:max(1, int(len(latest) * fraction))] if latest else []
+    for thread_id in victims:
+        checkpointer.delete_thread(thread_id)
+    return len(victims)
+
+
+def _measure_embeddings():
+    model = getattr(embeddings, "_client", None) or getattr(embeddings, "client", None)
+    tensors = list(model.parameters()) + list(model.buffers())
+    return 1, sum(t.numel() * t.element_size() for t in tensors)
+
+
+memory_registry.register("graph_checkpoints", _measure_checkpoints, _evict_checkpoints)
+memory_registry.register("embedding_model", _measure_embeddings)
+memory_registry.register("bm25_encoder", lambda: (len(bm25.doc_freq or {}), approx_bytes(bm25.doc_freq or {})))
+memory_registry.register("pinecone_client", lambda: (1, approx_bytes(index)))
+memory_registry.register(
+    "student_context_cache",
+    _measure_student_contexts,
+    evict_oldest(_student_context_cache, _student_context_lock),
+)
+
 # ====== Chat State ======
 class ChatState(TypedDict):
     input: str
@@ -142,6 +315,7 @@ class ChatState(TypedDict):
     uid: Optional[str]
     user_email: Optional[str]
     data_consent: Optional[bool]
+    profile: Optional[str]
     messages_to_llm: Optional[list]
 
 
@@ -165,7 +339,7 @@ def docs_to_context(docs) -> str:
     return "\n\n---\n\n".join(context_parts)
 
 
-def summarize_history(history: List[Dict[str, str]]) -> str:
+def summarize_history(history: List[Dict[str, str]], usage: Optional[RequestUsage] = None) -> str:
     if not history:
         return ""
     transcript = "\n".join([f"{m['role']}: {m['content']}" for m in history])
@@ -173,7 +347,72 @@ def summarize_history(history: List[Dict[str, str]]) -> str:
         {"role": "system", "content": "Summarize the conversation to retain key context."},
         {"role": "user",   "content": transcript},
     ]
-    return summarizer.invoke(prompt).content
+    reply = summarizer_breaker.call(call_openrouter, INTERACTIVE, summarizer.invoke, prompt)
+    if usage is not None:
+        usage.record_reply("summarize", SUMMARIZER_MODEL_NAME, prompt, reply)
+    return reply.content
+
+
+def llm_contextualize(user_text: str, history: List[Dict[str, str]], usage: Optional[RequestUsage] = None) -> str:
+    """Rewrites the latest question into a standalone search query with the summarizer model."""
+    recent_history = "\n".join([f"{m['role'].title()}: {m['content']}" for m in history[-6:]]) if history else "No previous history."
+    context_prompt = [
+        {
+            "role": "system", 
+            "content": (
+                "You are a search query optimizer. Understand the user's intent and the provided context first. Formulate the best search query for RAG that uses sparse and dense retrieval. If you cannot understand the user's intent, return the user's original query.\n"
+                "CRITICAL SEARCH RULES: \n"
+                "1. CONTEXT AWARENESS: Only check chat history if the user asks and it is not a complete question.\n"
+                "2. Do NOT answer the question, just output the optimized search query."
+            )
+        },
+        {"role": "user", "content": f"Chat History:\n{recent_history}\n\nLatest Question: {user_text}"}
+    ]
+    
+    reply = summarizer_breaker.call(call_openrouter, INTERACTIVE, summarizer.invoke, context_prompt)
+    if usage is not None:
+        usage.record_reply("rewrite", SUMMARIZER_MODEL_NAME, context_prompt, reply)
+    summary_resp = reply.content
+    
+    if isinstance(summary_resp, list):
+        summary_resp = "".join([
+            part.get("text", "") if isinstance(part, dict) else str(part)
+            for part in summary_resp
+        ])
+    elif not isinstance(summary_resp, str):
+        summary_resp = str(summary_resp)
+        
+    return summary_resp.strip() or user_text
+
+
+def contextualize_query(user_text: str, history: List[Dict[str, str]], mode: str = QUERY_REWRITE_MODE,
+                        usage: Optional[RequestUsage] = None) -> str:
+    """
+    ⚡ OPTIMIZATION: Local coreference/ellipsis rewrite runs in milliseconds on CPU.
+    The LLM rewriter is only called when the local engine flags the query as ambiguous.
+    """
+    if mode == "off":
+        return user_text
+    local_query = user_text
+    try:
+        if mode != "llm":
+            local = query_rewriter.rewrite(user_text, history)
+            logger.debug("Local rewrite: %s", local.query, extra={
+                "stage": "rewrite", "reason": local.reason, "elapsed_ms": round(local.elapsed_ms, 1),
+            })
+            local_query = local.query or user_text
+            if not local.ambiguous or mode == "local":
+                return local_query
+
+        q = llm_contextualize(user_text, history, usage=usage)
+        logger.debug("LLM rewrite: %s", q, extra={"stage": "rewrite"})
+        return q
+    except CircuitOpenError:
+        logger.info("Summarizer circuit open, keeping local rewrite", extra={"stage": "rewrite"})
+        return local_query
+    except Exception as e:
+        logger.warning("Contextualization failed (non-fatal): %s", e, extra={"stage": "rewrite"})
+        return local_query
 
 
 def safe_prompt(template: str, **kwargs) -> str:
@@ -183,36 +422,65 @@ def safe_prompt(template: str, **kwargs) -> str:
     return result
 
 
+@contextmanager
+def pipeline_stage(trace, name: str):
+    """Times a pipeline stage for /metrics and records it as a span of the request trace."""
+    with stage_timer(name), trace.span(name, parent="pipeline") as span:
+        yield span
+
+
+def doc_ids(docs) -> List[str]:
+    return [f"{d.metadata.get('source', 'Unknown')}#p{d.metadata.get('page', '?')}" for d in docs]
+
+
 # ====== LangGraph ======
 def create_graph():
     graph = StateGraph(ChatState)
 
-    def call_llm(state: ChatState):
+    def call_llm(state: ChatState, config: RunnableConfig):
         try:
             user_text  = state["input"]
             image_data = state.get("image_data")
             history    = state.get("chat_history", [])
             uid        = state.get("uid")
             user_email = state.get("user_email")
+            profile    = get_profile(state.get("profile"))
+            deadline   = deadline_from_config(config)
+            trace      = trace_from_config(config)
+            usage      = usage_from_config(config)
+            student_cache_key = (uid, state.get("data_consent") is not False)
 
             # 🚀 PARALLEL TASK 1: Image Analysis
+            @pipeline_stage(trace, "vision")
             def task_image_analysis():
                 if not image_data: return None
+                if not deadline.allows("vision"):
+                    deadline.degrade("vision", "skipped")
+                    return None
                 vision_msg = HumanMessage(content=[
                     {"type": "text", "text": "Transcribe any text in this image and describe the visual layout in detail."},
                     {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}},
                 ])
                 try:
-                    desc = summarizer.invoke([vision_msg]).content
-                    print(f"Image Analysis: {desc}")
+                    reply = vision_breaker.call(call_openrouter, INTERACTIVE, summarizer.invoke, [vision_msg])
+                    usage.record_reply("vision", SUMMARIZER_MODEL_NAME, [vision_msg], reply)
+                    desc = reply.content
+                    logger.debug("Image analysis: %s", desc, extra={"stage": "vision"})
                     return desc
                 except Exception as e:
-                    print(f"Image analysis failed (non-fatal): {e}")
+                    logger.warning("Image analysis failed (non-fatal): %s", e, extra={"stage": "vision"})
                     return None
 
             # 🚀 PARALLEL TASK 2: DynamoDB Student Record Fetch
+            @pipeline_stage(trace, "student_fetch")
             def task_student_fetch():
                 if not uid: return ""
+                cached = None if deadline.allows("student_fetch") else _cached_student_context(student_cache_key)
+                if cached is not None:
+                    deadline.degrade("student_fetch", "cached")
+                    count_cache("student_context", "hit")
+                    return cached
+                count_cache("student_context", "miss")
                 try:
                     # Always fetch the record so the system knows WHO they are
                     student = get_student_by_uid(uid)
@@ -222,103 +490,117 @@ def create_graph():
                     if student:
                         # If user disabled data consent, provide ONLY basic academic context for personalization
                         if state.get("data_consent") is False:
-                            print("  Data consent disabled. Providing basic profile only.")
-                            return (
+                            logger.debug("Data consent disabled, basic profile only", extra={"stage": "student_fetch"})
+                            context = (
                                 "System Note: The user has explicitly opted out of sharing their personal student data. "
                                 "Do not provide specific grades, balances, or schedules."
                                 "The user has account so he/she is a continuing student already but no further details are available due to privacy settings. "
                                 f"Name: {student.get('full_name')}, "
                             )
-                        
-                        # Full context if consent is enabled
-                        print(f"  Student record fetched: {student.get('full_name')} | balance: PHP {student.get('balance', 'N/A')}")
-                        return format_student_context(student)
+                        else:
+                            # Full context if consent is enabled
+                            logger.debug("Student record fetched", extra={"stage": "student_fetch"})
+                            context = format_student_context(student)
+                        _remember_student_context(student_cache_key, context)
+                        return context
                     else:
-                        print("  No student record found for this user.")
+                        logger.info("No student record found for this user", extra={"stage": "student_fetch"})
                         return f"System Note: User is logged in as {user_email} but no record was found."
                 except Exception as e:
-                    print(f"  Student record fetch failed (non-fatal): {e}")
+                    logger.warning("Student record fetch failed (non-fatal): %s", e, extra={"stage": "student_fetch"})
                     return ""
 
             # 🚀 PARALLEL TASK 3: Query Optimization
+            @pipeline_stage(trace, "rewrite")
             def task_query_optimization():
+                mode = profile.rewrite
+                if mode in ("hybrid", "llm") and not deadline.allows("llm_rewrite"):
+                    deadline.degrade("rewrite", "local")
+                    mode = "local"
+                return contextualize_query(user_text, history, mode=mode, usage=usage)
+
+            def task_fallback_query():
                 try:
-                    recent_history = "\n".join([f"{m['role'].title()}: {m['content']}" for m in history[-6:]]) if history else "No previous history."
-                    context_prompt = [
-                        {
-                            "role": "system", 
-                            "content": (
-                                "You are a search query optimizer. Understand the user's intent and the provided context first. Formulate the best search query for RAG that uses sparse and dense retrieval. If you cannot understand the user's intent, return the user's original query.\n"
-                                "CRITICAL SEARCH RULES: \n"
-                                "1. CONTEXT AWARENESS: Only check chat history if the user asks and it is not a complete question.\n"
-                                "2. Do NOT answer the question, just output the optimized search query."
-                            )
-                        },
-                        {"role": "user", "content": f"Chat History:\n{recent_history}\n\nLatest Question: {user_text}"}
-                    ]
-                    
-                    summary_resp = summarizer.invoke(context_prompt).content
-                    
-                    if isinstance(summary_resp, list):
-                        summary_resp = "".join([
-                            part.get("text", "") if isinstance(part, dict) else str(part)
-                            for part in summary_resp
-                        ])
-                    elif not isinstance(summary_resp, str):
-                        summary_resp = str(summary_resp)
-                        
-                    q = summary_resp.strip()
-                    print(f"  Contextualized Query: {q}")
-                    return q
-                except Exception as e:
-                    print(f"  Contextualization failed (non-fatal): {e}")
+                    return contextualize_query(user_text, history, mode="local")
+                except Exception:
                     return user_text
 
             # 🚀 EXECUTE ALL 3 TASKS SIMULTANEOUSLY
-            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-                future_img     = executor.submit(task_image_analysis)
-                future_student = executor.submit(task_student_fetch)
-                future_query   = executor.submit(task_query_optimization)
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
+            future_img     = executor.submit(in_request_context(task_image_analysis))
+            future_student = executor.submit(in_request_context(task_student_fetch))
+            future_query   = executor.submit(in_request_context(task_query_optimization))
 
-                # Wait for them to finish and collect results instantly
-                image_description = future_img.result()
-                student_context   = future_student.result()
-                standalone_query  = future_query.result()
+            # Wait only as long as the deadline allows; stragglers are abandoned, not awaited
+            def collect(future, stage, fallback, fallback_name):
+                try:
+                    return future.result(timeout=max(0.1, deadline.remaining_for_stages()))
+                except concurrent.futures.TimeoutError:
+                    deadline.degrade(stage, fallback_name)
+                    return fallback()
+
+            image_description = collect(future_img, "vision", lambda: None, "skipped")
+            student_context   = collect(
+                future_student, "student_fetch",
+                lambda: _cached_student_context(student_cache_key) or "", "cached",
+            )
+            standalone_query  = collect(future_query, "rewrite", task_fallback_query, "local")
+            executor.shutdown(wait=False)
+            trace.set(rewritten_query=standalone_query, image_described=bool(image_description))
 
             # === STEP 1: Retrieval ===
-            print(f"\n=== STEP 1: Retrieval (Query: '{standalone_query}') ===")
             try:
-                initial_docs = retriever.invoke(standalone_query)
-                print(f"  RRF returned {len(initial_docs)} candidates")
+                with pipeline_stage(trace, "retrieval") as span:
+                    initial_docs = get_retriever(profile.top_k).invoke(standalone_query)
+                    span.set(top_k=profile.top_k, candidates=doc_ids(initial_docs))
+                logger.debug("Retrieved: %s", standalone_query, extra={"stage": "retrieval", "candidates": len(initial_docs)})
             except Exception as e:
-                print(f"  Retrieval failed (non-fatal): {e}")
+                logger.warning("Retrieval failed (non-fatal): %s", e, extra={"stage": "retrieval"})
                 initial_docs = []
 
             # === STEP 2: Reranking ===
-            print(f"\n=== STEP 2: Reranking to top {RERANK_TOP_K} ===")
             try:
-                reranked_docs = rerank_docs(standalone_query, initial_docs)
-                for i, doc in enumerate(reranked_docs):
-                    src     = doc.metadata.get("source", "Unknown")
-                    pg      = doc.metadata.get("page", "?")
-                    snippet = doc.page_content.replace("\n", " ")[:80]
-                    print(f"  [{i+1}] {src} (Pg {pg}): {snippet}...")
+                if not profile.rerank:
+                    reranked_docs = initial_docs[:profile.rerank_top_k]
+                    trace.event("rerank", parent="pipeline", outcome="disabled")
+                elif not deadline.allows("rerank"):
+                    deadline.degrade("rerank", "skipped")
+                    reranked_docs = initial_docs[:profile.rerank_top_k]
+                    trace.event("rerank", parent="pipeline", outcome="skipped")
+                else:
+                    with pipeline_stage(trace, "rerank") as span:
+                        reranked_docs = rerank_docs(
+                            standalone_query, initial_docs,
+                            top_k=profile.rerank_top_k, timeout=deadline.timeout(6), usage=usage,
+                        )
+                        span.set(outcome="done", kept=doc_ids(reranked_docs))
+                # ⚡ OPTIMIZATION: per-document snippets are only built when DEBUG is on
+                if logger.isEnabledFor(logging.DEBUG):
+                    for i, doc in enumerate(reranked_docs):
+                        logger.debug("Context doc %d: %s", i + 1, doc.page_content.replace("\n", " ")[:80], extra={
+                            "stage": "rerank", "source": doc.metadata.get("source", "Unknown"),
+                            "page": doc.metadata.get("page", "?"),
+                        })
             except Exception as e:
-                print(f"  Reranking failed (non-fatal): {e}")
-                reranked_docs = initial_docs[:RERANK_TOP_K]
+                logger.warning("Reranking failed (non-fatal): %s", e, extra={"stage": "rerank"})
+                reranked_docs = initial_docs[:profile.rerank_top_k]
 
             context_str = docs_to_context(reranked_docs)
 
             # === STEP 3: Handle Conversation Summary ===
-            if len(history) > 10:
+            if len(history) > 10 and not deadline.allows("summarize"):
+                deadline.degrade("summarize", "truncated")
+                history = history[-6:]
+            elif len(history) > 10:
                 try:
-                    summary = summarize_history(history[:-6])
+                    with pipeline_stage(trace, "summarize"):
+                        summary = summarize_history(history[:-6], usage=usage)
                     history = [
                         {"role": "system",
                          "content": f"Previous conversation summary: {summary}"}
                     ] + history[-6:]
                 except Exception as e:
-                    print(f"  History summarization failed (non-fatal): {e}")
+                    logger.warning("History summarization failed (non-fatal): %s", e, extra={"stage": "summarize"})
                     history = history[-6:]
 
             history_str = "\n".join(
@@ -351,12 +633,19 @@ def create_graph():
             else:
                 messages.append(HumanMessage(content=user_text))
 
+            trace.event(
+                "prompt", parent="pipeline",
+                system_tokens=estimate_tokens(final_system_prompt),
+                context_tokens=estimate_tokens(context_str),
+                history_tokens=estimate_tokens(history_str),
+                question_tokens=estimate_tokens(user_text),
+            )
+
             # Pass compiled state back out to Flask to generate the SSE tokens
             return {"messages_to_llm": messages, "chat_history": history}
 
-        except Exception as e:
-            import traceback
-            print(f"[chain] Unhandled error: {traceback.format_exc()}")
+        except Exception:
+            logger.exception("Context compilation failed")
             return {
                 "messages_to_llm": [],
                 "chat_history": state.get("chat_history", []),
@@ -365,6 +654,6 @@ def create_graph():
     graph.add_node("llm", call_llm)
     graph.set_entry_point("llm")
     graph.add_edge("llm", END)
-    return graph.compile(checkpointer=InMemorySaver())
+    return graph.compile(checkpointer=checkpointer)
 
 app_graph = create_graph()
\ No newline at end of file
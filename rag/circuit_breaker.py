@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from config import BREAKER_ERROR_RATE, BREAKER_OPEN_SECONDS, BREAKER_MAX_OPEN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# ====== Circuit Breakers ======
+# Wrap the OpenRouter dependencies (reranker, summarizer/vision, chat models) so
+# that once one is clearly degraded, requests skip it immediately instead of
+# each waiting out the full timeout. After a cool-down a single probe call is
+# let through (half-open); success closes the breaker, failure re-opens it with
+# a longer cool-down.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_call_s: Optional[float] = None,
+        open_for_s: float = BREAKER_OPEN_SECONDS,
+        max_open_for_s: float = BREAKER_MAX_OPEN_SECONDS,
+    ):
+        """
+        :param window: number of recent calls the error rate is computed over
+        :param min_calls: calls needed in the window before the breaker may open
+        :param error_rate: failure ratio (errors + slow calls) that opens the breaker
+        :param slow_call_s: calls slower than this count as failures (None = never)
+        :param open_for_s: initial cool-down before a half-open probe
+        :param max_open_for_s: cap for the cool-down, which doubles on each failed probe
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_s = slow_call_s
+        self.base_open_for_s = open_for_s
+        self.max_open_for_s = max_open_for_s
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # (ok: bool, latency_s: float)
+        self._state = CLOSED
+        self._open_for_s = open_for_s
+        self._opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+        self._times_opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go through now; moves OPEN -> HALF_OPEN after the cool-down."""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and now - self._opened_at >= self._open_for_s:
+                self._state = HALF_OPEN
+                self._probe_started_at = None
+            if self._state == HALF_OPEN:
+                # One probe at a time; a probe that never reported back is replaced
+                if self._probe_started_at is None or now - self._probe_started_at > self._open_for_s:
+                    self._probe_started_at = now
+                    return True
+            self._rejected += 1
+            return False
+
+    def record_success(self, latency_s: float = 0.0):
+        if self.slow_call_s is not None and latency_s > self.slow_call_s:
+            self.record_failure(latency_s)
+            return
+        with self._lock:
+            self._outcomes.append((True, latency_s))
+            if self._state == HALF_OPEN:
+                logger.info("Breaker %s closed after successful probe", self.name, extra={"breaker": self.name})
+                self._state = CLOSED
+                self._open_for_s = self.base_open_for_s
+                self._outcomes.clear()
+
+    def record_failure(self, latency_s: float = 0.0):
+        with self._lock:
+            self._outcomes.append((False, latency_s))
+            if self._state == HALF_OPEN:
+                self._open_for_s = min(self.max_open_for_s, self._open_for_s * 2)
+                self._trip()
+                return
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for ok, _ in self._outcomes if not ok)
+                if failures / len(self._outcomes) >= self.error_rate:
+                    self._trip()
+
+    def record_cancelled(self):
+        """A call abandoned by the caller: no outcome, but a half-open probe slot is freed."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_started_at = None
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._times_opened += 1
+        logger.warning("Breaker %s OPEN for %.0fs", self.name, self._open_for_s, extra={"breaker": self.name})
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Runs fn through the breaker, raising CircuitOpenError while it is open."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure(time.monotonic() - start)
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            outcomes = list(self._outcomes)
+            latencies = sorted(lat for _, lat in outcomes)
+            retry_in = 0.0
+            if self._state == OPEN:
+                retry_in = max(0.0, self._open_for_s - (time.monotonic() - self._opened_at))
+            return {
+                "state":        self._state,
+                "window_calls": len(outcomes),
+                "error_rate":   round(sum(1 for ok, _ in outcomes if not ok) / len(outcomes), 3) if outcomes else 0.0,
+                "p50_latency_s": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                "times_opened": self._times_opened,
+                "rejected":     self._rejected,
+                "retry_in_s":   round(retry_in, 1),
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Returns the process-wide breaker for `name`, creating it on first use."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **kwargs)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, dict]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ====== Request Deadlines ======
+# A Deadline is created once per /chat/get request from the pipeline profile's
+# latency budget and handed to every stage. Stages ask it whether optional work
+# still fits and record a degradation when they fall back to something cheaper.
+
+# Rough wall-clock cost of each stage, used to decide whether it still fits in
+# the remaining budget before it is started.
+STAGE_COST_S = {
+    "vision":        6.0,
+    "llm_rewrite":   3.0,
+    "student_fetch": 0.5,
+    "rerank":        1.5,
+    "summarize":     4.0,
+}
+
+
+class Deadline:
+    def __init__(self, budget_s: float, reserve_s: float = 0.0):
+        """
+        :param budget_s: end-to-end budget for the request, in seconds
+        :param reserve_s: part of the budget kept free for time-to-first-token
+        """
+        self.budget_s = budget_s
+        self.reserve_s = reserve_s
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_s
+        self._lock = threading.Lock()
+        self.degradations: List[str] = []
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        """Seconds left before the whole request is over budget."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def remaining_for_stages(self) -> float:
+        """Seconds left for pre-generation stages once the TTFT reserve is set aside."""
+        return max(0.0, self.remaining() - self.reserve_s)
+
+    def expired(self) -> bool:
+        return self.remaining_for_stages() <= 0
+
+    def allows(self, stage: str) -> bool:
+        """True if `stage` is expected to finish without eating into the TTFT reserve."""
+        return STAGE_COST_S.get(stage, 0.0) <= self.remaining_for_stages()
+
+    def timeout(self, default: float, minimum: float = 0.5) -> float:
+        """Caps a stage's own timeout to what is left of the budget."""
+        return max(minimum, min(default, self.remaining_for_stages()))
+
+    def degrade(self, stage: str, fallback: str):
+        """Records that `stage` was skipped or replaced by `fallback`."""
+        entry = f"{stage}:{fallback}"
+        with self._lock:
+            self.degradations.append(entry)
+        logger.info("Degraded %s", entry, extra={
+            "stage": stage, "fallback": fallback, "remaining_s": round(self.remaining(), 1), "budget_s": self.budget_s,
+        })
+
+    def summary(self) -> dict:
+        return {
+            "budget_s":     self.budget_s,
+            "elapsed_s":    round(self.elapsed(), 3),
+            "degradations": list(self.degradations),
+        }
+
+
+def deadline_from_config(config: Optional[dict]) -> Deadline:
+    """Pulls the request deadline out of a LangGraph run config (unbounded if absent)."""
+    deadline = ((config or {}).get("configurable") or {}).get("deadline")
+    return deadline if isinstance(deadline, Deadline) else Deadline(float("inf"))
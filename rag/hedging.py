@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY_S, HEDGE_MIN_DELAY_S, HEDGE_MAX_DELAY_S,
+    OPENROUTER_INTERACTIVE_WAIT_S
+)
+from rag.circuit_breaker import get_breaker, CircuitOpenError
+from src.rate_limiter import openrouter_scheduler, report_rate_limit, INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# ====== Hedged Streaming ======
+# `with_fallbacks` only moves to the fallback model after the primary raises,
+# which on free-tier models usually means sitting out the 30s client timeout.
+# Hedging starts the fallback as soon as the primary is slower than it usually
+# is to produce a first token, streams whichever model answers first and
+# cancels the other.
+
+MIN_SAMPLES = 10
+
+
+class TTFTStats:
+    """Rolling time-to-first-token samples per model."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        """Returns the pct-th percentile (0-100), or None until enough samples exist."""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        k = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[k]
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            models = {m: sorted(s) for m, s in self._samples.items()}
+        out = {}
+        for model, samples in models.items():
+            if not samples:
+                continue
+            pick = lambda p: samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+            out[model] = {"count": len(samples), "p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99)}
+        return out
+
+
+ttft_stats = TTFTStats()
+
+
+def hedge_delay(model: str) -> float:
+    """Seconds to wait for the primary's first token before also starting the fallback."""
+    observed = ttft_stats.percentile(model, HEDGE_PERCENTILE)
+    if observed is None:
+        return HEDGE_DEFAULT_DELAY_S
+    return min(HEDGE_MAX_DELAY_S, max(HEDGE_MIN_DELAY_S, observed))
+
+
+def _chunk_has_text(chunk) -> bool:
+    content = getattr(chunk, "content", None)
+    if isinstance(content, list):
+        return any(isinstance(b, dict) and b.get("text") for b in content)
+    return bool(content)
+
+
+class _StreamWorker(threading.Thread):
+    """Streams one model into the shared event queue until done or cancelled."""
+
+    def __init__(self, name: str, runnable, messages: list, events: queue.Queue):
+        super().__init__(daemon=True, name=f"hedge-{name}")
+        self.model_name = name
+        self.runnable = runnable
+        self.messages = messages
+        self.events = events
+        self.cancelled = threading.Event()
+        self.started_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+
+    def run(self):
+        stream = None
+        try:
+            # Live chat outranks rerank and ingestion for the shared OpenRouter quota
+            openrouter_scheduler.acquire(INTERACTIVE, timeout=OPENROUTER_INTERACTIVE_WAIT_S, overdraft=True)
+            if self.cancelled.is_set():
+                return
+            stream = self.runnable.stream(self.messages)
+            for chunk in stream:
+                if self.cancelled.is_set():
+                    return
+                if self.first_token_at is None:
+                    if not _chunk_has_text(chunk):
+                        continue
+                    self.first_token_at = time.monotonic()
+                self.events.put((self.model_name, "chunk", chunk))
+            self.events.put((self.model_name, "end", None))
+        except Exception as e:
+            report_rate_limit(e)
+            self.events.put((self.model_name, "error", e))
+        finally:
+            # Closing the generator drops the HTTP stream of a cancelled model
+            if stream is not None and hasattr(stream, "close"):
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+
+    def ttft(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+def _allowed_candidates(candidates: List[Tuple[str, object]]) -> List[Tuple[str, object]]:
+    """Models whose breaker is open are skipped outright; if every breaker is open, fail fast."""
+    allowed = [(name, r) for name, r in candidates if get_breaker(f"chat:{name}").allow()]
+    if not allowed:
+        raise CircuitOpenError("All chat model circuits are open")
+    return allowed
+
+
+def _release_probes(candidates, started, winner, failed):
+    """
+    Frees the half-open probe slots _allowed_candidates took for models that will report
+    no outcome: candidates never started because an earlier one answered first, and,
+    if the race ended without a winner, started ones that neither won nor failed.
+    """
+    for name, _ in candidates[len(started):]:
+        get_breaker(f"chat:{name}").record_cancelled()
+    if winner is None:
+        for attempt in started:
+            if attempt.model_name not in failed:
+                get_breaker(f"chat:{attempt.model_name}").record_cancelled()
+
+
+def _hedge_at(name: str, max_delay: Optional[float]) -> float:
+    delay = hedge_delay(name)
+    if max_delay is not None:
+        delay = min(delay, max_delay)
+    return time.monotonic() + delay
+
+
+def _crown(winner, workers, failed):
+    """Records the winner's TTFT and cancels the rest."""
+    now = time.monotonic()
+    ttft_stats.record(winner.model_name, winner.ttft())
+    get_breaker(f"chat:{winner.model_name}").record_success(winner.ttft())
+    for other in workers:
+        if other is winner:
+            continue
+        other.cancel()
+        if other.model_name in failed:
+            continue
+        # A loser still waiting has a TTFT of at least its wait so far. Leaving it out
+        # would keep only the fast runs of a slow primary and pull its hedge delay down.
+        ttft = other.ttft()
+        ttft_stats.record(other.model_name, ttft if ttft is not None else now - other.started_at)
+        # Losing a race is not a failure
+        get_breaker(f"chat:{other.model_name}").record_cancelled()
+
+
+def _record_early_failure(worker, kind: str, payload):
+    get_breaker(f"chat:{worker.model_name}").record_failure(time.monotonic() - worker.started_at)
+    if kind == "error":
+        logger.warning("%s failed before first token: %s", worker.model_name, payload, extra={"stage": "hedge"})
+
+
+def hedged_stream(
+    candidates: List[Tuple[str, object]],
+    messages: list,
+    max_delay: Optional[float] = None,
+    on_winner: Optional[Callable[[str], None]] = None,
+) -> Iterator:
+    """
+    Yields chunks from the first of `candidates` (model name, runnable) to produce a token.
+    The next candidate is started when the current one misses its hedge delay or fails
+    before its first token. `max_delay` caps the hedge delay (e.g. the request deadline).
+    `on_winner` is called with the name of the model that ends up streaming.
+    """
+    candidates = _allowed_candidates(candidates)
+
+    events: queue.Queue = queue.Queue()
+    workers: List[_StreamWorker] = []
+    failed = set()
+    winner: Optional[_StreamWorker] = None
+    last_error: Optional[Exception] = None
+    hedge_at = 0.0
+
+    def start_next(reason: str = ""):
+        nonlocal hedge_at
+        name, runnable = candidates[len(workers)]
+        worker = _StreamWorker(name, runnable, messages, events)
+        workers.append(worker)
+        worker.start()
+        hedge_at = _hedge_at(name, max_delay)
+        if reason:
+            logger.info("Started %s: %s", name, reason, extra={"stage": "hedge"})
+
+    try:
+        start_next()
+        while winner is None:
+            timeout = None
+            if len(workers) < len(candidates):
+                timeout = max(0.0, hedge_at - time.monotonic())
+            try:
+                name, kind, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                start_next(f"{workers[-1].model_name} missed its first-token delay")
+                continue
+
+            worker = next(w for w in workers if w.model_name == name)
+            if kind == "chunk":
+                winner = worker
+                _crown(winner, workers, failed)
+                if on_winner:
+                    on_winner(winner.model_name)
+                yield payload
+                break
+
+            # Failed (or empty) before the first token: hedge immediately
+            failed.add(name)
+            _record_early_failure(worker, kind, payload)
+            if kind == "error":
+                last_error = payload
+            if len(workers) < len(candidates):
+                start_next(f"{name} failed before first token")
+            elif len(failed) == len(workers):
+                if last_error is not None:
+                    raise last_error
+                return
+
+        while True:
+            name, kind, payload = events.get()
+            if name != winner.model_name:
+                continue
+            if kind == "chunk":
+                yield payload
+            elif kind == "end":
+                return
+            else:
+                raise payload
+    finally:
+        for worker in workers:
+            worker.cancel()
+        _release_probes(candidates, workers, winner, failed)
+
+
+class _AsyncAttempt:
+    """One model's astream running as an asyncio task (used by the ASGI server)."""
+
+    def __init__(self, name: str, runnable, messages: list, events: asyncio.Queue):
+        self.model_name = name
+        self.started_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.task = asyncio.ensure_future(self._run(runnable, messages, events))
+
+    async def _run(self, runnable, messages, events):
+        try:
+            await openrouter_scheduler.acquire_async(
+                INTERACTIVE, timeout=OPENROUTER_INTERACTIVE_WAIT_S, overdraft=True
+            )
+            async for chunk in runnable.astream(messages):
+                if self.first_token_at is None:
+                    if not _chunk_has_text(chunk):
+                        continue
+                    self.first_token_at = time.monotonic()
+                await events.put((self.model_name, "chunk", chunk))
+            await events.put((self.model_name, "end", None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            report_rate_limit(e)
+            await events.put((self.model_name, "error", e))
+
+    def ttft(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    def cancel(self):
+        # Cancelling the task closes the model's HTTP stream right away
+        self.task.cancel()
+
+
+async def ahedged_stream(
+    candidates: List[Tuple[str, object]],
+    messages: list,
+    max_delay: Optional[float] = None,
+    on_winner: Optional[Callable[[str], None]] = None,
+) -> AsyncIterator:
+    """Async twin of hedged_stream: same hedging policy, no thread per model."""
+    candidates = _allowed_candidates(candidates)
+
+    events: asyncio.Queue = asyncio.Queue()
+    attempts: List[_AsyncAttempt] = []
+    failed = set()
+    winner: Optional[_AsyncAttempt] = None
+    last_error: Optional[Exception] = None
+    hedge_at = 0.0
+
+    def start_next(reason: str = ""):
+        nonlocal hedge_at
+        name, runnable = candidates[len(attempts)]
+        attempts.append(_AsyncAttempt(name, runnable, messages, events))
+        hedge_at = _hedge_at(name, max_delay)
+        if reason:
+            logger.info("Started %s: %s", name, reason, extra={"stage": "hedge"})
+
+    try:
+        start_next()
+        while winner is None:
+            timeout = None
+            if len(attempts) < len(candidates):
+                timeout = max(0.0, hedge_at - time.monotonic())
+            try:
+                name, kind, payload = await asyncio.wait_for(events.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                start_next(f"{attempts[-1].model_name} missed its first-token delay")
+                continue
+
+            attempt = next(a for a in attempts if a.model_name == name)
+            if kind == "chunk":
+                winner = attempt
+                _crown(winner, attempts, failed)
+                if on_winner:
+                    on_winner(winner.model_name)
+                yield payload
+                break
+
+            failed.add(name)
+            _record_early_failure(attempt, kind, payload)
+            if kind == "error":
+                last_error = payload
+            if len(attempts) < len(candidates):
+                start_next(f"{name} failed before first token")
+            elif len(failed) == len(attempts):
+                if last_error is not None:
+                    raise last_error
+                return
+
+        while True:
+            name, kind, payload = await events.get()
+            if name != winner.model_name:
+                continue
+            if kind == "chunk":
+                yield payload
+            elif kind == "end":
+                return
+            else:
+                raise payload
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+        _release_probes(candidates, attempts, winner, failed)
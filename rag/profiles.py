@@ -0,0 +1,115 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+from config import PIPELINE_PROFILE_OVERRIDES, LITE_PROFILE_THRESHOLD
+from rag.deadline import Deadline
+from rag.admission import chat_admission
+
+logger = logging.getLogger(__name__)
+
+# ====== Pipeline Profiles ======
+# One profile is picked per /chat/get request (guest / student / admin, or the
+# "lite" fast path when the worker is busy). It decides how much optional work
+# the RAG pipeline does and how long the whole request may take.
+
+
+@dataclass(frozen=True)
+class PipelineProfile:
+    name: str
+    top_k: int                  # candidates per retriever (sparse + dense)
+    rewrite: str                # "off" | "local" | "hybrid" | "llm"
+    rerank: bool
+    rerank_top_k: int
+    chat_model: str             # "primary" (with fallback) | "fallback"
+    max_tokens: Optional[int]
+    latency_budget_s: float     # end-to-end budget for context compilation + TTFT
+    generation_reserve_s: float # part of the budget kept free for time-to-first-token
+
+    def new_deadline(self) -> Deadline:
+        """Starts the request-scoped deadline for this profile's latency budget."""
+        return Deadline(self.latency_budget_s, reserve_s=self.generation_reserve_s)
+
+
+DEFAULT_PROFILES: Dict[str, PipelineProfile] = {
+    "guest": PipelineProfile(
+        name="guest", top_k=8, rewrite="hybrid", rerank=True, rerank_top_k=5,
+        chat_model="primary", max_tokens=1024,
+        latency_budget_s=15.0, generation_reserve_s=6.0,
+    ),
+    "student": PipelineProfile(
+        name="student", top_k=10, rewrite="hybrid", rerank=True, rerank_top_k=5,
+        chat_model="primary", max_tokens=None,
+        latency_budget_s=25.0, generation_reserve_s=8.0,
+    ),
+    "admin": PipelineProfile(
+        name="admin", top_k=10, rewrite="hybrid", rerank=True, rerank_top_k=5,
+        chat_model="primary", max_tokens=None,
+        latency_budget_s=30.0, generation_reserve_s=8.0,
+    ),
+    # ⚡ Fast path for guests while the worker is saturated
+    "lite": PipelineProfile(
+        name="lite", top_k=5, rewrite="local", rerank=False, rerank_top_k=4,
+        chat_model="fallback", max_tokens=768,
+        latency_budget_s=8.0, generation_reserve_s=5.0,
+    ),
+}
+
+
+def _load_profiles() -> Dict[str, PipelineProfile]:
+    """Applies PIPELINE_PROFILES overrides, e.g. '{"guest": {"top_k": 6, "rerank": false}}'."""
+    profiles = dict(DEFAULT_PROFILES)
+    if not PIPELINE_PROFILE_OVERRIDES:
+        return profiles
+    try:
+        overrides = json.loads(PIPELINE_PROFILE_OVERRIDES)
+        for name, fields in overrides.items():
+            base = profiles.get(name, DEFAULT_PROFILES["student"])
+            profiles[name] = replace(base, name=name, **fields)
+    except Exception as e:
+        logger.warning("Ignoring invalid PIPELINE_PROFILES override: %s", e)
+    return profiles
+
+
+PROFILES = _load_profiles()
+
+
+def get_profile(name: Optional[str]) -> PipelineProfile:
+    return PROFILES.get(name or "", PROFILES["student"])
+
+
+class LoadGauge:
+    """Counts chat requests currently being served by this worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def enter(self):
+        with self._lock:
+            self._active += 1
+
+    def leave(self):
+        with self._lock:
+            self._active = max(0, self._active - 1)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+
+chat_load = LoadGauge()
+
+
+def select_profile(role: str) -> PipelineProfile:
+    """
+    Maps the session role to a profile, degrading guests to "lite" under load and
+    everyone while requests are queueing for admission.
+    """
+    if role == "guest" and chat_load.active >= LITE_PROFILE_THRESHOLD:
+        return PROFILES["lite"]
+    if role != "admin" and chat_admission.overloaded:
+        return PROFILES["lite"]
+    return get_profile(role)
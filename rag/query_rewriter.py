@@ -0,0 +1,207 @@
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ====== Local Query Contextualization ======
+# Cheap CPU-only replacement for the LLM "search query optimizer" call.
+# Self-contained questions are passed through untouched; follow-up questions
+# that lean on the conversation ("how much is it?", "what about BSIT?") get
+# the key terms of the most similar recent turn appended. Only when the local
+# engine cannot decide confidently is the query flagged as ambiguous, and the
+# caller falls back to the LLM rewriter.
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9\-'.]*[A-Za-z0-9]|[A-Za-z0-9]")
+
+# English + common Filipino referring words that point back into the conversation
+REFERENCE_WORDS = {
+    "it", "its", "it's", "these", "those", "they", "them",
+    "their", "theirs", "he", "she", "him", "her", "his", "hers",
+    "same", "former", "latter", "ones", "above", "previous",
+    "ito", "iyan", "yan", "iyon", "yun", "niya", "nila", "sila", "dito", "doon",
+}
+
+# Words that refer back only when they close the question ("how do I apply for that?").
+# Elsewhere they are usually determiners or existentials ("is there a dormitory?",
+# "this semester") in questions that stand on their own.
+WEAK_REFERENCE_WORDS = {"that", "this", "there", "one"}
+
+# Openers that signal an elliptical follow-up ("and for 2nd year?")
+ELLIPSIS_PATTERNS = re.compile(
+    r"^\s*(and|also|or|but|so|then|what about|how about|what if|same (for|with)|"
+    r"how (much|many|long) (is|are|for)|for (the )?(first|second|third|fourth|1st|2nd|3rd|4th)|"
+    r"pano|paano naman|eh|tapos)\b",
+    re.IGNORECASE,
+)
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "then", "so", "of", "to", "in", "on",
+    "at", "by", "for", "with", "from", "about", "as", "into", "is", "are", "was", "were",
+    "be", "been", "being", "do", "does", "did", "have", "has", "had", "can", "could",
+    "will", "would", "should", "may", "might", "must", "shall", "i", "me", "my", "we",
+    "our", "you", "your", "what", "which", "who", "whom", "whose", "when", "where",
+    "why", "how", "much", "many", "long", "please", "tell", "know", "want", "need",
+    "there", "here", "any", "some", "all", "also", "just", "not", "no", "yes", "ok",
+    "okay", "thanks", "thank", "hi", "hello", "get", "give", "like", "more", "less",
+    "very", "really", "ang", "ng", "sa", "mga", "na", "po", "ba", "ko", "mo", "ano",
+    "naman", "lang", "din", "rin", "yung", "kung",
+} | REFERENCE_WORDS | WEAK_REFERENCE_WORDS
+
+
+@dataclass
+class RewriteResult:
+    query: str
+    ambiguous: bool
+    reason: str
+    injected_terms: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text or "")
+
+
+def content_terms(text: str) -> List[str]:
+    """Returns non-stopword terms in order of appearance, de-duplicated case-insensitively."""
+    seen = set()
+    terms = []
+    for tok in tokenize(text):
+        low = tok.lower()
+        if low in STOPWORDS or len(low) < 2 or low in seen:
+            continue
+        seen.add(low)
+        terms.append(tok)
+    return terms
+
+
+def detect_reference_cues(query: str) -> List[str]:
+    """Lists the reasons a query looks like it depends on earlier turns."""
+    cues = []
+    words = [t.lower() for t in tokenize(query)]
+    pronouns = set(words) & REFERENCE_WORDS
+    if words and words[-1] in WEAK_REFERENCE_WORDS:
+        pronouns.add(words[-1])
+    if pronouns:
+        cues.append("pronoun:" + ",".join(sorted(pronouns)))
+    if ELLIPSIS_PATTERNS.search(query):
+        cues.append("ellipsis")
+    # "Tuition?" leans on the conversation; "Where is the library?" does not
+    terms = content_terms(query)
+    if not terms or (len(terms) == 1 and len(words) <= 2):
+        cues.append("too-short")
+    return cues
+
+
+def _is_acronym(term: str) -> bool:
+    return term.isupper() and len(term) >= 2
+
+
+def _term_weight(term: str) -> float:
+    """Acronyms, capitalised names and numbers carry the topic of a turn best."""
+    if _is_acronym(term):
+        return 3.0
+    if term[0].isupper():
+        return 2.0
+    if any(c.isdigit() for c in term):
+        return 1.5
+    return 1.0 + min(len(term), 12) / 12
+
+
+class LocalQueryRewriter:
+    """Coreference/ellipsis detection plus embedding-based history term injection."""
+
+    def __init__(
+        self,
+        embeddings,
+        min_similarity: float = 0.25,
+        ambiguity_margin: float = 0.02,
+        max_injected_terms: int = 6,
+        history_turns: int = 3,
+    ):
+        self.embeddings = embeddings
+        self.min_similarity = min_similarity
+        self.ambiguity_margin = ambiguity_margin
+        self.max_injected_terms = max_injected_terms
+        self.history_turns = history_turns
+
+    def _candidate_turns(self, history: List[Dict[str, str]]) -> List[str]:
+        user_turns = [m["content"] for m in history if m.get("role") == "user" and m.get("content")]
+        candidates = user_turns[-self.history_turns:]
+        # The last assistant answer often names the entity the user is now pointing at
+        last_answer = next(
+            (m["content"] for m in reversed(history) if m.get("role") == "assistant" and m.get("content")),
+            None,
+        )
+        if last_answer:
+            candidates.append(last_answer[:500])
+        return candidates
+
+    def _similarities(self, query: str, candidates: List[str]) -> List[float]:
+        vectors = self.embeddings.embed_documents([query] + candidates)
+        q_vec = vectors[0]
+        # Embeddings are normalised at load time, so the dot product is the cosine
+        sims = [sum(a * b for a, b in zip(q_vec, vec)) for vec in vectors[1:]]
+        # Slight recency preference among equally similar turns
+        n = len(sims)
+        return [s * (1.0 - 0.02 * (n - 1 - i)) for i, s in enumerate(sims)]
+
+    def rewrite(self, query: str, history: Optional[List[Dict[str, str]]]) -> RewriteResult:
+        start = time.perf_counter()
+
+        def done(**kwargs) -> RewriteResult:
+            res = RewriteResult(**kwargs)
+            res.elapsed_ms = (time.perf_counter() - start) * 1000
+            return res
+
+        q = (query or "").strip()
+        if not q or not history:
+            return done(query=q, ambiguous=False, reason="no-history")
+
+        cues = detect_reference_cues(q)
+        if not cues:
+            return done(query=q, ambiguous=False, reason="self-contained")
+
+        candidates = self._candidate_turns(history)
+        if not candidates:
+            return done(query=q, ambiguous=False, reason="no-history")
+
+        try:
+            sims = self._similarities(q, candidates)
+        except Exception as e:
+            logger.warning("Local rewrite embedding failed: %s", e, extra={"stage": "rewrite"})
+            return done(query=q, ambiguous=True, reason="embedding-error")
+
+        ranked = sorted(range(len(sims)), key=lambda i: sims[i], reverse=True)
+        best = ranked[0]
+        if sims[best] < self.min_similarity:
+            return done(query=q, ambiguous=True, reason="no-similar-turn")
+
+        # Two different earlier topics fit equally well: let the LLM decide
+        if len(ranked) > 1:
+            runner_up = ranked[1]
+            best_terms = {t.lower() for t in content_terms(candidates[best])}
+            runner_terms = {t.lower() for t in content_terms(candidates[runner_up])}
+            if (sims[best] - sims[runner_up] < self.ambiguity_margin
+                    and best_terms and runner_terms and not (best_terms & runner_terms)):
+                return done(query=q, ambiguous=True, reason="competing-topics")
+
+        query_tokens = tokenize(q)
+        query_terms = {t.lower() for t in query_tokens}
+        terms = [t for t in content_terms(candidates[best]) if t.lower() not in query_terms]
+        # "what about BSED?" swaps the entity: don't drag the old acronym along
+        if any(_is_acronym(t) for t in query_tokens):
+            terms = [t for t in terms if not _is_acronym(t)]
+        terms.sort(key=_term_weight, reverse=True)
+        injected = terms[:self.max_injected_terms]
+        if not injected:
+            return done(query=q, ambiguous=True, reason="no-terms")
+
+        return done(
+            query=f"{q} {' '.join(injected)}",
+            ambiguous=False,
+            reason="+".join(cues),
+            injected_terms=injected,
+        )
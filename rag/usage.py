@@ -0,0 +1,68 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.tracing import estimate_tokens
+
+# ====== Token Usage Accounting ======
+# On free-tier OpenRouter models the scarce resource is the request and token
+# quota, not money. Every model call made for a chat turn is booked on the
+# turn's RequestUsage: calls, prompt tokens and completion tokens per (stage,
+# model), for the rewrite, vision, summarize, rerank and chat stages. Counts
+# come from the provider's usage report; calls that report none are estimated
+# from text length. When the turn ends, the totals go to the usage ledger
+# (aws/usage_ledger.py), which rolls them up per user and per day.
+
+
+def _text_of(value) -> str:
+    """Text of a prompt or reply: a string, a message, a list of either, or content blocks."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return _text_of(value.get("content") if "content" in value else value.get("text"))
+    if isinstance(value, (list, tuple)):
+        return "\n".join(_text_of(v) for v in value)
+    return _text_of(getattr(value, "content", ""))
+
+
+class RequestUsage:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Tuple[str, str], List[int]] = {}   # (stage, model) -> [calls, prompt, completion]
+
+    def record(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int = 0):
+        with self._lock:
+            entry = self._calls.setdefault((stage, model), [0, 0, 0])
+            entry[0] += 1
+            entry[1] += int(prompt_tokens or 0)
+            entry[2] += int(completion_tokens or 0)
+
+    def record_reply(self, stage: str, model: str, prompt, reply, reported: Optional[dict] = None):
+        """Books one model call from its reply's usage report, or an estimate if there is none."""
+        reported = reported or getattr(reply, "usage_metadata", None)
+        if reported:
+            self.record(stage, model, reported.get("input_tokens", 0), reported.get("output_tokens", 0))
+        else:
+            self.record(stage, model, estimate_tokens(_text_of(prompt)), estimate_tokens(_text_of(reply)))
+
+    def rows(self) -> List[dict]:
+        with self._lock:
+            return [
+                {"stage": stage, "model": model, "calls": c, "prompt_tokens": p, "completion_tokens": o}
+                for (stage, model), (c, p, o) in self._calls.items()
+            ]
+
+    def totals(self) -> dict:
+        rows = self.rows()
+        return {
+            "calls":             sum(r["calls"] for r in rows),
+            "prompt_tokens":     sum(r["prompt_tokens"] for r in rows),
+            "completion_tokens": sum(r["completion_tokens"] for r in rows),
+        }
+
+
+def usage_from_config(config: Optional[dict]) -> RequestUsage:
+    """Pulls the turn's usage out of a LangGraph run config (a throwaway one if absent)."""
+    usage = ((config or {}).get("configurable") or {}).get("usage")
+    return usage if isinstance(usage, RequestUsage) else RequestUsage()
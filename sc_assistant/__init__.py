@@ -1,17 +1,39 @@
-from flask import Flask
-from config import FLASK_SECRET_KEY
+from flask import Flask, Response, request
+from config import FLASK_SECRET_KEY, METRICS_TOKEN
+from src.metrics import render as render_metrics
+from src.logs import setup_logging, bind_request_id, current_request_id
+from src.memory import memory_registry
 
 def create_app():
     """
     Application factory to create and configure the Flask app.
     """
+    setup_logging()
+    memory_registry.start()
     app = Flask(__name__, template_folder='templates', static_folder='static')
     app.secret_key = FLASK_SECRET_KEY
 
+    @app.before_request
+    def tag_request():
+        # Every log line written while serving this request carries its id
+        bind_request_id(request.headers.get("X-Request-Id"))
+
+    @app.after_request
+    def expose_request_id(response):
+        response.headers["X-Request-Id"] = current_request_id()
+        return response
+
     @app.route('/health')
     def health_check():
         return "OK", 200
 
+    @app.route('/metrics')
+    def metrics():
+        if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+            return "Unauthorized", 401
+        body, content_type = render_metrics()
+        return Response(body, mimetype=content_type)
+
     with app.app_context():
         from . import auth
         app.register_blueprint(auth.bp)
@@ -28,4 +50,7 @@ def create_app():
         from .admin_reports import bp_reports
         app.register_blueprint(bp_reports)
 
+        from .admin_traces import bp_traces
+        app.register_blueprint(bp_traces)
+
     return app
\ No newline at end of file
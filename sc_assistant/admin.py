@@ -1,6 +1,7 @@
 from flask import (
-    Blueprint, render_template, jsonify, request, session, redirect, url_for
+    Blueprint, render_template, jsonify, request, session, redirect, url_for, Response
 )
+import logging
 import os
 import tempfile
 import datetime
@@ -15,9 +16,21 @@ from aws.dynamodb import (
 )
 from aws.s3 import upload_file_to_s3, delete_file_from_s3, get_s3_presigned_url
 from rag.chain import embeddings
+from aws.conversation_writer import conversation_writer
+from aws.conversation_cache import conversation_cache
+from aws.usage_ledger import usage_ledger, daily_usage, user_usage, usage_day
+from rag.circuit_breaker import breaker_states
+from rag.hedging import ttft_stats
+from src.rate_limiter import openrouter_scheduler
+from rag.admission import chat_admission
+from src.profiling import sample_stacks, diff_allocations, ProfilerBusy
+from src.memory import memory_registry
 from store_index import append_file_to_index
+from .replay import stream_registry, single_flight
 from .utils import is_admin, get_cognito_username
 
+logger = logging.getLogger(__name__)
+
 bp = Blueprint('admin', __name__)
 
 def format_time_ago(dt_str):
@@ -35,7 +48,7 @@ def format_time_ago(dt_str):
         elif seconds < 86400: return f"{int(seconds // 3600)} hour{'s' if int(seconds // 3600) > 1 else ''} ago"
         else: return f"{int(seconds // 86400)} day{'s' if int(seconds // 86400) > 1 else ''} ago"
     except Exception as e:
-        print(f"Error formatting time: {e}")
+        logger.warning("Error formatting time: %s", e)
         return "a while ago"
 
 
@@ -71,7 +84,7 @@ def upload_file():
                 raise Exception("Failed to upload file to S3.")
             processed_files.append(file.filename)
         except Exception as e:
-            print(f"Error processing {file.filename}: {e}")
+            logger.exception("Error processing upload %s", file.filename)
             os.remove(temp_path)
             return jsonify({"success": False, "message": f"Error processing {file.filename}: {str(e)}"}), 500
         finally:
@@ -200,6 +213,86 @@ def get_recent_activities():
         return jsonify({"success": False, "message": f"An error occurred: {str(e)}"}), 500
 
 
+@bp.route("/api/dashboard/breakers")
+def get_breaker_states():
+    if not session.get("user") or not is_admin(): return jsonify({"success": False, "message": "Unauthorized"}), 403
+    return jsonify({
+        "success": True,
+        "breakers": breaker_states(),
+        "ttft": ttft_stats.snapshot(),
+        "openrouter_scheduler": openrouter_scheduler.snapshot(),
+        "admission": chat_admission.snapshot(),
+    })
+
+
+@bp.route("/api/dashboard/persistence")
+def get_persistence_stats():
+    if not session.get("user") or not is_admin(): return jsonify({"success": False, "message": "Unauthorized"}), 403
+    return jsonify({
+        "success": True,
+        "conversation_writer": conversation_writer.snapshot(),
+        "conversation_cache": conversation_cache.snapshot(),
+        "streams": {"active": stream_registry.active(), **single_flight.snapshot()},
+    })
+
+
+@bp.route("/api/dashboard/usage")
+def get_usage():
+    """Token usage per user on one day (?day=YYYY-MM-DD, default today UTC)."""
+    if not session.get("user") or not is_admin(): return jsonify({"success": False, "message": "Unauthorized"}), 403
+    day = request.args.get("day") or usage_day()
+    try:
+        datetime.datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"success": False, "message": "day must be YYYY-MM-DD"}), 400
+    return jsonify({"success": True, "day": day, "users": daily_usage(day), "ledger": usage_ledger.snapshot()})
+
+
+@bp.route("/api/dashboard/usage/<user_key>")
+def get_user_usage(user_key):
+    """One user's (uid, "guest" or "__all__") token usage over the last ?days=N days."""
+    if not session.get("user") or not is_admin(): return jsonify({"success": False, "message": "Unauthorized"}), 403
+    days = max(1, min(request.args.get("days", 7, type=int), 90))
+    return jsonify({"success": True, "user_key": user_key, "days": user_usage(user_key, days)})
+
+
+@bp.route("/api/dashboard/profile/cpu", methods=["POST"])
+def profile_cpu():
+    """Samples this worker's thread stacks for ?seconds=N; ?format=collapsed returns flame graph input."""
+    if not session.get("user") or not is_admin(): return jsonify({"success": False, "message": "Unauthorized"}), 403
+    try:
+        profile = sample_stacks(
+            request.args.get("seconds", 10, type=float),
+            include_idle=request.args.get("idle") == "1",
+        )
+    except ProfilerBusy as e:
+        return jsonify({"success": False, "message": str(e)}), 409
+    if request.args.get("format") == "collapsed":
+        return Response(profile["collapsed"] + "\n", mimetype="text/plain", headers={"X-Worker-Pid": str(profile["pid"])})
+    return jsonify({"success": True, **profile})
+
+
+@bp.route("/api/dashboard/profile/memory", methods=["POST"])
+def profile_memory():
+    """Allocations made during the next ?seconds=N that are still alive at the end, biggest first."""
+    if not session.get("user") or not is_admin(): return jsonify({"success": False, "message": "Unauthorized"}), 403
+    try:
+        report = diff_allocations(
+            request.args.get("seconds", 30, type=float),
+            top=max(1, min(request.args.get("top", 25, type=int), 200)),
+        )
+    except ProfilerBusy as e:
+        return jsonify({"success": False, "message": str(e)}), 409
+    return jsonify({"success": True, **report})
+
+
+@bp.route("/api/dashboard/memory")
+def get_memory_stats():
+    """This worker's RSS and the measured size of every registered in-process structure."""
+    if not session.get("user") or not is_admin(): return jsonify({"success": False, "message": "Unauthorized"}), 403
+    return jsonify({"success": True, "pid": os.getpid(), **memory_registry.snapshot()})
+
+
 @bp.route("/api/dashboard/users")
 def get_dashboard_users():
     if not session.get("user") or not is_admin(): return jsonify({"success": False, "message": "Unauthorized"}), 403
@@ -264,7 +357,10 @@ def delete_user():
         if current_admin_username == cognito_username: return jsonify({"success": False, "message": "Cannot delete your own account from the admin dashboard."}), 400
 
         user_conversations = list_conversations(cognito_username)
-        for conv in user_conversations: delete_conversation_from_db(cognito_username, conv['conv_id'])
+        for conv in user_conversations:
+            conversation_writer.discard(cognito_username, conv['conv_id'])
+            conversation_cache.invalidate(cognito_username, conv['conv_id'])
+            delete_conversation_from_db(cognito_username, conv['conv_id'])
         
         cognito_client.admin_delete_user(UserPoolId=COGNITO_USER_POOL_ID, Username=cognito_username)
         return jsonify({"success": True, "message": "User and all associated data deleted successfully."})
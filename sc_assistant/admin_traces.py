@@ -0,0 +1,40 @@
+from flask import Blueprint, jsonify, request, session
+from .utils import is_admin
+from src.tracing import flight_recorder
+
+bp_traces = Blueprint('traces', __name__, url_prefix='/admin/traces')
+
+
+def _require_admin():
+    if not session.get("user") or not is_admin():
+        return False
+    return True
+
+
+@bp_traces.route("/api/list")
+def api_list():
+    if not _require_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    kind = request.args.get("kind", "slow")  # slow | sampled
+    if kind not in ("slow", "sampled"):
+        return jsonify({"error": "Invalid kind"}), 400
+    limit = min(request.args.get("limit", 100, type=int), 500)
+    return jsonify(flight_recorder.list(kind=kind, limit=limit))
+
+
+@bp_traces.route("/api/<trace_id>")
+def api_get_trace(trace_id):
+    if not _require_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    trace = flight_recorder.get(trace_id)
+    if not trace:
+        return jsonify({"error": "Trace not found"}), 404
+    return jsonify(trace)
+
+
+@bp_traces.route("/api/clear", methods=["POST"])
+def api_clear():
+    if not _require_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    flight_recorder.clear()
+    return jsonify({"status": "ok"})
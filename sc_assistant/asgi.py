@@ -0,0 +1,273 @@
+import asyncio
+import logging
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from a2wsgi import WSGIMiddleware
+
+from rag.chain import app_graph, get_chat_model, get_chat_candidates
+from rag.profiles import select_profile, chat_load
+from rag.admission import chat_admission, Ticket, Rejection
+from rag.hedging import ahedged_stream
+from config import HEDGE_ENABLED, OPENROUTER_INTERACTIVE_WAIT_S
+from src.rate_limiter import openrouter_scheduler, INTERACTIVE
+from src.metrics import stage_timer, GenerationMeter, INFLIGHT_STREAMS, REQUEST_SECONDS
+from src.tracing import flight_recorder
+from src.logs import bind_request_id, in_request_context
+from . import create_app
+from .chat import (
+    _session_role, encode_upload, prepare_chat_turn, open_stream, finish_from_stream,
+    admission_request, busy_event, saving_event, chunk_text, done_event, new_trace, record_usage_and_trace,
+    abandon_chat_turn, StaleConversationError,
+)
+from .stream_writer import StreamWriter, client_frame_ms
+from .replay import stream_registry, parse_last_event_id
+from .utils import get_session_id
+
+# ====== ASGI Serving Mode ======
+# Under gunicorn's sync workers every SSE stream pins an OS thread for the whole
+# generation, so a box tops out at workers x threads concurrent chats. In ASGI
+# mode POST /chat/get runs on the event loop: the model stream is awaited with
+# `astream`, and the (sync) context-compilation graph runs in the loop's thread
+# pool only for the few seconds it takes. Every other route is still served by
+# the Flask app through a WSGI bridge.
+
+logger = logging.getLogger(__name__)
+
+
+class _FlaskSessionBridge:
+    """Reads and writes Flask's signed session cookie so both halves share logins."""
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self.interface = flask_app.session_interface
+        self.serializer = self.interface.get_signing_serializer(flask_app)
+        self.cookie_name = self.interface.get_cookie_name(flask_app)
+
+    def load(self, request: Request):
+        data = {}
+        raw = request.cookies.get(self.cookie_name)
+        if raw and self.serializer is not None:
+            try:
+                max_age = int(self.app.permanent_session_lifetime.total_seconds())
+                data = self.serializer.loads(raw, max_age=max_age)
+            except Exception:
+                data = {}
+        return self.interface.session_class(data)
+
+    def save(self, sess, response):
+        if not sess.modified or self.serializer is None:
+            return
+        app = self.app
+        response.set_cookie(
+            self.cookie_name,
+            self.serializer.dumps(dict(sess)),
+            max_age=int(app.permanent_session_lifetime.total_seconds()) if sess.permanent else None,
+            path=self.interface.get_cookie_path(app),
+            domain=self.interface.get_cookie_domain(app),
+            secure=self.interface.get_cookie_secure(app),
+            httponly=self.interface.get_cookie_httponly(app),
+            samesite=self.interface.get_cookie_samesite(app),
+        )
+
+
+def create_asgi_app() -> Starlette:
+    flask_app = create_app()
+    sessions = _FlaskSessionBridge(flask_app)
+    producers = set()   # strong references to running generation tasks
+
+    async def chat_get(request: Request):
+        sess = sessions.load(request)
+        if not sess.get("user"):
+            return JSONResponse({"error": "Please log in to use the chatbot."}, status_code=401)
+
+        request_id = bind_request_id(request.headers.get("x-request-id"))
+        profile = select_profile(_session_role(sess))
+        deadline = profile.new_deadline()
+        loop = asyncio.get_running_loop()
+        chat_load.enter()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                chat_load.leave()
+
+        def follow(stream):
+            response = StreamingResponse(
+                stream.afollow(), media_type="text/event-stream",
+                headers={"X-Stream-Id": stream.stream_id, "X-Request-Id": request_id},
+            )
+            # prepare_chat_turn may have started a new conversation
+            sessions.save(sess, response)
+            return response
+
+        stream = None
+        ticket = None
+        turn = None
+
+        def abandon():
+            release()
+            if turn is not None:
+                # Nothing will save this turn's version: don't make the next turn wait for it
+                abandon_chat_turn(sess, turn)
+            if isinstance(ticket, Ticket):
+                chat_admission.release(ticket)
+            if stream is not None and not stream.done:
+                # Anyone coalesced onto this request is told it failed
+                stream.publish({'type': 'error', 'text': 'Streaming interrupted.'})
+                stream.close()
+
+        try:
+            form = await request.form()
+            msg = form.get("msg", "")
+            image_data, image_mime = await asyncio.to_thread(encode_upload, form.get("image"))
+            try:
+                turn = await asyncio.to_thread(prepare_chat_turn, sess, msg, image_data, image_mime, profile)
+            except StaleConversationError as e:
+                logger.warning("Chat turn refused: %s", e)
+                release()
+                stream = stream_registry.create(get_session_id(sess))
+                stream.publish(saving_event())
+                stream.close()
+                response = follow(stream)
+                response.headers["Retry-After"] = "2"
+                return response
+
+            # 🚀 Generation runs as its own task feeding a replay buffer; the response only
+            # follows it, so a dropped connection can resume without asking the model again
+            owner = get_session_id(sess)
+            stream, leader = open_stream(turn, owner)
+            if not leader:
+                # Someone is already answering this exact question: follow their stream
+                release()
+                return follow(stream)
+
+            # 🚀 Bounded concurrency: wait briefly for a generation slot, else answer "busy" right away
+            trace = new_trace(turn, profile)
+            with trace.span("admission") as span:
+                ticket = await chat_admission.admit_async(*admission_request(turn, owner))
+                span.set(admitted=isinstance(ticket, Ticket))
+            if isinstance(ticket, Rejection):
+                logger.info("Chat request rejected", extra={"reason": ticket.reason, "retry_after_s": ticket.retry_after_s})
+                REQUEST_SECONDS.labels(profile=profile.name, outcome="busy").observe(deadline.elapsed())
+                trace.set(outcome="busy", reason=ticket.reason)
+                loop.run_in_executor(None, in_request_context(flight_recorder.record), trace)
+                release()
+                abandon_chat_turn(sess, turn)
+                stream.publish(busy_event(ticket))
+                stream.close()
+                response = follow(stream)
+                response.headers["Retry-After"] = str(ticket.retry_after_s)
+                return response
+
+            with stage_timer("pipeline"), trace.span("pipeline"):
+                result = await app_graph.ainvoke(turn.input_payload, config=turn.run_config(deadline, trace))
+            messages_to_llm = result.get("messages_to_llm", [])
+
+            if not messages_to_llm:
+                abandon()
+                return JSONResponse({"error": "Context compilation failed. Please try again."}, status_code=500)
+        except Exception as e:
+            logger.exception("Error in async /get endpoint")
+            abandon()
+            return JSONResponse({"answer": f"Sorry, an error occurred: {str(e)}"}, status_code=500)
+
+        writer = StreamWriter(stream.publish, frame_ms=client_frame_ms(form.get("frame_ms")))
+        stream.attach_writer(writer)
+        meter = GenerationMeter(get_chat_candidates(profile)[0][0])
+
+        async def stream_answer():
+            # 🚀 Hedged streaming: race the fallback model if the primary is slow to first token
+            if HEDGE_ENABLED:
+                async for chunk in ahedged_stream(
+                    get_chat_candidates(profile), messages_to_llm,
+                    max_delay=deadline.remaining(), on_winner=meter.use_model,
+                ):
+                    yield chunk
+                return
+            await openrouter_scheduler.acquire_async(
+                INTERACTIVE, timeout=OPENROUTER_INTERACTIVE_WAIT_S, overdraft=True
+            )
+            async for chunk in get_chat_model(profile).astream(messages_to_llm):
+                yield chunk
+
+        async def produce():
+            outcome = "ok"
+            reported = None     # token usage, sent on the last chunk
+            INFLIGHT_STREAMS.inc()
+            try:
+                async for chunk in stream_answer():
+                    reported = getattr(chunk, "usage_metadata", None) or reported
+                    if stream.cancelled.is_set():
+                        logger.info("Generation stopped by user, saving partial response")
+                        outcome = "stopped"
+                        break
+                    text = chunk_text(chunk)
+                    if text:
+                        meter.chunk()
+                    writer.add(text)
+
+                writer.flush()
+                stream.publish(done_event(turn, deadline))
+
+            except Exception as stream_err:
+                logger.error("Streaming pipeline breakdown: %s", stream_err)
+                outcome = "error"
+                writer.flush()
+                stream.publish({'type': 'error', 'text': 'Streaming interrupted.'})
+            finally:
+                INFLIGHT_STREAMS.dec()
+                meter.finish()
+                REQUEST_SECONDS.labels(profile=profile.name, outcome=outcome).observe(deadline.elapsed())
+                logger.info("Request finished", extra={"profile": profile.name, "outcome": outcome, **deadline.summary()})
+                # Not awaited: the task may already be cancelled, and the save must still happen
+                loop.run_in_executor(None, in_request_context(finish_from_stream), turn, stream, owner)
+                chat_admission.release(ticket)
+                release()
+                stream.close()
+                # Token counting and the trace's SQLite write stay off the loop and after the close
+                loop.run_in_executor(
+                    None, in_request_context(record_usage_and_trace),
+                    trace, turn, meter, messages_to_llm, reported, "".join(stream.text_parts), outcome, deadline,
+                )
+
+        task = loop.create_task(produce())
+        producers.add(task)
+        task.add_done_callback(producers.discard)
+        return follow(stream)
+
+    def owned_stream(request: Request):
+        sess = sessions.load(request)
+        if not sess.get("user"):
+            return None, JSONResponse({"error": "Not authenticated"}, status_code=401)
+        stream = stream_registry.get(request.path_params["stream_id"], owner=sess.get("session_id"))
+        if stream is None:
+            return None, JSONResponse({"error": "Stream not found"}, status_code=404)
+        return stream, None
+
+    async def resume_stream(request: Request):
+        stream, error = owned_stream(request)
+        if error:
+            return error
+        last_seq = parse_last_event_id(
+            request.headers.get("last-event-id", request.query_params.get("last_event_id"))
+        )
+        return StreamingResponse(stream.afollow(last_seq), media_type="text/event-stream")
+
+    async def stop_stream(request: Request):
+        stream, error = owned_stream(request)
+        if error:
+            return error
+        stream.cancel(sessions.load(request).get("session_id"))
+        return JSONResponse({"status": "stopping"})
+
+    return Starlette(routes=[
+        Route("/chat/get", chat_get, methods=["POST"]),
+        Route("/chat/stream/{stream_id}", resume_stream, methods=["GET"]),
+        Route("/chat/stream/{stream_id}/stop", stop_stream, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ])
@@ -1,27 +1,54 @@
 from flask import (
     Blueprint, render_template, jsonify, request, send_from_directory, session, redirect, url_for,
-    Response, stream_with_context
+    Response
 )
-import json
 import datetime
+import logging
+import threading
+import time
 import uuid
 import os
 from PIL import Image
-from rag.chain import app_graph, chatModel
+from rag.chain import app_graph, get_chat_model, get_chat_candidates
+from rag.profiles import select_profile, chat_load
+from rag.admission import chat_admission, Ticket, Rejection, STUDENT, GUEST
+from rag.hedging import hedged_stream
+from rag.usage import RequestUsage
+from config import (
+    HEDGE_ENABLED, OPENROUTER_INTERACTIVE_WAIT_S, COALESCE_ENABLED, CORPUS_VERSION,
+    CONVERSATION_FRESH_WAIT_S, CONVERSATION_LOST_AFTER_S, PERSIST_FLUSH_INTERVAL_S
+)
+from src.rate_limiter import openrouter_scheduler, INTERACTIVE
+from src.metrics import stage_timer, GenerationMeter, INFLIGHT_STREAMS, REQUEST_SECONDS
+from src.tracing import Trace, flight_recorder
+from src.logs import in_request_context
 from aws.s3 import get_s3_presigned_url
 from aws.dynamodb import (
-    upsert_conversation, list_conversations,
-    get_conversation, delete_conversation_from_db,
+    conversation_item, page_messages, list_conversation_summaries,
+    get_conversation, get_conversation_version, delete_conversation_from_db,
     save_report
 )
+from aws.conversation_writer import conversation_writer
+from aws.conversation_cache import conversation_cache
+from aws.usage_ledger import usage_ledger
 from .utils import get_session_id, is_admin
+from .stream_writer import StreamWriter, client_frame_ms
+from .replay import stream_registry, single_flight, parse_last_event_id
 from src.helper import encode_image
 
 bp = Blueprint('chat', __name__, url_prefix='/chat')
+logger = logging.getLogger(__name__)
 
-def _is_guest():
+def _is_guest(sess=None):
     """Returns True if the current session belongs to a guest user."""
-    return session.get("is_guest", False) or session.get("user") == "guest"
+    sess = session if sess is None else sess
+    return sess.get("is_guest", False) or sess.get("user") == "guest"
+
+def _session_role(sess=None):
+    """Role used to pick the pipeline profile: guest | admin | student."""
+    if _is_guest(sess):
+        return "guest"
+    return "admin" if is_admin(sess) else "student"
 
 @bp.route("/")
 def chat_page():
@@ -36,126 +63,490 @@ def chat_page():
     }
     return render_template("chat.html", user=user_obj, start_new=str(start_new).lower())
 
+# ── Chat turn helpers (shared by the Flask view and the ASGI server) ──────
+
+STOP_NOTICE = "\n\n> 🛑 *Generation stopped by user.*"
+
+
+class ChatTurn:
+    """Everything one /chat/get request needs before and after streaming the answer."""
+
+    def __init__(self, sess, msg, image_data, image_mime, profile):
+        self.guest      = _is_guest(sess)
+        self.uid        = None if self.guest else sess.get("uid")
+        self.msg        = msg
+        self.image_data = image_data
+        self.profile    = profile
+        self.config     = {"configurable": {"thread_id": get_session_id(sess)}}
+        self.conv_id    = None if self.guest else sess.get("current_conv_id")
+        self.history    = []
+        self.persisted  = 0     # messages of `history` already stored (or queued) as message items
+        self.archived_key = None  # S3 archive the history was read from, if the conversation was cold
+        self.is_new_conversation = False
+        self.conv_title = None
+        self.created_at = None
+        self.updated_at = None  # version stamp of the history this turn will save
+        self.previous_version = sess.get("conv_version")  # put back if the turn ends without saving
+        self.usage      = RequestUsage()
+        self.input_payload = {
+            "input":      msg,
+            "image_data": image_data if image_data else None,
+            "image_mime": image_mime  if image_data else None,
+            "uid":        self.uid,
+            "user_email": None if self.guest else sess.get("user"),
+            "data_consent": sess.get("data_consent", False),
+            "profile":    profile.name,
+        }
+
+    def run_config(self, deadline, trace=None):
+        return {"configurable": {
+            **self.config["configurable"], "deadline": deadline, "trace": trace, "usage": self.usage,
+        }}
+
+
+def encode_upload(uploaded):
+    """Returns (base64 image, mime type) for an uploaded image file, or (None, "image/jpeg")."""
+    image_data = None
+    image_mime = "image/jpeg"
+    if uploaded is None or not getattr(uploaded, "filename", ""):
+        return image_data, image_mime
+    try:
+        img = Image.open(getattr(uploaded, "stream", None) or uploaded.file)
+        fmt = (img.format or "JPEG").upper()
+        image_mime = "image/png" if fmt == "PNG" else "image/jpeg"
+        if img.mode in ("RGBA", "P"):
+            img = img.convert("RGB")
+            image_mime = "image/jpeg"
+        image_data = encode_image(img)
+    except Exception as img_err:
+        logger.warning("Error processing upload: %s", img_err)
+    return image_data, image_mime
+
+
+class StaleConversationError(Exception):
+    """The session expects a newer version of the conversation than DynamoDB holds yet."""
+
+
+def _older_than(conv, version) -> bool:
+    return version is not None and (conv or {}).get("updated_at", "") < version
+
+
+def _version_lost(version) -> bool:
+    """True once a version is too old to still be on its way (its write was dropped)."""
+    try:
+        age = datetime.datetime.now(datetime.timezone.utc) - datetime.datetime.fromisoformat(version)
+    except (TypeError, ValueError):
+        return True
+    return age.total_seconds() > CONVERSATION_LOST_AFTER_S
+
+
+def read_current_conversation(uid, conv_id, version=None):
+    """
+    Reads a conversation from DynamoDB at `version` or newer. The previous turn may have
+    run on another gunicorn worker whose write-behind queue has not flushed yet; building
+    on an older copy would reuse the seqs of that turn and overwrite it. So the read is
+    retried for up to CONVERSATION_FRESH_WAIT_S, then StaleConversationError is raised,
+    unless the version is older than CONVERSATION_LOST_AFTER_S: its write was dropped and
+    will never land, so the newest stored copy is used instead.
+    """
+    deadline = time.monotonic() + CONVERSATION_FRESH_WAIT_S
+    delay = PERSIST_FLUSH_INTERVAL_S
+    while True:
+        conv = get_conversation(uid, conv_id)
+        if not _older_than(conv, version):
+            return conv
+        if time.monotonic() + delay > deadline:
+            break
+        time.sleep(delay)
+        delay = min(1.0, delay * 2)
+    if conv is None:
+        # Nothing was ever stored (e.g. the first turn produced no answer): start afresh
+        logger.warning("Conversation %s not found at version %s, starting it over", conv_id, version)
+        return None
+    if _version_lost(version):
+        logger.warning(
+            "Conversation %s never reached version %s, continuing from %s",
+            conv_id, version, conv.get("updated_at"),
+        )
+        return conv
+    raise StaleConversationError(f"Conversation {conv_id} is at {conv.get('updated_at')}, expected {version}")
+
+
+def load_conversation(uid, conv_id, limit=None, before=None, version=None):
+    """
+    Newest version of a conversation. A write still queued on this worker wins, then
+    the conversation cache (if it holds `version`, when one is expected), then DynamoDB
+    (waiting for `version` to land, see read_current_conversation). A copy older than
+    `version` is never returned.
+    """
+    conv = conversation_writer.pending_item(uid, conv_id)
+    if _older_than(conv, version):
+        # A later turn ran on another worker; this worker's queued write is superseded
+        conv = None
+    if conv is None:
+        conv = conversation_cache.get(uid, conv_id, version)
+    if conv is None:
+        if limit or before is not None:
+            # A single page is read straight from DynamoDB and not cached
+            return get_conversation(uid, conv_id, limit=limit, before=before)
+        conv = read_current_conversation(uid, conv_id, version)
+        if not conv:
+            return None
+        conversation_cache.put(conv)
+    conv = {k: v for k, v in conv.items() if k not in ("persisted", "rehydrated_from")}
+    conv["messages"], conv["next_before"] = page_messages(conv["messages"], limit, before)
+    return conv
+
+
+def prepare_chat_turn(sess, msg, image_data, image_mime, profile) -> ChatTurn:
+    """Loads the conversation history into the graph and assigns a conversation id."""
+    turn = ChatTurn(sess, msg, image_data, image_mime, profile)
+    
+    if not turn.guest and turn.conv_id:
+        # The session remembers which version the last turn saved, wherever it ran
+        version = sess.get("conv_version") or get_conversation_version(turn.uid, turn.conv_id)
+        conversation = load_conversation(turn.uid, turn.conv_id, version=version)
+        if conversation and "messages" in conversation:
+            turn.history = conversation["messages"]
+            # Legacy single-item conversations have no message_count and are rewritten in full;
+            # archived ones too, which moves them back out of S3
+            turn.archived_key = conversation.get("archived_key")
+            turn.persisted = 0 if turn.archived_key else int(conversation.get("message_count", 0))
+            app_graph.update_state(turn.config, values={"chat_history": turn.history})
+    elif turn.guest:
+        state = app_graph.get_state(turn.config)
+        if state and hasattr(state, 'values'):
+            turn.history = state.values.get("chat_history", [])
+        if turn.history:
+            app_graph.update_state(turn.config, values={"chat_history": turn.history})
+            
+    if not turn.guest:
+        if not turn.conv_id:
+            turn.conv_id    = str(uuid.uuid4())
+            turn.created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            sess["current_conv_id"]  = turn.conv_id
+            sess["created_at"]       = turn.created_at
+            turn.is_new_conversation = True
+            turn.conv_title = msg[:40] if msg else "Image Query"
+        else:
+            turn.created_at = sess.get("created_at")
+        turn.updated_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        sess["conv_version"] = turn.updated_at
+    return turn
+
+
+def abandon_chat_turn(sess, turn: ChatTurn):
+    """Puts back the session's conversation version when a turn ends without queuing a save."""
+    if turn.guest:
+        return
+    if turn.previous_version is None:
+        sess.pop("conv_version", None)
+    else:
+        sess["conv_version"] = turn.previous_version
+
+
+def finish_chat_turn(turn: ChatTurn, full_answer: str):
+    """Saves the finished (or partial) exchange to the graph memory and DynamoDB."""
+    if not full_answer.strip():
+        if turn.history:
+            # Nothing to add, but the session already holds this turn's version: store it so
+            # the next turn (possibly on another worker) does not wait for a write that never comes
+            save_conversation(turn, turn.history)
+        return
+    new_messages = [
+        {"role": "user",      "content": turn.msg + (" [Image Uploaded]" if turn.image_data else "")},
+        {"role": "assistant", "content": full_answer},
+    ]
+    full_history_to_save = turn.history + new_messages
+    
+    app_graph.update_state(turn.config, values={"chat_history": full_history_to_save})
+    save_conversation(turn, full_history_to_save)
+
+
+def save_conversation(turn: ChatTurn, history: list):
+    """Queues a student's conversation at the turn's version (guests are not saved)."""
+    if turn.guest or not turn.uid:
+        return
+    item = conversation_item(
+        turn.uid, turn.conv_id, history, turn.created_at,
+        persisted=turn.persisted, updated_at=turn.updated_at,
+    )
+    if turn.archived_key:
+        item["rehydrated_from"] = turn.archived_key
+    # Write-through: the next turn on this worker reads the history from memory
+    conversation_cache.put(item)
+    # ⚡ OPTIMIZATION: Write-behind; the DynamoDB put happens on the persistence thread
+    conversation_writer.submit(item)
+
+
+def chunk_text(chunk) -> str:
+    """Plain text of a streamed model chunk (content may be a list of blocks)."""
+    text = chunk.content
+    if isinstance(text, list):
+        text = "".join(
+            block.get("text", "") for block in text 
+            if isinstance(block, dict) and block.get("type") == "text"
+        )
+    return text or ""
+
+
+def done_event(turn: ChatTurn, deadline) -> dict:
+    if turn.guest:
+        return {'type': 'done', 'conv_id': None, 'new_conversation_created': False, 'new_conv_title': None, 'degraded': deadline.degradations}
+    return {'type': 'done', 'conv_id': turn.conv_id, 'new_conversation_created': turn.is_new_conversation, 'new_conv_title': turn.conv_title, 'degraded': deadline.degradations}
+
+
+def coalesce_key(turn: ChatTurn):
+    """Single-flight key for a turn whose answer depends only on its question, else None."""
+    if not COALESCE_ENABLED or not turn.guest or turn.history or turn.image_data:
+        return None
+    question = " ".join(turn.msg.lower().split()).rstrip("?!. ")
+    if not question:
+        return None
+    return (CORPUS_VERSION, turn.profile.name, question)
+
+
+def open_stream(turn: ChatTurn, owner: str):
+    """The stream this turn's answer goes to, and whether this request has to generate it."""
+    key = coalesce_key(turn)
+    if key is None:
+        return stream_registry.create(owner), True
+    stream, leader = single_flight.claim(key, owner)
+    if not leader:
+        logger.info("Coalesced onto in-flight stream", extra={"stream_id": stream.stream_id})
+        stream.on_close(lambda: finish_from_stream(turn, stream, owner))
+    return stream, leader
+
+
+def finish_from_stream(turn: ChatTurn, stream, owner: str):
+    """Saves the answer as `owner` saw it, with the stop notice if they stopped it."""
+    text, stopped = stream.answer_for(owner)
+    finish_chat_turn(turn, text + (STOP_NOTICE if stopped else ""))
+
+
+def new_trace(turn: ChatTurn, profile) -> Trace:
+    return Trace(
+        profile=profile.name, role="guest" if turn.guest else "student",
+        question=turn.msg[:200], image=bool(turn.image_data),
+    )
+
+
+def book_usage(turn: ChatTurn, model: str, messages: list, reported, answer: str):
+    """Adds the chat call to the turn's usage and hands the turn's totals to the usage ledger."""
+    turn.usage.record_reply("chat", model, messages, answer, reported=reported)
+    usage_ledger.add(turn.uid, turn.usage.rows())
+
+
+def record_trace(trace: Trace, turn: ChatTurn, meter: GenerationMeter, outcome: str, deadline):
+    """Closes the request trace and hands it to the flight recorder."""
+    ttft_ms = None if meter.first_at is None else round((meter.first_at - meter.started_at) * 1000, 1)
+    trace.record_span("generation", meter.started_at, model=meter.model, ttft_ms=ttft_ms, chunks=meter.chunks)
+    trace.set(
+        model=meter.model, ttft_ms=ttft_ms, outcome=outcome, degradations=list(deadline.degradations),
+        usage=turn.usage.rows(),
+    )
+    flight_recorder.record(trace)
+
+
+def record_usage_and_trace(trace: Trace, turn: ChatTurn, meter: GenerationMeter, messages: list, reported,
+                           answer: str, outcome: str, deadline):
+    """Books the turn's usage, then closes its trace (which carries the usage rows). Run after the stream closes."""
+    book_usage(turn, meter.model, messages, reported, answer)
+    record_trace(trace, turn, meter, outcome, deadline)
+
+
+def admission_request(turn: ChatTurn, owner: str):
+    """(user key, priority class) this turn is admitted under."""
+    return turn.uid or owner, GUEST if turn.guest else STUDENT
+
+
+def saving_event() -> dict:
+    """Sent instead of an answer while the previous turn is still being saved by another worker."""
+    return {
+        'type': 'busy', 'reason': 'saving', 'retry_after': 2,
+        'text': "Your previous message is still being saved. Please try again in a moment.",
+    }
+
+
+def busy_event(rejection: Rejection) -> dict:
+    return {
+        'type': 'busy', 'reason': rejection.reason, 'retry_after': rejection.retry_after_s,
+        'text': f"The assistant is busy right now. Please try again in {rejection.retry_after_s} seconds.",
+    }
+
+
 @bp.route("/get", methods=["POST"])
 def chat():
     if not session.get("user"):
         return jsonify({"error": "Please log in to use the chatbot."}), 401
     
+    profile = select_profile(_session_role())
+    # Request-scoped latency budget, consulted by every pipeline stage
+    deadline = profile.new_deadline()
+    chat_load.enter()
+    streaming = False
+    stream = None
+    ticket = None
+    turn = None
     try:
         msg = request.form.get("msg", "")
-        guest = _is_guest()
-        
-        # Image handling
-        image_data = None
-        image_mime = "image/jpeg"
-        if 'image' in request.files and request.files['image'].filename != '':
-            try:
-                uploaded = request.files['image']
-                img = Image.open(uploaded)
-                fmt = (img.format or "JPEG").upper()
-                image_mime = "image/png" if fmt == "PNG" else "image/jpeg"
-                if img.mode in ("RGBA", "P"):
-                    img = img.convert("RGB")
-                    image_mime = "image/jpeg"
-                image_data = encode_image(img)
-            except Exception as img_err:
-                print(f"Error processing upload: {img_err}")
-                
-        session_id = get_session_id()
-        config = {"configurable": {"thread_id": session_id}}
-        
-        conv_id = None if guest else session.get("current_conv_id")
-        current_db_history = []
-        
-        if not guest and conv_id:
-            conversation = get_conversation(session.get("uid"), conv_id)
-            if conversation and "messages" in conversation:
-                current_db_history = conversation["messages"]
-                app_graph.update_state(config, values={"chat_history": current_db_history})
-        elif guest:
-            state = app_graph.get_state(config)
-            if state and hasattr(state, 'values'):
-                current_db_history = state.values.get("chat_history", [])
-            if current_db_history:
-                app_graph.update_state(config, values={"chat_history": current_db_history})
-                
-        is_new_conversation = False
-        conv_title = None
-        created_at = None
-        
-        if not guest:
-            if not conv_id:
-                conv_id = str(uuid.uuid4())
-                created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
-                session["current_conv_id"] = conv_id
-                session["created_at"]      = created_at
-                is_new_conversation        = True
-                conv_title = msg[:40] if msg else "Image Query"
-            else:
-                created_at = session.get("created_at")
-                
-        input_payload = {
-            "input":      msg,
-            "image_data": image_data if image_data else None,
-            "image_mime": image_mime  if image_data else None,
-            "uid":        None if guest else session.get("uid"),
-            "user_email": None if guest else session.get("user"),
-            "data_consent": session.get("data_consent", False),
-        }
+        image_data, image_mime = encode_upload(request.files.get('image'))
+        try:
+            turn = prepare_chat_turn(session, msg, image_data, image_mime, profile)
+        except StaleConversationError as e:
+            logger.warning("Chat turn refused: %s", e)
+            stream = stream_registry.create(get_session_id(session))
+            stream.publish(saving_event())
+            stream.close()
+            response = stream_response(stream)
+            response.headers["Retry-After"] = "2"
+            return response
+
+        # 🚀 The answer is generated into a replay buffer, not straight into the response,
+        # so a dropped connection can resume it instead of asking the model again
+        owner = get_session_id(session)
+        stream, leader = open_stream(turn, owner)
+        if not leader:
+            # Someone is already answering this exact question: follow their stream
+            chat_load.leave()
+            streaming = True
+            return stream_response(stream)
+
+        # 🚀 Bounded concurrency: wait briefly for a generation slot, else answer "busy" right away
+        trace = new_trace(turn, profile)
+        with trace.span("admission") as span:
+            ticket = chat_admission.admit(*admission_request(turn, owner))
+            span.set(admitted=isinstance(ticket, Ticket))
+        if isinstance(ticket, Rejection):
+            logger.info("Chat request rejected", extra={"reason": ticket.reason, "retry_after_s": ticket.retry_after_s})
+            REQUEST_SECONDS.labels(profile=profile.name, outcome="busy").observe(deadline.elapsed())
+            trace.set(outcome="busy", reason=ticket.reason)
+            flight_recorder.record(trace)
+            stream.publish(busy_event(ticket))
+            stream.close()
+            response = stream_response(stream)
+            response.headers["Retry-After"] = str(ticket.retry_after_s)
+            return response
         
-        result = app_graph.invoke(input_payload, config=config)
+        with stage_timer("pipeline"), trace.span("pipeline"):
+            result = app_graph.invoke(turn.input_payload, config=turn.run_config(deadline, trace))
         messages_to_llm = result.get("messages_to_llm", [])
         
         if not messages_to_llm:
             return jsonify({"error": "Context compilation failed. Please try again."}), 500
 
-        # Server-Sent Events Token Streaming Loop
-        @stream_with_context
-        def generate():
-            full_answer = ""
+        meter = GenerationMeter(get_chat_candidates(profile)[0][0])
+
+        def stream_answer():
+            # 🚀 Hedged streaming: race the fallback model if the primary is slow to first token
+            if HEDGE_ENABLED:
+                return hedged_stream(
+                    get_chat_candidates(profile), messages_to_llm,
+                    max_delay=deadline.remaining(), on_winner=meter.use_model,
+                )
+            openrouter_scheduler.acquire(INTERACTIVE, timeout=OPENROUTER_INTERACTIVE_WAIT_S, overdraft=True)
+            return get_chat_model(profile).stream(messages_to_llm)
+
+        # ⚡ OPTIMIZATION: Tokens are coalesced into one SSE frame per window
+        writer = StreamWriter(stream.publish, frame_ms=client_frame_ms(request.form.get("frame_ms")))
+        stream.attach_writer(writer)
+
+        def produce():
+            chunks = None
+            outcome = "ok"
+            reported = None     # token usage, sent on the last chunk
+            INFLIGHT_STREAMS.inc()
             try:
-                for chunk in chatModel.stream(messages_to_llm):
-                    if chunk.content:
-                        chunk_text = chunk.content
-                        if isinstance(chunk_text, list):
-                            chunk_text = "".join(
-                                block.get("text", "") for block in chunk_text 
-                                if isinstance(block, dict) and block.get("type") == "text"
-                            )
-                        full_answer += chunk_text
-                        yield f"data: {json.dumps({'type': 'chunk', 'text': chunk_text})}\n\n"
-                                         
-                if guest:
-                    yield f"data: {json.dumps({'type': 'done', 'conv_id': None, 'new_conversation_created': False, 'new_conv_title': None})}\n\n"
-                else:
-                    yield f"data: {json.dumps({'type': 'done', 'conv_id': conv_id, 'new_conversation_created': is_new_conversation, 'new_conv_title': conv_title})}\n\n"
-
-            except GeneratorExit:
-                # 🚀 FIX: Append the stop message so the database perfectly matches the frontend UI
-                full_answer += "\n\n> 🛑 *Generation stopped by user.*"
-                print("Client aborted stream. Saving partial response with stop notice.")
-                
+                chunks = stream_answer()
+                for chunk in chunks:
+                    reported = getattr(chunk, "usage_metadata", None) or reported
+                    if stream.cancelled.is_set():
+                        # 🚀 FIX: Append the stop message so the database perfectly matches the frontend UI
+                        logger.info("Generation stopped by user, saving partial response")
+                        outcome = "stopped"
+                        break
+                    text = chunk_text(chunk)
+                    if text:
+                        meter.chunk()
+                    writer.add(text)
+
+                writer.flush()
+                stream.publish(done_event(turn, deadline))
+
             except Exception as stream_err:
-                print(f"Streaming pipeline breakdown: {stream_err}")
-                yield f"data: {json.dumps({'type': 'error', 'text': 'Streaming interrupted.'})}\n\n"
+                logger.error("Streaming pipeline breakdown: %s", stream_err)
+                outcome = "error"
+                writer.flush()
+                stream.publish({'type': 'error', 'text': 'Streaming interrupted.'})
             finally:
-                if full_answer.strip():
-                    new_messages = [
-                        {"role": "user",      "content": msg + (" [Image Uploaded]" if image_data else "")},
-                        {"role": "assistant", "content": full_answer},
-                    ]
-                    full_history_to_save = current_db_history + new_messages
-                    
-                    app_graph.update_state(config, values={"chat_history": full_history_to_save})
-                    
-                    if not guest and session.get("uid"):
-                        upsert_conversation(session.get("uid"), conv_id, full_history_to_save, created_at)
-
-        return Response(generate(), mimetype='text/event-stream')
+                if chunks is not None and hasattr(chunks, "close"):
+                    chunks.close()
+                INFLIGHT_STREAMS.dec()
+                meter.finish()
+                REQUEST_SECONDS.labels(profile=profile.name, outcome=outcome).observe(deadline.elapsed())
+                logger.info("Request finished", extra={"profile": profile.name, "outcome": outcome, **deadline.summary()})
+                try:
+                    finish_from_stream(turn, stream, owner)
+                finally:
+                    chat_admission.release(ticket)
+                    chat_load.leave()
+                    stream.close()
+                    # After the close, so the end of the SSE response never waits on the trace's SQLite write
+                    record_usage_and_trace(
+                        trace, turn, meter, messages_to_llm, reported, "".join(stream.text_parts), outcome, deadline,
+                    )
+
+        threading.Thread(target=in_request_context(produce), name=f"chat-stream-{stream.stream_id[:8]}", daemon=True).start()
+        streaming = True
+
+        return stream_response(stream)
 
     except Exception as e:
-        print(f"Error in /get endpoint: {e}")
+        logger.exception("Error in /get endpoint")
         return jsonify({"answer": f"Sorry, an error occurred: {str(e)}"}), 500
+    finally:
+        if not streaming:
+            chat_load.leave()
+            if turn is not None:
+                # Nothing will save this turn's version: don't make the next turn wait for it
+                abandon_chat_turn(session, turn)
+            if isinstance(ticket, Ticket):
+                chat_admission.release(ticket)
+            if stream is not None and not stream.done:
+                # Anyone coalesced onto this request is told it failed
+                stream.publish({'type': 'error', 'text': 'Streaming interrupted.'})
+                stream.close()
+
+
+def stream_response(stream):
+    # Server-Sent Events Token Streaming Loop (a disconnect only stops following the stream)
+    response = Response(stream.follow(), mimetype='text/event-stream')
+    response.headers["X-Stream-Id"] = stream.stream_id
+    return response
+
+
+@bp.route("/stream/<stream_id>", methods=["GET"])
+def resume_stream(stream_id):
+    """Re-attaches to a running (or just finished) answer after the Last-Event-ID the client saw."""
+    if not session.get("user"):
+        return jsonify({"error": "Not authenticated"}), 401
+    stream = stream_registry.get(stream_id, owner=get_session_id(session))
+    if stream is None:
+        return jsonify({"error": "Stream not found"}), 404
+    last_seq = parse_last_event_id(
+        request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+    )
+    return Response(stream.follow(last_seq), mimetype='text/event-stream')
+
+@bp.route("/stream/<stream_id>/stop", methods=["POST"])
+def stop_stream(stream_id):
+    if not session.get("user"):
+        return jsonify({"error": "Not authenticated"}), 401
+    stream = stream_registry.get(stream_id, owner=get_session_id(session))
+    if stream is None:
+        return jsonify({"error": "Stream not found"}), 404
+    stream.cancel(get_session_id(session))
+    return jsonify({"status": "stopping"})
 
 @bp.route("/report", methods=["POST"])
 def submit_report():
@@ -183,7 +574,7 @@ def submit_report():
         })
         return jsonify({"status": "ok"})
     except Exception as e:
-        print(f"Error saving report: {e}")
+        logger.error("Error saving report: %s", e)
         return jsonify({"error": str(e)}), 500
         
 @bp.route('/document/<filename>')
@@ -200,7 +591,7 @@ def serve_document(filename):
         if s3_url:
             return redirect(s3_url)
     except Exception as e:
-        print(f"Error fetching {filename} from S3: {e}")
+        logger.warning("Error fetching %s from S3: %s", filename, e)
         
     return "Document not found", 404
 
@@ -211,19 +602,33 @@ def clear_memory():
     session.pop("session_id",       None)
     session.pop("current_conv_id",  None)
     session.pop("created_at",       None)
+    session.pop("conv_version",     None)
     return jsonify({"status": "success", "message": "New session started"})
 
 @bp.route("/conversations", methods=["GET"])
 def conversations():
+    """Sidebar list, one page at a time: ?cursor=<next_cursor from the previous page>&limit=N."""
     if not session.get("user") or _is_guest():
-        return jsonify([])
-    return jsonify(list_conversations(session.get("uid")))
+        return jsonify({"conversations": [], "next_cursor": None})
+    limit = max(1, min(50, request.args.get("limit", 20, type=int)))
+    try:
+        summaries, next_cursor = list_conversation_summaries(
+            session.get("uid"), limit=limit, cursor=request.args.get("cursor")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"conversations": summaries, "next_cursor": next_cursor})
 
 @bp.route("/conversation/<conv_id>", methods=["GET"])
 def conversation(conv_id):
     if not session.get("user") or _is_guest():
         return jsonify({"error": "Not authenticated"}), 401
-    conv = get_conversation(session.get("uid"), conv_id)
+    # ?limit=N returns the latest N messages; ?before=<next_before> pages further back
+    conv = load_conversation(
+        session.get("uid"), conv_id,
+        limit=request.args.get("limit", type=int),
+        before=request.args.get("before", type=int),
+    )
     if not conv:
         return jsonify({"error": "Not found"}), 404
     return jsonify(conv)
@@ -232,7 +637,9 @@ def conversation(conv_id):
 def restore_conversation(conv_id):
     if not session.get("user") or _is_guest():
         return jsonify({"error": "Not authenticated"}), 401
-    conv = get_conversation(session.get("uid"), conv_id)
+    # Header-only version check; the messages come from the cache when it is current
+    version = get_conversation_version(session.get("uid"), conv_id)
+    conv = load_conversation(session.get("uid"), conv_id, version=version)
     if not conv or "messages" not in conv:
         return jsonify({"error": "Conversation not found"}), 404
         
@@ -246,12 +653,15 @@ def restore_conversation(conv_id):
         "created_at",
         datetime.datetime.now(datetime.timezone.utc).isoformat()
     )
+    session["conv_version"]    = conv.get("updated_at")
     return jsonify({"status": "success", "message": "Conversation restored"})
 
 @bp.route("/conversation/<conv_id>/delete", methods=["DELETE"])
 def delete_conversation(conv_id):
     if not session.get("user") or _is_guest():
         return jsonify({"error": "Not authenticated"}), 401
+    conversation_writer.discard(session.get("uid"), conv_id)
+    conversation_cache.invalidate(session.get("uid"), conv_id)
     delete_conversation_from_db(session.get("uid"), conv_id)
     return jsonify({"status": "success", "message": "Conversation deleted"})
 
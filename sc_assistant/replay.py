@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from config import REPLAY_MAX_FRAMES, REPLAY_TTL_S, SSE_KEEPALIVE_S
+from src.metrics import count_cache
+from src.memory import memory_registry
+from .stream_writer import StreamWriter, sse
+
+logger = logging.getLogger(__name__)
+
+# ====== Resumable Streams ======
+# Generation is decoupled from the HTTP connection: the answer is produced into
+# a ReplayStream (a bounded buffer of numbered SSE events) and each connection
+# merely follows it. If a phone drops off mid-answer, generation carries on and
+# the client reconnects to /chat/stream/<id> with Last-Event-ID to pick up
+# where it left off, without re-running retrieval or the model.
+#
+# Streams live in this worker's memory; a reconnect routed to another worker
+# gets a 404 and the client retries.
+
+KEEPALIVE = ": keepalive\n\n"
+
+
+class ReplayStream:
+    def __init__(self, owner: str, max_frames: int = REPLAY_MAX_FRAMES):
+        self.stream_id = str(uuid.uuid4())
+        self.owners = {owner}                           # session ids following this answer
+        self._stops: Dict[str, int] = {}               # owner -> chunks they had when they pressed stop
+        self._on_close: List[Callable[[], None]] = []
+        self.frames: deque = deque(maxlen=max_frames)   # (seq, frame)
+        self.next_seq = 0
+        self.text_parts: List[str] = []                # whole answer, for clients that fell out of the buffer
+        self.last_chunk_seq = -1
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.cancelled = threading.Event()
+        self._cond = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.writer: Optional[StreamWriter] = None
+
+    # ── producer side ──────────────────────────────────────
+
+    def publish(self, payload: dict):
+        with self._cond:
+            seq = self.next_seq
+            self.next_seq += 1
+            self.frames.append((seq, sse(payload, event_id=seq)))
+            if payload.get("type") == "chunk":
+                self.text_parts.append(payload["text"])
+                self.last_chunk_seq = seq
+            self._wake()
+
+    def attach_writer(self, writer: StreamWriter):
+        """Followers flush `writer` when its frame window expires while the model is stalled."""
+        self.writer = writer
+        writer.on_open = self._poke
+
+    def _poke(self):
+        """Wakes followers so they re-time their sleep to the writer's open frame."""
+        with self._cond:
+            self._wake()
+
+    def close(self):
+        with self._cond:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._wake()
+            callbacks, self._on_close = self._on_close, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("Stream close callback failed: %s", e, extra={"stream_id": self.stream_id})
+
+    def on_close(self, callback: Callable[[], None]):
+        """Runs `callback` once the stream closes (right away if it already has)."""
+        with self._cond:
+            if not self.done:
+                self._on_close.append(callback)
+                return
+        callback()
+
+    def subscribe(self, owner: str) -> bool:
+        """Adds another follower; False if the stream already finished."""
+        with self._cond:
+            if self.done:
+                return False
+            self.owners.add(owner)
+            return True
+
+    def cancel(self, owner: str):
+        """`owner` pressed stop; generation stops once every follower has."""
+        with self._cond:
+            self._stops.setdefault(owner, len(self.text_parts))
+            if set(self._stops) >= self.owners:
+                self.cancelled.set()
+
+    def answer_for(self, owner: str) -> Tuple[str, bool]:
+        """The answer as `owner` saw it, and whether they stopped it."""
+        with self._cond:
+            stopped_at = self._stops.get(owner)
+            parts = self.text_parts if stopped_at is None else self.text_parts[:stopped_at]
+            return "".join(parts), stopped_at is not None
+
+    def _wake(self):
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_resolve, fut)
+
+    # ── consumer side ──────────────────────────────────────
+
+    def _after(self, last_seq: int) -> Tuple[List[str], bool]:
+        """Frames after `last_seq` (called with the lock held), plus whether the stream is over."""
+        if self.frames and last_seq + 1 < self.frames[0][0]:
+            # The client fell out of the buffer: send the answer so far as one snapshot,
+            # then whatever came after the last chunk (done / error)
+            upto = max(self.last_chunk_seq, self.frames[0][0] - 1)
+            snapshot = sse({"type": "snapshot", "text": "".join(self.text_parts)}, event_id=upto)
+            return [snapshot] + [f for s, f in self.frames if s > upto], self.done
+        return [f for s, f in self.frames if s > last_seq], self.done
+
+    @staticmethod
+    def _last_seq(frames: List[str]) -> int:
+        frame = frames[-1]
+        return int(frame[4:frame.index("\n")])
+
+    def _idle_wait(self) -> float:
+        """How long a follower may sleep: until buffered text is due, at most until the keepalive."""
+        due = self.writer.due_in() if self.writer is not None else None
+        return SSE_KEEPALIVE_S if due is None else min(SSE_KEEPALIVE_S, due)
+
+    def _flush_writer(self) -> bool:
+        """Publishes text the producer buffered before the model stalled. False if none is buffered."""
+        # Never called with self._cond held: the writer publishes under its own lock
+        return self.writer is not None and self.writer.flush_if_due()
+
+    def follow(self, last_seq: int = -1) -> Iterator[str]:
+        """Yields frames after `last_seq` until the stream ends, with keepalives while idle."""
+        while True:
+            with self._cond:
+                frames, done = self._after(last_seq)
+                if not frames and not done:
+                    self._cond.wait(timeout=self._idle_wait())
+                    frames, done = self._after(last_seq)
+            if frames:
+                last_seq = self._last_seq(frames)
+                yield from frames
+            elif done:
+                return
+            elif not self._flush_writer():
+                yield KEEPALIVE
+
+    async def afollow(self, last_seq: int = -1) -> AsyncIterator[str]:
+        """follow() for the event loop: waits on a future instead of blocking a thread."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                frames, done = self._after(last_seq)
+                fut = None
+                if not frames and not done:
+                    fut = loop.create_future()
+                    self._async_waiters.append((loop, fut))
+            if fut is not None:
+                try:
+                    await asyncio.wait_for(fut, timeout=self._idle_wait())
+                except asyncio.TimeoutError:
+                    if not self._flush_writer():
+                        yield KEEPALIVE
+                continue
+            if frames:
+                last_seq = self._last_seq(frames)
+                for frame in frames:
+                    yield frame
+            if done and not frames:
+                return
+
+
+def _resolve(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(None)
+
+
+class StreamRegistry:
+    """Live and recently finished streams of this worker, by stream id."""
+
+    def __init__(self, ttl_s: float = REPLAY_TTL_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._streams: Dict[str, ReplayStream] = {}
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [
+            sid for sid, s in self._streams.items()
+            if s.finished_at is not None and now - s.finished_at > self.ttl_s
+        ]
+        for sid in expired:
+            del self._streams[sid]
+
+    def create(self, owner: str) -> ReplayStream:
+        stream = ReplayStream(owner)
+        stream.publish({"type": "stream", "stream_id": stream.stream_id})
+        with self._lock:
+            self._prune()
+            self._streams[stream.stream_id] = stream
+        return stream
+
+    def get(self, stream_id: str, owner: str) -> Optional[ReplayStream]:
+        with self._lock:
+            self._prune()
+            stream = self._streams.get(stream_id)
+        if stream is None or owner not in stream.owners:
+            return None
+        return stream
+
+    def memory_usage(self):
+        """(streams, bytes of buffered frames and answer text); in-flight answers are never evicted."""
+        with self._lock:
+            streams = list(self._streams.values())
+        size = 0
+        for s in streams:
+            with s._cond:
+                size += sum(len(frame) for _seq, frame in s.frames) + sum(len(t) for t in s.text_parts)
+        return len(streams), size
+
+    def active(self) -> int:
+        with self._lock:
+            return sum(1 for s in self._streams.values() if not s.done)
+
+
+stream_registry = StreamRegistry()
+memory_registry.register("replay_streams", stream_registry.memory_usage)
+
+
+# ====== Single-Flight Coalescing ======
+# Around enrollment deadlines many guests send the very same question within
+# seconds. Requests that cannot be personalised are keyed by their normalised
+# question (see chat.coalesce_key); while one is in flight, identical requests
+# follow its stream instead of running retrieval and generation again. A late
+# joiner replays the stream from the start, so it gets the prefix it missed.
+
+
+class SingleFlight:
+    def __init__(self, registry: StreamRegistry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, ReplayStream] = {}
+        self._coalesced = 0
+
+    def claim(self, key: Hashable, owner: str) -> Tuple[ReplayStream, bool]:
+        """The in-flight stream for `key` and False, or a new stream and True (the caller leads it)."""
+        with self._lock:
+            stream = self._flights.get(key)
+            if stream is not None and stream.subscribe(owner):
+                self._coalesced += 1
+                count_cache("single_flight", "hit")
+                return stream, False
+            stream = self.registry.create(owner)
+            self._flights[key] = stream
+        count_cache("single_flight", "miss")
+        stream.on_close(lambda: self._release(key, stream))
+        return stream, True
+
+    def _release(self, key: Hashable, stream: ReplayStream):
+        with self._lock:
+            if self._flights.get(key) is stream:
+                del self._flights[key]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._flights), "coalesced": self._coalesced}
+
+
+single_flight = SingleFlight(stream_registry)
+
+
+def parse_last_event_id(value) -> int:
+    """Last-Event-ID header (or ?last_event_id=) as an int; -1 replays from the start."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
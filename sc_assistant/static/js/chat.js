@@ -40,9 +40,12 @@ $(document).ready(function() {
   let isNewConversation = true;
   let activeConversationId = null;
   let isHistoryLoading = false;
+  let conversationCursor = null;
   
   // Globals for generation state
   let currentController = null; 
+  let currentStreamId = null;      // server-side replay stream of the answer being generated
+  const STREAM_RESUME_ATTEMPTS = 3;
   let currentAssistantMessageId = null;
   let currentFullAnswerText = "";
 
@@ -311,25 +314,8 @@ $(document).ready(function() {
     );
     if (noChats.length) noChats.remove();
 
-    const safeTitle = (title || 'Untitled Chat')
-      .replace(/</g, '&lt;')
-      .replace(/>/g, '&gt;');
-
-    const item = $(`
-      <div class="conversation-item" data-id="${convId}">
-        <div class="conv-main">
-          <i class="fas fa-comment-alt"></i>
-          <span>${safeTitle}</span>
-        </div>
-        <div class="conv-actions">
-          <button class="delete-btn" title="Delete">
-            <i class="fas fa-trash"></i>
-          </button>
-        </div>
-      </div>
-    `);
-
-    conversationList.prepend(item);
+    conversationList.find(`.conversation-item[data-id="${convId}"]`).remove();
+    conversationList.prepend($(conversationItemHtml(convId, title)));
     applyActiveHighlight();
   }
 
@@ -358,12 +344,62 @@ $(document).ready(function() {
     const formData = new FormData();
     formData.append("msg", message);
     if (imageFile) formData.append("image", imageFile);
+    // Optional per-client SSE frame window in ms (0 = every token), e.g. localStorage.sseFrameMs = "60"
+    const frameMs = localStorage.getItem('sseFrameMs');
+    if (frameMs !== null) formData.append("frame_ms", frameMs);
 
     currentController = new AbortController();
+    currentStreamId = null;
     const signal = currentController.signal;
+    const assistantBubble = $(`#${assistantMessageId}`).find('.streaming-text');
+    let isFirstToken = true;
+    let lastEventId = null;
+    let finished = false;
+
+    function handleEvent(data) {
+        if (data.type === 'stream') {
+            currentStreamId = data.stream_id;
+        } else if (data.type === 'chunk' || data.type === 'snapshot') {
+            if (isFirstToken) { typingIndicator.addClass('fade-out').hide(); isFirstToken = false; }
+            // A snapshot (after a long disconnect) carries the whole answer so far
+            currentFullAnswerText = data.type === 'snapshot' ? data.text : currentFullAnswerText + data.text;
+            assistantBubble.html(renderCitations(currentFullAnswerText));
+            messagesContainer[0].scrollTop = messagesContainer[0].scrollHeight;
+        } else if (data.type === 'busy') {
+            // Overloaded: the server did not start this answer, tell the user when to retry
+            typingIndicator.addClass('fade-out').hide();
+            assistantBubble.html(`<em><i class="fas fa-hourglass-half"></i> ${data.text}</em>`);
+            finished = true;
+        } else if (data.type === 'done' || data.type === 'error') {
+            finished = true;
+        }
+    }
+
+    async function readEvents(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let pending = "";
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            // A frame can be split across reads; keep the unfinished last line for the next one
+            pending += decoder.decode(value, { stream: true });
+            const lines = pending.split('\n');
+            pending = lines.pop();
+            for (const line of lines) {
+                if (line.startsWith('id: ')) {
+                    lastEventId = line.substring(4);
+                } else if (line.startsWith('data: ')) {
+                    handleEvent(JSON.parse(line.substring(6)));
+                }
+            }
+        }
+    }
 
     try {
-        const response = await fetch('/chat/get', {
+        let response = await fetch('/chat/get', {
             method: 'POST',
             body: formData,
             signal: signal 
@@ -371,27 +407,30 @@ $(document).ready(function() {
 
         if (!response.ok) throw new Error("Network response was not ok");
 
-        const assistantBubble = $(`#${assistantMessageId}`).find('.streaming-text');
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let isFirstToken = true;
-
+        let attempt = 0;
         while (true) {
-            const { done, value } = await reader.read();
-            if (done) break;
-
-            const lines = decoder.decode(value, { stream: true }).split('\n');
-            for (const line of lines) {
-                if (line.startsWith('data: ')) {
-                    const data = JSON.parse(line.substring(6));
-                    if (data.type === 'chunk') {
-                        if (isFirstToken) { typingIndicator.addClass('fade-out').hide(); isFirstToken = false; }
-                        currentFullAnswerText += data.text;
-                        assistantBubble.html(renderCitations(currentFullAnswerText));
-                        messagesContainer[0].scrollTop = messagesContainer[0].scrollHeight;
-                    }
+            if (response) {
+                try {
+                    await readEvents(response);
+                } catch (err) {
+                    if (err.name === 'AbortError') throw err;
                 }
             }
+            if (finished || !currentStreamId || attempt >= STREAM_RESUME_ATTEMPTS) break;
+
+            // 🚀 Connection dropped mid-answer: the server kept generating, pick up after the last event seen
+            attempt += 1;
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** (attempt - 1)));
+            try {
+                response = await fetch(`/chat/stream/${currentStreamId}`, {
+                    headers: lastEventId !== null ? { 'Last-Event-ID': lastEventId } : {},
+                    signal: signal
+                });
+                if (!response.ok) response = null;
+            } catch (err) {
+                if (err.name === 'AbortError') throw err;
+                response = null;
+            }
         }
     } catch (err) {
         if (err.name === 'AbortError') {
@@ -406,6 +445,7 @@ $(document).ready(function() {
         }
     } finally {
         currentController = null;
+        currentStreamId = null;
         typingIndicator.addClass('fade-out');
         setTimeout(() => typingIndicator.hide(), 300);
         sendButton.html('<i class="fas fa-paper-plane"></i>').css({'background-color': '', 'color': ''});
@@ -417,6 +457,10 @@ $(document).ready(function() {
   sendButton.on('click', function(e) {
       if (currentController) {
           e.preventDefault(); // Stop the form submission cycle immediately
+          // Generation no longer stops on disconnect, so tell the server explicitly
+          if (currentStreamId) {
+              fetch(`/chat/stream/${currentStreamId}/stop`, { method: 'POST' }).catch(() => {});
+          }
           currentController.abort(); // Triggers the AbortError in the catch block instantly
       }
   });
@@ -453,45 +497,51 @@ $(document).ready(function() {
   });
 
   // --- Conversation History Loading ---
-  function loadConversations() {
+  // Sidebar history is paged by the server (newest first); more pages load on scroll
+  function conversationItemHtml(convId, title) {
+    const safeTitle = (title || 'Untitled Chat')
+      .replace(/</g, '&lt;')
+      .replace(/>/g, '&gt;');
+    return `
+      <div class="conversation-item" data-id="${convId}">
+        <div class="conv-main">
+          <i class="fas fa-comment-alt"></i>
+          <span>${safeTitle}</span>
+        </div>
+        <div class="conv-actions">
+          <button class="delete-btn" title="Delete">
+            <i class="fas fa-trash"></i>
+          </button>
+        </div>
+      </div>
+    `;
+  }
+
+  function loadConversations(reset = true) {
     if (isHistoryLoading) return;
+    if (!reset && !conversationCursor) return;
     isHistoryLoading = true;
 
     conversationHistoryLoader.show();
-    conversationList.empty();
+    if (reset) {
+      conversationList.empty();
+      conversationCursor = null;
+    }
 
-    $.getJSON('/chat/conversations')
-      .done(function(convs) {
-        if (!convs || convs.length === 0) {
+    $.getJSON('/chat/conversations', conversationCursor ? { cursor: conversationCursor } : {})
+      .done(function(page) {
+        const convs = (page && page.conversations) || [];
+        conversationCursor = page ? page.next_cursor : null;
+        if (reset && convs.length === 0) {
           conversationList.append(
             "<div class='conversation-item' style='pointer-events:none;'>No past chats</div>"
           );
           return;
         }
-        convs
-          .sort(
-            (a, b) =>
-              new Date(b.created_at) - new Date(a.created_at)
-          )
-          .forEach(c => {
-            const safeTitle = (c.title || 'Untitled Chat')
-              .replace(/</g, '&lt;')
-              .replace(/>/g, '&gt;');
-            const item = $(`
-              <div class="conversation-item" data-id="${c.conv_id}">
-                <div class="conv-main">
-                  <i class="fas fa-comment-alt"></i>
-                  <span>${safeTitle}</span>
-                </div>
-                <div class="conv-actions">
-                  <button class="delete-btn" title="Delete">
-                    <i class="fas fa-trash"></i>
-                  </button>
-                </div>
-              </div>
-            `);
-            conversationList.append(item);
-          });
+        convs.forEach(c => {
+          if (conversationList.find(`.conversation-item[data-id="${c.conv_id}"]`).length) return;
+          conversationList.append($(conversationItemHtml(c.conv_id, c.title)));
+        });
         applyActiveHighlight();
       })
       .fail(function() {
@@ -502,9 +552,20 @@ $(document).ready(function() {
       .always(function() {
         isHistoryLoading = false;
         conversationHistoryLoader.hide();
+        // Keep paging until the list overflows, so scrolling can trigger the next page
+        const menu = conversationList.closest('.menu')[0];
+        if (conversationCursor && menu && menu.scrollHeight <= menu.clientHeight) {
+          loadConversations(false);
+        }
       });
   }
 
+  conversationList.closest('.menu').on('scroll', function() {
+    if (this.scrollTop + this.clientHeight >= this.scrollHeight - 80) {
+      loadConversations(false);
+    }
+  });
+
   function loadSpecificConversation(convId) {
     if (convId === activeConversationId) return;
 
@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+from config import SSE_FRAME_MS, SSE_FRAME_BYTES, SSE_MAX_FRAME_MS
+
+try:
+    import orjson
+
+    def dumps(payload) -> str:
+        return orjson.dumps(payload).decode("utf-8")
+except ImportError:
+    import json
+
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(payload) -> str:
+        return _encoder.encode(payload)
+
+# ====== SSE Stream Writer ======
+# Fast models emit a chunk every few milliseconds. Sending each one as its own
+# SSE frame means thousands of tiny writes (and DOM re-renders in the browser)
+# per answer, so tokens are coalesced into one frame per time/size window. The
+# answer itself is kept as a list of parts and joined once at the end.
+
+
+def sse(payload: dict, event_id: Optional[int] = None) -> str:
+    if event_id is None:
+        return f"data: {dumps(payload)}\n\n"
+    return f"id: {event_id}\ndata: {dumps(payload)}\n\n"
+
+
+def client_frame_ms(requested) -> int:
+    """Frame window asked for by the client (`frame_ms`), clamped to 0..SSE_MAX_FRAME_MS."""
+    try:
+        value = int(requested)
+    except (TypeError, ValueError):
+        return SSE_FRAME_MS
+    return max(0, min(SSE_MAX_FRAME_MS, value))
+
+
+class StreamWriter:
+    """
+    Buffers streamed text and publishes a chunk event once `frame_ms` have
+    passed since the frame opened or `max_bytes` are pending. The first token is
+    always sent immediately so time-to-first-token is unaffected. frame_ms=0
+    sends every token as it arrives.
+
+    The producer only runs when a token arrives, so if the model stalls with
+    text buffered, the stream's followers (woken through `on_open`) call
+    flush_if_due() when the window expires (see ReplayStream.attach_writer).
+    Events are published under the writer's lock so frames from both sides go
+    out in order.
+    """
+
+    def __init__(self, publish: Callable[[dict], None], frame_ms: int = SSE_FRAME_MS, max_bytes: int = SSE_FRAME_BYTES):
+        self.publish = publish
+        self.window_s = frame_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.parts: List[str] = []      # the whole answer so far
+        self._lock = threading.Lock()
+        self._pending: List[str] = []   # text not yet sent
+        self._pending_bytes = 0
+        self._due_at: Optional[float] = None
+        self._sent_first = False
+        self.frames = 0
+        self.on_open: Optional[Callable[[], None]] = None   # called when text starts waiting for its window
+
+    def add(self, text: str):
+        """Adds a token, publishing the frame if its window is due."""
+        if not text:
+            return
+        with self._lock:
+            self.parts.append(text)
+            opened = not self._pending
+            if opened:
+                self._due_at = time.monotonic() + self.window_s
+            self._pending.append(text)
+            self._pending_bytes += len(text.encode("utf-8"))
+            if (
+                not self._sent_first
+                or self._pending_bytes >= self.max_bytes
+                or time.monotonic() >= self._due_at
+            ):
+                self._flush()
+            elif opened and self.on_open is not None:
+                self.on_open()
+
+    def flush(self):
+        """Publishes everything pending (nothing if nothing is)."""
+        with self._lock:
+            self._flush()
+
+    def flush_if_due(self) -> bool:
+        """Publishes the pending frame if its window has passed. False if there was nothing to send."""
+        with self._lock:
+            if self._due_at is not None and time.monotonic() >= self._due_at:
+                self._flush()
+                return True
+            return self._due_at is not None
+
+    def due_in(self) -> Optional[float]:
+        """Seconds until the pending frame is due, None if nothing is pending. Lock-free, a hint only."""
+        due_at = self._due_at
+        if due_at is None:
+            return None
+        return max(0.0, due_at - time.monotonic())
+
+    def _flush(self):
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._due_at = None
+        self._sent_first = True
+        self.frames += 1
+        self.publish({'type': 'chunk', 'text': text})
+
+    def answer(self) -> str:
+        return "".join(self.parts)
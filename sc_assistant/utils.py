@@ -2,15 +2,17 @@ from flask import session
 from jose import jwt
 import uuid
 
-def is_admin():
+def is_admin(sess=None):
     """Checks if current user is an admin."""
-    return session.get("role") == "admin"
+    sess = session if sess is None else sess
+    return sess.get("role") == "admin"
 
-def get_session_id():
+def get_session_id(sess=None):
     """Gets or creates a unique session ID."""
-    if "session_id" not in session:
-        session["session_id"] = str(uuid.uuid4())
-    return session["session_id"]
+    sess = session if sess is None else sess
+    if "session_id" not in sess:
+        sess["session_id"] = str(uuid.uuid4())
+    return sess["session_id"]
 
 def get_cognito_username():
     """
@@ -13,7 +13,8 @@ from langchain_core.messages import HumanMessage
 from langchain_huggingface import HuggingFaceEmbeddings 
 from langchain_openai import ChatOpenAI
 
-from config import OPENROUTER_API_KEY, FALLBACK_MODEL_NAME
+from config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, FALLBACK_MODEL_NAME
+from src.rate_limiter import call_openrouter, retry_after_seconds, INGESTION
 
 logger = logging.getLogger(__name__)
 
@@ -248,7 +249,7 @@ def get_vision_client() -> ChatOpenAI:
         _VISION_CLIENT = ChatOpenAI(
             model=FALLBACK_MODEL_NAME,
             openai_api_key=OPENROUTER_API_KEY,
-            openai_api_base="https://openrouter.ai/api/v1",
+            openai_api_base=OPENROUTER_BASE_URL,
             temperature=0.1,
             max_tokens=2048,
             default_headers={
@@ -276,6 +277,8 @@ def encode_image(img: Image.Image) -> str:
 def generate_image_caption(image: Image.Image, prompt: str = "Analyze this image.") -> str:
     """
     Gemini Vision OCR / table extraction with basic retry/backoff.
+    Calls are queued behind live chat traffic by the OpenRouter scheduler; a 429
+    pauses the shared scheduler instead of sleeping here.
     """
     chat = get_vision_client()
     img_base64 = encode_image(image)
@@ -290,7 +293,7 @@ def generate_image_caption(image: Image.Image, prompt: str = "Analyze this image
     last_err: Optional[Exception] = None
     for attempt in range(1, 4):
         try:
-            resp = chat.invoke([msg])
+            resp = call_openrouter(INGESTION, chat.invoke, [msg])
             
             # --- FIX FOR GEMINI 3 CONTENT BLOCKS ---
             answer_text = resp.content
@@ -304,6 +307,10 @@ def generate_image_caption(image: Image.Image, prompt: str = "Analyze this image
             
         except Exception as e:
             last_err = e
+            if retry_after_seconds(e) is not None:
+                # Already reported to the scheduler; the next acquire waits out Retry-After
+                logger.warning(f"Vision call rate limited (attempt {attempt}/3)")
+                continue
             sleep_s = min(8, 2 ** attempt)
             logger.warning(f"Vision call failed (attempt {attempt}/3): {type(e).__name__}: {e}. Sleeping {sleep_s}s")
             time.sleep(sleep_s)
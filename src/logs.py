@@ -0,0 +1,128 @@
+# src/logs.py
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE
+from src.metrics import LOG_RECORDS_DROPPED
+
+# ============================================================
+# STRUCTURED LOGGING
+# ============================================================
+# Request handlers only put log records on an in-memory queue; one listener
+# thread per worker formats them and writes to stdout. A full queue drops the
+# record (counted on /metrics) instead of stalling the request.
+#
+# Every record carries the id of the request that produced it, so one chat
+# turn can be followed across the pipeline threads. Extra fields passed as
+# `logger.info("...", extra={"stage": "rerank", ...})` become JSON keys.
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Third-party loggers that would otherwise log every HTTP call at INFO
+QUIET_LOGGERS = ("httpx", "httpcore", "urllib3", "botocore", "boto3", "openai", "pinecone")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+# A client's X-Request-Id is reused only if it looks like an id; anything else gets a new one
+CLIENT_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def bind_request_id(request_id: Optional[str] = None) -> str:
+    """Tags every record logged from this thread or task with `request_id` (a new one if not given or malformed)."""
+    if not request_id or not CLIENT_REQUEST_ID.fullmatch(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    return request_id
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+def in_request_context(fn):
+    """Wraps `fn` to log under the caller's request id; thread pools don't carry contextvars."""
+    request_id = request_id_var.get()
+
+    def run(*args, **kwargs):
+        token = request_id_var.set(request_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            request_id_var.reset(token)
+    return run
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id, extra fields, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts":     datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level":  record.levelname,
+            "logger": record.name,
+            "msg":    record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Runs on the logging thread: resolve everything that depends on it, but
+        # leave the (comparatively slow) JSON formatting to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging():
+    """Routes all logging through the queue to one stdout writer thread. Safe to call twice."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL.upper())
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(root.level, logging.WARNING))
+
+    _listener = QueueListener(handler.queue, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
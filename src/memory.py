@@ -0,0 +1,207 @@
+# src/memory.py
+import gc
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+from config import MEMORY_CHECK_INTERVAL_S, MEMORY_SOFT_LIMIT_MB, MEMORY_STRUCTURE_LIMITS_MB, MEMORY_EVICT_FRACTION
+from src.metrics import MEMORY_BYTES, MEMORY_ENTRIES, MEMORY_EVICTIONS, WORKER_RSS_BYTES
+from src.profiling import rss_bytes
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# MEMORY ACCOUNTING
+# ============================================================
+# Every long-lived in-process structure (the LangGraph checkpointer, the
+# embedding model, the BM25 encoder, the caches) registers a measure() that
+# returns (entry count, approximate bytes). Evictable ones also register an
+# evict(fraction) that drops roughly that share of their oldest entries.
+#
+# A background thread measures everything every MEMORY_CHECK_INTERVAL_S,
+# exports it on /metrics and enforces soft limits before the container's
+# hard limit is hit:
+# - a structure over its own limit (MEMORY_LIMITS, MB per name) is trimmed
+#   back under it;
+# - while worker RSS is over MEMORY_SOFT_LIMIT_MB, the largest evictable
+#   structure loses MEMORY_EVICT_FRACTION of its entries, one per check.
+#
+# Byte counts are estimates: large containers are sampled and objects shared
+# between entries are counted more than once.
+
+Measure = Callable[[], Tuple[int, Optional[int]]]
+Evict = Callable[[float], int]
+
+_ATOMIC = (str, bytes, bytearray, int, float, bool, complex, type(None))
+
+
+def approx_bytes(obj, sample: int = 64, _depth: int = 0) -> int:
+    """Deep size estimate of `obj`; containers over `sample` items are extrapolated from a sample."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, _ATOMIC) or _depth > 8:
+        return size
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        picked = items if len(items) <= sample else random.sample(items, sample)
+        inner = sum(approx_bytes(k, sample, _depth + 1) + approx_bytes(v, sample, _depth + 1) for k, v in picked)
+        return size + (inner * len(items) // len(picked) if picked else 0)
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items = list(obj)
+        picked = items if len(items) <= sample else random.sample(items, sample)
+        inner = sum(approx_bytes(v, sample, _depth + 1) for v in picked)
+        return size + (inner * len(items) // len(picked) if picked else 0)
+    if hasattr(obj, "__dict__"):
+        return size + approx_bytes(vars(obj), sample, _depth + 1)
+    return size
+
+
+class _Account:
+    __slots__ = ("name", "measure", "evict", "limit_bytes", "entries", "bytes", "evicted")
+
+    def __init__(self, name: str, measure: Measure, evict: Optional[Evict], limit_bytes: Optional[int]):
+        self.name = name
+        self.measure = measure
+        self.evict = evict
+        self.limit_bytes = limit_bytes
+        self.entries = 0
+        self.bytes: Optional[int] = None
+        self.evicted = 0
+
+
+def _structure_limits() -> Dict[str, int]:
+    """MEMORY_LIMITS, e.g. '{"graph_checkpoints": 300, "conversation_cache": 100}' (MB)."""
+    if not MEMORY_STRUCTURE_LIMITS_MB:
+        return {}
+    try:
+        return {name: int(mb * 1024 * 1024) for name, mb in json.loads(MEMORY_STRUCTURE_LIMITS_MB).items()}
+    except Exception as e:
+        logger.warning("Ignoring invalid MEMORY_LIMITS: %s", e)
+        return {}
+
+
+class MemoryRegistry:
+    def __init__(self, soft_limit_bytes: Optional[int], limits: Dict[str, int], evict_fraction: float):
+        self.soft_limit_bytes = soft_limit_bytes
+        self.limits = limits
+        self.evict_fraction = evict_fraction
+        self._lock = threading.Lock()
+        self._accounts: Dict[str, _Account] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._rss: Optional[int] = None
+
+    def register(self, name: str, measure: Measure, evict: Optional[Evict] = None):
+        """Adds a structure to the report; `evict` makes it a candidate for soft-limit eviction."""
+        with self._lock:
+            self._accounts[name] = _Account(name, measure, evict, self.limits.get(name))
+
+    def _measure(self, account: _Account):
+        try:
+            account.entries, account.bytes = account.measure()
+        except Exception as e:
+            logger.warning("Measuring %s failed: %s", account.name, e)
+            return
+        MEMORY_ENTRIES.labels(structure=account.name).set(account.entries)
+        if account.bytes is not None:
+            MEMORY_BYTES.labels(structure=account.name).set(account.bytes)
+
+    def _evict(self, account: _Account, fraction: float, reason: str):
+        fraction = min(1.0, max(0.05, fraction))
+        try:
+            removed = account.evict(fraction)
+        except Exception as e:
+            logger.warning("Evicting from %s failed: %s", account.name, e)
+            return
+        account.evicted += removed
+        MEMORY_EVICTIONS.labels(structure=account.name).inc(removed)
+        logger.warning("Evicted %d entries from %s (%s)", removed, account.name, reason, extra={
+            "structure": account.name, "fraction": round(fraction, 2), "bytes_before": account.bytes,
+        })
+        self._measure(account)
+
+    def check(self):
+        """Measures every structure and applies the soft limits once."""
+        with self._lock:
+            accounts = list(self._accounts.values())
+        for account in accounts:
+            self._measure(account)
+
+        for account in accounts:
+            if account.evict and account.limit_bytes and account.bytes and account.bytes > account.limit_bytes:
+                self._evict(account, 1 - account.limit_bytes / account.bytes, "structure limit")
+
+        self._rss = rss_bytes()
+        if self._rss is not None:
+            WORKER_RSS_BYTES.set(self._rss)
+        if self.soft_limit_bytes and self._rss and self._rss > self.soft_limit_bytes:
+            candidates = [a for a in accounts if a.evict and a.entries]
+            if candidates:
+                largest = max(candidates, key=lambda a: a.bytes or 0)
+                self._evict(largest, self.evict_fraction, f"worker RSS {self._rss // 2**20} MB over soft limit")
+                gc.collect()
+
+    def _run(self):
+        while True:
+            time.sleep(MEMORY_CHECK_INTERVAL_S)
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning("Memory check failed: %s", e)
+
+    def start(self):
+        """Starts the periodic check in this worker (call after gunicorn forks)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="memory-registry")
+                self._thread.start()
+
+    def snapshot(self, refresh: bool = True) -> dict:
+        if refresh:
+            with self._lock:
+                accounts = list(self._accounts.values())
+            for account in accounts:
+                self._measure(account)
+            self._rss = rss_bytes()
+        with self._lock:
+            structures = sorted(self._accounts.values(), key=lambda a: -(a.bytes or 0))
+            return {
+                "rss_bytes":        self._rss,
+                "soft_limit_bytes": self.soft_limit_bytes,
+                "structures": [
+                    {
+                        "name":        a.name,
+                        "entries":     a.entries,
+                        "bytes":       a.bytes,
+                        "limit_bytes": a.limit_bytes,
+                        "evictable":   a.evict is not None,
+                        "evicted":     a.evicted,
+                    }
+                    for a in structures
+                ],
+            }
+
+
+def evict_oldest(entries: dict, lock: Optional[threading.Lock] = None) -> Evict:
+    """evict() for an insertion- or LRU-ordered dict: drops the oldest share of its keys."""
+    def evict(fraction: float) -> int:
+        def drop():
+            victims = list(entries)[:max(1, int(len(entries) * fraction))] if entries else []
+            for key in victims:
+                entries.pop(key, None)
+            return len(victims)
+        if lock is None:
+            return drop()
+        with lock:
+            return drop()
+    return evict
+
+
+memory_registry = MemoryRegistry(
+    soft_limit_bytes=MEMORY_SOFT_LIMIT_MB * 1024 * 1024 if MEMORY_SOFT_LIMIT_MB else None,
+    limits=_structure_limits(),
+    evict_fraction=MEMORY_EVICT_FRACTION,
+)
@@ -0,0 +1,152 @@
+# src/metrics.py
+import os
+import time
+from typing import Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+
+# ============================================================
+# PROMETHEUS METRICS
+# ============================================================
+# Latency of every pipeline stage, per-model time-to-first-token and streaming
+# rate, cache hit/miss counts, AWS call latencies and live streams, served on
+# /metrics.
+#
+# Under gunicorn each worker has its own counters. With PROMETHEUS_MULTIPROC_DIR
+# set (the Dockerfile does), every worker writes its samples to files in that
+# directory and /metrics merges all of them, whichever worker serves the scrape.
+# gunicorn.conf.py clears the directory on start and drops dead workers' gauges.
+
+# Seconds; pipeline stages range from sub-ms cache hits to multi-second LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+STAGE_SECONDS = Histogram(
+    "sc_stage_seconds", "Wall time of one chat pipeline stage",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "sc_chat_request_seconds", "Chat request time from arrival to the end of its answer",
+    ["profile", "outcome"], buckets=LATENCY_BUCKETS,
+)
+TTFT_SECONDS = Histogram(
+    "sc_ttft_seconds", "Time from starting generation to the first streamed token",
+    ["model"], buckets=LATENCY_BUCKETS,
+)
+# Streamed chunks per second after the first one (OpenRouter sends ~1 token per chunk)
+TOKENS_PER_SECOND = Histogram(
+    "sc_generation_tokens_per_second", "Streaming rate of a chat answer",
+    ["model"], buckets=RATE_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "sc_cache_lookups_total", "Cache lookups by cache and result (hit / miss / stale)",
+    ["cache", "result"],
+)
+AWS_CALL_SECONDS = Histogram(
+    "sc_aws_call_seconds", "Latency of one AWS API call",
+    ["service", "operation", "outcome"], buckets=LATENCY_BUCKETS,
+)
+INFLIGHT_STREAMS = Gauge(
+    "sc_inflight_streams", "Chat answers currently being generated",
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_SECONDS = Histogram(
+    "sc_admission_queue_seconds", "Time a chat request waited for a generation slot",
+    ["priority"], buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTIONS = Counter(
+    "sc_admission_rejections_total", "Chat requests answered 'busy'", ["reason"],
+)
+MEMORY_ENTRIES = Gauge(
+    "sc_memory_entries", "Entries held by a long-lived in-process structure",
+    ["structure"], multiprocess_mode="livesum",
+)
+MEMORY_BYTES = Gauge(
+    "sc_memory_bytes", "Approximate bytes held by a long-lived in-process structure",
+    ["structure"], multiprocess_mode="livesum",
+)
+MEMORY_EVICTIONS = Counter(
+    "sc_memory_evictions_total", "Entries evicted to stay under a memory soft limit", ["structure"],
+)
+WORKER_RSS_BYTES = Gauge(
+    "sc_worker_rss_bytes", "Resident set size of the worker", multiprocess_mode="livesum",
+)
+LOG_RECORDS_DROPPED = Counter(
+    "sc_log_records_dropped_total", "Log records dropped because the log queue was full",
+)
+
+
+def stage_timer(stage: str):
+    """Times a pipeline stage; usable as a context manager or a decorator."""
+    return STAGE_SECONDS.labels(stage=stage).time()
+
+
+def count_cache(cache: str, result: str):
+    CACHE_LOOKUPS.labels(cache=cache, result=result).inc()
+
+
+class GenerationMeter:
+    """Time-to-first-token and streaming rate of one answer."""
+
+    def __init__(self, model: str):
+        self.model = model          # may be replaced once hedging picks a winner
+        self.started_at = time.monotonic()
+        self.first_at: Optional[float] = None
+        self.chunks = 0
+
+    def use_model(self, model: str):
+        self.model = model
+
+    def chunk(self):
+        if self.first_at is None:
+            self.first_at = time.monotonic()
+            TTFT_SECONDS.labels(model=self.model).observe(self.first_at - self.started_at)
+        self.chunks += 1
+
+    def finish(self):
+        if self.first_at is None or self.chunks < 2:
+            return
+        streaming_s = time.monotonic() - self.first_at
+        if streaming_s > 0:
+            TOKENS_PER_SECOND.labels(model=self.model).observe((self.chunks - 1) / streaming_s)
+
+
+# ── AWS call latency ──────────────────────────────────────
+# botocore passes the same `context` dict to before-call and after-call, so the
+# start time rides along with the request.
+
+def _before_aws_call(context=None, **kwargs):
+    if context is not None:
+        context["sc_started_at"] = time.monotonic()
+
+
+def _after_aws_call(event_name, context=None, http_response=None, **kwargs):
+    started = (context or {}).get("sc_started_at")
+    if started is None:
+        return
+    kind, service, operation = event_name.split(".", 2)
+    # after-call also fires for error responses, just before the ClientError is raised
+    failed = kind == "after-call-error" or getattr(http_response, "status_code", 200) >= 300
+    AWS_CALL_SECONDS.labels(
+        service=service, operation=operation, outcome="error" if failed else "ok"
+    ).observe(time.monotonic() - started)
+
+
+def instrument_boto3(client):
+    """Records the latency of every API call made through a boto3 client."""
+    client.meta.events.register("before-call.*.*", _before_aws_call)
+    client.meta.events.register("after-call.*.*", _after_aws_call)
+    client.meta.events.register("after-call-error.*.*", _after_aws_call)
+    return client
+
+
+def render() -> Tuple[bytes, str]:
+    """The /metrics payload, merged across workers in multiprocess mode."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,163 @@
+# src/profiling.py
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+from config import PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_TRACEMALLOC_FRAMES
+
+# ============================================================
+# ON-DEMAND PROFILING
+# ============================================================
+# Admin-triggered captures of what one running worker is doing. Nothing runs,
+# and nothing costs anything, until an admin asks.
+#
+# - sample_stacks(): every PROFILE_SAMPLE_INTERVAL_MS, records the Python stack
+#   of every thread in the worker (a wall-clock sample). The result is in
+#   collapsed-stack format ("frame;frame;frame count"), which flamegraph.pl
+#   and speedscope read directly, plus the top functions.
+# - diff_allocations(): turns on tracemalloc for a window, then reports the
+#   allocations that appeared during it and are still alive.
+#
+# The overhead is bounded. Captures are capped at PROFILE_MAX_SECONDS, and only
+# one capture runs per worker at a time. tracemalloc is switched off again at
+# the end, unless someone else had already started it.
+
+# Threads whose innermost frame is one of these are parked, not working
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("selectors.py", "select"), ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"), ("base_events.py", "_run_once"),
+}
+MAX_STACK_DEPTH = 64
+
+_capture_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Another capture is already running in this worker."""
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux), or None where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _clamp_seconds(seconds: float) -> float:
+    return max(0.5, min(float(seconds), PROFILE_MAX_SECONDS))
+
+
+def sample_stacks(seconds: float, include_idle: bool = False, top: int = 30) -> dict:
+    """Samples every thread's stack for `seconds`; returns collapsed stacks and top functions."""
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this worker")
+    try:
+        seconds = _clamp_seconds(seconds)
+        interval_s = PROFILE_SAMPLE_INTERVAL_MS / 1000
+        me = threading.get_ident()
+        labels: Dict[object, str] = {}          # code object -> "func (file:line)"
+        stacks: Counter = Counter()
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        rounds = 0
+
+        def label(code) -> str:
+            text = labels.get(code)
+            if text is None:
+                text = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            return text
+
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                leaf = frame.f_code
+                if not include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_FRAMES:
+                    continue
+                frames: List[str] = []
+                while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                    frames.append(label(frame.f_code))
+                    frame = frame.f_back
+                frames.reverse()
+                stacks[";".join([names.get(ident, str(ident))] + frames)] += 1
+                self_counts[frames[-1]] += 1
+                for name in set(frames):
+                    total_counts[name] += 1
+            rounds += 1
+            time.sleep(interval_s)
+
+        samples = sum(stacks.values())
+        return {
+            "pid":         os.getpid(),
+            "seconds":     seconds,
+            "interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+            "rounds":      rounds,
+            "samples":     samples,
+            "collapsed":   "\n".join(f"{stack} {n}" for stack, n in stacks.most_common()),
+            "top": [
+                {
+                    "function": name,
+                    "self":     n,
+                    "total":    total_counts[name],
+                    "self_pct": round(100 * n / samples, 1) if samples else 0.0,
+                }
+                for name, n in self_counts.most_common(top)
+            ],
+        }
+    finally:
+        _capture_lock.release()
+
+
+def diff_allocations(seconds: float, top: int = 25) -> dict:
+    """Traces allocations for `seconds`; returns the biggest that appeared and are still alive."""
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this worker")
+    started_here = False
+    try:
+        seconds = _clamp_seconds(seconds)
+        rss_before = rss_bytes()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            started_here = True
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        traced_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+        _capture_lock.release()
+
+    ignore = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ]
+    diffs = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "traceback")
+    diffs = [d for d in diffs if d.size_diff > 0][:top]
+    return {
+        "pid":          os.getpid(),
+        "seconds":      seconds,
+        "rss_before":   rss_before,
+        "rss_after":    rss_bytes(),
+        "traced_bytes": traced_bytes,
+        "peak_bytes":   peak_bytes,
+        "top": [
+            {
+                "size_diff":  d.size_diff,
+                "size":       d.size,
+                "count_diff": d.count_diff,
+                "traceback":  d.traceback.format(most_recent_first=True),
+            }
+            for d in diffs
+        ],
+    }
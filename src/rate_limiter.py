@@ -0,0 +1,185 @@
+# src/rate_limiter.py
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+from config import (
+    OPENROUTER_RPM, OPENROUTER_BURST, OPENROUTER_INGESTION_RESERVE, OPENROUTER_INTERACTIVE_WAIT_S
+)
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# OPENROUTER REQUEST SCHEDULER
+# ============================================================
+# Live chat, reranking and ingestion OCR all draw from the same OpenRouter
+# free-tier quota. Every call takes a token from one bucket; waiters are served
+# strictly by priority class, and ingestion additionally leaves a reserve of
+# tokens untouched so an admin upload can never starve live chat. A 429 (or a
+# Retry-After header) pauses the whole bucket instead of each caller sleeping
+# on its own.
+#
+# The bucket is per process: with several gunicorn workers, set OPENROUTER_RPM
+# to the account limit divided by the number of workers.
+
+INTERACTIVE = 0   # chat generation, query rewrite, vision on a live request
+RERANK      = 1
+INGESTION   = 2   # OCR / table extraction during uploads and index builds
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", RERANK: "rerank", INGESTION: "ingestion"}
+
+
+class RateLimitScheduler:
+    def __init__(self, rate_per_s: float, burst: int, ingestion_reserve: int = 0):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.ingestion_reserve = ingestion_reserve
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []          # [priority, seq] entries, lowest sorts first
+        self._seq = itertools.count()
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._overdrafts = 0
+        self._rate_limited = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_s)
+        self._last_refill = now
+
+    def _needed(self, priority: int) -> float:
+        return 1 + (self.ingestion_reserve if priority == INGESTION else 0)
+
+    def acquire(self, priority: int, timeout: Optional[float] = None, overdraft: bool = False) -> bool:
+        """
+        Waits for a request token. Returns False on timeout, unless `overdraft` is set,
+        in which case the token is taken anyway (the bucket goes negative and lower
+        priorities absorb the delay). Live chat uses overdraft so it is never refused.
+        The debt is capped at one burst, so steady overdrafts cannot push the bucket
+        so far negative that every later call waits out its full timeout.
+        """
+        entry = [priority, next(self._seq)]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiters.append(entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    is_head = min(self._waiters) == entry
+                    if is_head and now >= self._paused_until and self._tokens >= self._needed(priority):
+                        self._tokens -= 1
+                        self._granted[priority] += 1
+                        return True
+
+                    if deadline is not None and now >= deadline:
+                        if overdraft:
+                            self._tokens = max(self._tokens - 1, -float(self.burst))
+                            self._granted[priority] += 1
+                            self._overdrafts += 1
+                            return True
+                        return False
+
+                    # Sleep until a token should be available, the pause ends or we time out
+                    wait = max(0.0, self._paused_until - now)
+                    missing = self._needed(priority) - self._tokens
+                    if missing > 0:
+                        wait = max(wait, missing / self.rate_per_s)
+                    if deadline is not None:
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(timeout=max(0.01, wait) if is_head else max(0.01, min(wait, 1.0)))
+            finally:
+                self._waiters.remove(entry)
+                self._cond.notify_all()
+
+    async def acquire_async(self, priority: int, timeout: Optional[float] = None, overdraft: bool = False) -> bool:
+        """acquire() for the event loop: grabs a free token inline, only waits in a thread."""
+        if self.acquire(priority, timeout=0):
+            return True
+        return await asyncio.to_thread(self.acquire, priority, timeout, overdraft)
+
+    def penalize(self, retry_after_s: float):
+        """Pauses every priority class after OpenRouter signalled a rate limit."""
+        with self._cond:
+            self._rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after_s)
+            self._tokens = min(self._tokens, 0.0)
+            self._cond.notify_all()
+        logger.warning("OpenRouter rate limited, pausing %.1fs", retry_after_s, extra={"stage": "rate_limiter"})
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiters:
+                waiting[PRIORITY_NAMES[priority]] += 1
+            return {
+                "tokens":       round(self._tokens, 2),
+                "paused_for_s": round(max(0.0, self._paused_until - now), 1),
+                "waiting":      waiting,
+                "granted":      {PRIORITY_NAMES[p]: n for p, n in self._granted.items()},
+                "overdrafts":   self._overdrafts,
+                "rate_limited": self._rate_limited,
+            }
+
+
+openrouter_scheduler = RateLimitScheduler(
+    rate_per_s=OPENROUTER_RPM / 60.0,
+    burst=OPENROUTER_BURST,
+    ingestion_reserve=OPENROUTER_INGESTION_RESERVE,
+)
+
+
+def retry_after_seconds(err_or_response, default: float = 10.0) -> Optional[float]:
+    """
+    Returns how long to back off if `err_or_response` is a 429 (requests.Response,
+    requests.HTTPError or an openai.RateLimitError), else None.
+    """
+    # requests.Response is falsy for 4xx, so compare against None explicitly
+    response = getattr(err_or_response, "response", None)
+    if response is None:
+        response = err_or_response
+    status = getattr(response, "status_code", None)
+    if status is None:
+        status = getattr(err_or_response, "status_code", None)
+    if status != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except Exception:
+            return default
+
+
+def report_rate_limit(err_or_response) -> bool:
+    """Feeds a 429 back into the scheduler. Returns True if it was one."""
+    retry_after = retry_after_seconds(err_or_response)
+    if retry_after is None:
+        return False
+    openrouter_scheduler.penalize(retry_after)
+    return True
+
+
+def call_openrouter(priority: int, fn: Callable, *args, **kwargs):
+    """Runs an OpenRouter call once the scheduler grants it a token."""
+    if priority == INTERACTIVE:
+        openrouter_scheduler.acquire(priority, timeout=OPENROUTER_INTERACTIVE_WAIT_S, overdraft=True)
+    else:
+        openrouter_scheduler.acquire(priority)
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        report_rate_limit(e)
+        raise
@@ -0,0 +1,220 @@
+# src/tracing.py
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from src.logs import current_request_id
+from config import TRACE_DB_PATH, TRACE_SLOWEST_N, TRACE_SAMPLE_RATE, TRACE_SAMPLED_KEEP
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# SLOW-REQUEST FLIGHT RECORDER
+# ============================================================
+# Every /chat/get builds a Trace: a flat list of spans (name, parent, offset,
+# duration, attributes) covering admission, each pipeline stage and the
+# generation. When the request ends the recorder keeps it if it is among the
+# TRACE_SLOWEST_N slowest seen so far, or if it falls in the TRACE_SAMPLE_RATE
+# sample (the newest TRACE_SAMPLED_KEEP of those are kept). Everything else is
+# dropped, so the store stays small.
+#
+# Kept traces go to a SQLite file rather than process memory so the admin page
+# shows the same traces whichever gunicorn worker serves it.
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough to spot bloated prompts."""
+    return (len(text) + 3) // 4
+
+
+class Span:
+    def __init__(self, trace: "Trace", name: str, parent: Optional[str]):
+        self.trace = trace
+        self.name = name
+        self.parent = parent
+        self.attrs: Dict[str, object] = {}
+        self.started_at = 0.0
+        self.duration_ms: Optional[float] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self.started_at = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.monotonic() - self.started_at) * 1000
+        if exc is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.trace._add(self)
+        return False
+
+
+class Trace:
+    def __init__(self, **attrs):
+        # Always minted here: the request id may come from the client, and traces are stored
+        # by id, so reusing one would overwrite someone else's trace. The request id is kept
+        # alongside so a slow trace still leads straight to its log lines.
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = current_request_id()
+        self.started_iso = datetime.now(timezone.utc).isoformat()
+        self.started_at = time.monotonic()
+        self.attrs: Dict[str, object] = dict(attrs)
+        self._lock = threading.Lock()
+        self._spans: List[dict] = []
+
+    def span(self, name: str, parent: Optional[str] = None) -> Span:
+        """A span to use as a context manager; `parent` names the enclosing span."""
+        return Span(self, name, parent)
+
+    def record_span(self, name: str, started_at: float, parent: Optional[str] = None, **attrs):
+        """Adds a span that began at `started_at` (time.monotonic()) and ends now."""
+        span = Span(self, name, parent).set(**attrs)
+        span.started_at = started_at
+        span.duration_ms = (time.monotonic() - started_at) * 1000
+        self._add(span)
+
+    def event(self, name: str, parent: Optional[str] = None, **attrs):
+        """A zero-length span, e.g. a stage that was skipped."""
+        self.record_span(name, time.monotonic(), parent, **attrs)
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def _add(self, span: Span):
+        with self._lock:
+            self._spans.append({
+                "name":      span.name,
+                "parent":    span.parent,
+                "offset_ms": round((span.started_at - self.started_at) * 1000, 1),
+                "duration_ms": round(span.duration_ms, 1),
+                "attrs":     span.attrs,
+            })
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started_at) * 1000
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            # Parents before their children: earliest start first, longest first on ties
+            spans = sorted(self._spans, key=lambda s: (s["offset_ms"], -s["duration_ms"]))
+            return {
+                "trace_id":    self.trace_id,
+                "request_id":  self.request_id,
+                "started_at":  self.started_iso,
+                "duration_ms": round(self.elapsed_ms(), 1),
+                "attrs":       dict(self.attrs),
+                "spans":       spans,
+            }
+
+
+def trace_from_config(config: Optional[dict]) -> Trace:
+    """Pulls the request trace out of a LangGraph run config (a throwaway one if absent)."""
+    trace = ((config or {}).get("configurable") or {}).get("trace")
+    return trace if isinstance(trace, Trace) else Trace()
+
+
+class FlightRecorder:
+    def __init__(self, path: str, slowest_n: int, sample_rate: float, sampled_keep: int):
+        self.path = path
+        self.slowest_n = slowest_n
+        self.sample_rate = sample_rate
+        self.sampled_keep = sampled_keep
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS traces ("
+                " trace_id TEXT PRIMARY KEY, started_at TEXT, duration_ms REAL,"
+                " slow INTEGER, sampled INTEGER, summary TEXT, body TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS traces_by_duration ON traces (slow, duration_ms)")
+            self._conn = conn
+        return self._conn
+
+    def record(self, trace: Trace) -> bool:
+        """Keeps the trace if it is one of the slowest or sampled; returns whether it was kept."""
+        data = trace.to_dict()
+        sampled = random.random() < self.sample_rate
+        summary = {k: data["attrs"].get(k) for k in ("profile", "role", "model", "outcome", "ttft_ms", "question")}
+        try:
+            with self._lock:
+                db = self._db()
+                with db:
+                    floor = db.execute(
+                        "SELECT duration_ms FROM traces WHERE slow = 1 ORDER BY duration_ms DESC LIMIT 1 OFFSET ?",
+                        (self.slowest_n - 1,),
+                    ).fetchone()
+                    slow = floor is None or data["duration_ms"] > floor[0]
+                    if not (slow or sampled):
+                        return False
+                    db.execute(
+                        "INSERT OR REPLACE INTO traces VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (data["trace_id"], data["started_at"], data["duration_ms"], int(slow), int(sampled),
+                         json.dumps(summary, default=str), json.dumps(data, default=str)),
+                    )
+                    # Demote whatever fell out of the slowest N, then drop traces nothing keeps
+                    db.execute(
+                        "UPDATE traces SET slow = 0 WHERE slow = 1 AND trace_id NOT IN ("
+                        " SELECT trace_id FROM traces WHERE slow = 1 ORDER BY duration_ms DESC LIMIT ?)",
+                        (self.slowest_n,),
+                    )
+                    db.execute(
+                        "DELETE FROM traces WHERE slow = 0 AND (sampled = 0 OR trace_id NOT IN ("
+                        " SELECT trace_id FROM traces WHERE sampled = 1 ORDER BY started_at DESC LIMIT ?))",
+                        (self.sampled_keep,),
+                    )
+            return True
+        except sqlite3.Error as e:
+            logger.warning("Could not record trace %s: %s", data["trace_id"], e, extra={"stage": "tracing"})
+            return False
+
+    def list(self, kind: str = "slow", limit: int = 100) -> List[dict]:
+        """Summaries of kept traces: the slowest first, or (kind="sampled") the newest first."""
+        if kind == "sampled":
+            query = "SELECT trace_id, started_at, duration_ms, slow, sampled, summary FROM traces WHERE sampled = 1 ORDER BY started_at DESC LIMIT ?"
+        else:
+            query = "SELECT trace_id, started_at, duration_ms, slow, sampled, summary FROM traces WHERE slow = 1 ORDER BY duration_ms DESC LIMIT ?"
+        with self._lock:
+            rows = self._db().execute(query, (limit,)).fetchall()
+        return [
+            {"trace_id": r[0], "started_at": r[1], "duration_ms": r[2], "slow": bool(r[3]),
+             "sampled": bool(r[4]), **json.loads(r[5])}
+            for r in rows
+        ]
+
+    def get(self, trace_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db().execute("SELECT body FROM traces WHERE trace_id = ?", (trace_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def clear(self):
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("DELETE FROM traces")
+
+
+flight_recorder = FlightRecorder(
+    TRACE_DB_PATH,
+    slowest_n=TRACE_SLOWEST_N,
+    sample_rate=TRACE_SAMPLE_RATE,
+    sampled_keep=TRACE_SAMPLED_KEEP,
+)
@@ -44,6 +44,7 @@ from src.helper import (
 )
 
 from aws.s3 import upload_file_to_s3
+from src.rate_limiter import call_openrouter, INGESTION
 
 logger = logging.getLogger(__name__)
 
@@ -226,7 +227,7 @@ def detect_columns(fitz_page) -> List[fitz.Rect]:
     for i in range(len(boundaries) - 1):
         columns.append(fitz.Rect(boundaries[i], page_y0, boundaries[i + 1], page_y1))
 
-    logger.info(f"    Detected {len(columns)} column(s)")
+    logger.debug("    Detected %d column(s)", len(columns))
     return columns
 
 
@@ -343,7 +344,7 @@ def process_pdf(filepath: str, filename: str) -> List[Document]:
                 column_text = extract_columns_text(fitz_page)
                 if len(column_text.strip()) > len(extracted.strip()):
                     extracted = column_text
-                    logger.info(f"    p{page_num}: column-aware extraction used")
+                    logger.debug("    p%s: column-aware extraction used", page_num)
 
             # ── OCR decision ──
             ocr_needed = should_ocr_extracted_text(
@@ -354,7 +355,7 @@ def process_pdf(filepath: str, filename: str) -> List[Document]:
 
             page_type = "pdf"
             if ocr_needed:
-                logger.info(f"    p{page_num}: OCR triggered (word_boxes={word_boxes})")
+                logger.debug("    p%s: OCR triggered (word_boxes=%s)", page_num, word_boxes)
                 columns = detect_columns(fitz_page)
 
                 if len(columns) > 1:
@@ -443,7 +444,7 @@ def _extract_and_append_tables(
             if upload_file_to_s3(tmp_path, s3_key):
                 
                 # --- NEW: PYDANTIC STRUCTURED AI EXTRACTION ---
-                logger.info(f"Running structured table extraction for table {t_i} on page {page_num}")
+                logger.debug("Running structured table extraction for table %s on page %s", t_i, page_num)
                 chat = get_vision_client() 
                 structured_chat = chat.with_structured_output(ExtractedTable)
                 
@@ -456,7 +457,7 @@ def _extract_and_append_tables(
                 )
                 
                 try:
-                    result = structured_chat.invoke([msg])
+                    result = call_openrouter(INGESTION, structured_chat.invoke, [msg])
                     
                     # Convert the perfect JSON back into a clean, readable text block for Pinecone
                     # This builds rows like "Row: GE 1 | Readings in Philippine History | 3 | None | 3 | None | None"
@@ -607,7 +608,7 @@ def process_docx_linear(filepath: str, filename: str) -> List[Document]:
                     image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
                     image = preprocess_for_ocr(image)
                     context_str = " | ".join(context_buffer)
-                    logger.info(f"  OCRing inline image in {filename}")
+                    logger.debug("  OCRing inline image in %s", filename)
                     caption = generate_image_caption(
                         image,
                         prompt=(
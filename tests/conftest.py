@@ -0,0 +1,8 @@
+import os
+import sys
+
+# config refuses to import without these; the unit tests never call either service
+os.environ.setdefault("PINECONE_API_KEY", "local")
+os.environ.setdefault("OPENROUTER_API_KEY", "local")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
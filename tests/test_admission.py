@@ -0,0 +1,101 @@
+"""
+Chat admission control: capacity, per-user limits (queued requests included),
+the bounded queue and student-before-guest ordering.
+
+    pytest tests/
+"""
+import asyncio
+import threading
+import time
+
+from rag.admission import AdmissionController, Ticket, Rejection, STUDENT, GUEST
+
+
+def controller(capacity=1, per_user=2, queue_size=4, max_wait_s=5.0):
+    return AdmissionController(capacity=capacity, per_user=per_user, queue_size=queue_size, max_wait_s=max_wait_s)
+
+
+def admit_in_background(ctrl, user_key, priority, results, timeout=None):
+    thread = threading.Thread(target=lambda: results.append((user_key, ctrl.admit(user_key, priority, timeout))))
+    thread.start()
+    return thread
+
+
+def wait_for_waiters(ctrl, n):
+    deadline = time.monotonic() + 2.0
+    while len(ctrl._waiters) < n:
+        assert time.monotonic() < deadline, "request never queued"
+        time.sleep(0.005)
+
+
+def test_free_slot_is_granted_right_away():
+    ctrl = controller()
+    ticket = ctrl.admit("a", STUDENT)
+    assert isinstance(ticket, Ticket)
+    assert ctrl.snapshot()["active"] == 1
+    ctrl.release(ticket)
+    assert ctrl.snapshot()["active"] == 0
+
+
+def test_queued_requests_count_against_the_per_user_limit():
+    ctrl = controller(capacity=1, per_user=2)
+    first = ctrl.admit("a", STUDENT)
+    results = []
+    queued = admit_in_background(ctrl, "a", STUDENT, results)
+    wait_for_waiters(ctrl, 1)
+
+    # One running and one queued: a third request from the same user is refused at once
+    third = ctrl.admit("a", STUDENT, timeout=0)
+    assert isinstance(third, Rejection)
+    assert third.reason == "user_limit"
+    assert ctrl.snapshot()["rejected"]["user_limit"] == 1
+
+    ctrl.release(first)
+    queued.join(2.0)
+    assert isinstance(results[0][1], Ticket)
+    assert ctrl._queued == {}
+
+
+def test_queued_count_is_released_on_timeout():
+    ctrl = controller(capacity=1, per_user=2)
+    ctrl.admit("a", STUDENT)
+    rejected = ctrl.admit("a", STUDENT, timeout=0.05)
+    assert isinstance(rejected, Rejection) and rejected.reason == "timeout"
+    assert ctrl._queued == {}
+
+
+def test_full_queue_rejects():
+    ctrl = controller(capacity=1, per_user=1, queue_size=1)
+    ctrl.admit("a", STUDENT)
+    results = []
+    thread = admit_in_background(ctrl, "b", STUDENT, results, timeout=0.3)
+    wait_for_waiters(ctrl, 1)
+    rejected = ctrl.admit("c", STUDENT)
+    assert isinstance(rejected, Rejection) and rejected.reason == "queue_full"
+    assert rejected.retry_after_s >= 1
+    thread.join(2.0)
+
+
+def test_students_are_served_before_guests():
+    ctrl = controller(capacity=1, per_user=1)
+    running = ctrl.admit("x", STUDENT)
+    results = []
+    guest = admit_in_background(ctrl, "guest", GUEST, results)
+    wait_for_waiters(ctrl, 1)
+    student = admit_in_background(ctrl, "student", STUDENT, results)
+    wait_for_waiters(ctrl, 2)
+
+    ctrl.release(running)
+    student.join(2.0)
+    assert results[0][0] == "student"
+    ctrl.release(results[0][1])
+    guest.join(2.0)
+    assert results[1][0] == "guest"
+
+
+def test_admit_async_takes_a_free_slot_inline():
+    ctrl = controller(capacity=1)
+    ticket = asyncio.run(ctrl.admit_async("a", GUEST))
+    assert isinstance(ticket, Ticket)
+    rejected = asyncio.run(ctrl.admit_async("b", GUEST, timeout=0.05))
+    assert isinstance(rejected, Rejection) and rejected.reason == "timeout"
@@ -0,0 +1,130 @@
+"""
+Circuit breakers: opening on errors, the single half-open probe, and the
+probe slots hedged streaming takes and must hand back.
+
+    pytest tests/
+"""
+import time
+import uuid
+
+import pytest
+
+from rag.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker, CLOSED, OPEN, HALF_OPEN
+from rag.hedging import hedged_stream
+
+
+class Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeModel:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def stream(self, messages):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("model down")
+        yield Chunk("Hello")
+        yield Chunk(" there")
+
+
+def tripped(breaker: CircuitBreaker) -> CircuitBreaker:
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    return breaker
+
+
+def half_open(name: str) -> CircuitBreaker:
+    """A process-wide chat breaker whose cool-down has passed (the next allow() takes the probe)."""
+    breaker = tripped(get_breaker(f"chat:{name}", open_for_s=0.01))
+    time.sleep(0.02)
+    return breaker
+
+
+def test_opens_at_the_error_rate():
+    breaker = CircuitBreaker("t", window=10, min_calls=4, error_rate=0.5)
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "never runs")
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("t", min_calls=2, error_rate=0.5, slow_call_s=1.0)
+    breaker.record_success(latency_s=5.0)
+    breaker.record_success(latency_s=5.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = tripped(CircuitBreaker("t", open_for_s=0.01))
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_doubles_the_cool_down():
+    breaker = tripped(CircuitBreaker("t", open_for_s=0.01, max_open_for_s=1.0))
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker._open_for_s == pytest.approx(0.02)
+
+
+def test_cancelled_probe_frees_the_slot():
+    breaker = tripped(CircuitBreaker("t", open_for_s=0.01))
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_cancelled()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_cancel_does_not_close_or_count():
+    breaker = CircuitBreaker("t")
+    breaker.record_cancelled()
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["window_calls"] == 0
+
+
+def test_hedge_releases_the_probe_of_a_fallback_it_never_started():
+    primary, fallback = f"p-{uuid.uuid4().hex[:6]}", f"f-{uuid.uuid4().hex[:6]}"
+    breaker = half_open(fallback)
+    fallback_model = FakeModel()
+    chunks = list(hedged_stream([(primary, FakeModel()), (fallback, fallback_model)], [], max_delay=5.0))
+    assert [c.content for c in chunks] == ["Hello", " there"]
+    assert fallback_model.calls == 0
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_hedge_releases_the_probe_of_a_losing_fallback():
+    primary, fallback = f"p-{uuid.uuid4().hex[:6]}", f"f-{uuid.uuid4().hex[:6]}"
+    breaker = half_open(fallback)
+    models = [(primary, FakeModel(delay=0.05)), (fallback, FakeModel(delay=0.5))]
+    list(hedged_stream(models, [], max_delay=0.01))
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_hedge_probe_that_fails_reopens():
+    primary, fallback = f"p-{uuid.uuid4().hex[:6]}", f"f-{uuid.uuid4().hex[:6]}"
+    breaker = half_open(primary)
+    chunks = list(hedged_stream([(primary, FakeModel(fail=True)), (fallback, FakeModel())], [], max_delay=5.0))
+    assert chunks
+    assert breaker.state == OPEN
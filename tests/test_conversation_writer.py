@@ -0,0 +1,123 @@
+"""
+Write-behind conversation persistence: batching, coalescing queued versions of
+one conversation (keeping the lowest "persisted" count so no appended message
+is skipped), retries with backoff and dropping after max_attempts.
+
+    pytest tests/
+"""
+import threading
+import time
+
+from aws.conversation_writer import ConversationWriter
+
+
+class FakeTable:
+    """write_batch stand-in that records every batch and fails the first `failures` calls."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, items):
+        self.release.wait(5)
+        self.batches.append([dict(i) for i in items])
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("ProvisionedThroughputExceeded")
+
+
+def item(conv_id, messages, persisted, updated_at, uid="u1", **extra):
+    return {
+        "uid": uid, "conv_id": conv_id, "messages": messages, "message_count": len(messages),
+        "persisted": persisted, "updated_at": updated_at, **extra,
+    }
+
+
+def writer_for(table, **kwargs):
+    return ConversationWriter(table, flush_interval_s=kwargs.pop("flush_interval_s", 0.01), **kwargs)
+
+
+def test_queued_versions_coalesce_into_one_write():
+    table = FakeTable()
+    writer = writer_for(table, flush_interval_s=0.5)
+    writer.submit(item("c1", ["q1", "a1"], persisted=0, updated_at="t1"))
+    writer.submit(item("c1", ["q1", "a1", "q2", "a2"], persisted=2, updated_at="t2"))
+    assert writer.pending_item("u1", "c1")["updated_at"] == "t2"
+    assert writer.flush(5)
+
+    assert len(table.batches) == 1
+    written, = table.batches[0]
+    assert written["updated_at"] == "t2"
+    # The first version's messages were never stored, so the merged write starts from 0
+    assert written["persisted"] == 0
+    snap = writer.snapshot()
+    assert (snap["submitted"], snap["coalesced"], snap["written"]) == (2, 1, 1)
+
+
+def test_rehydrated_archive_survives_coalescing():
+    table = FakeTable()
+    writer = writer_for(table, flush_interval_s=0.5)
+    writer.submit(item("c1", ["q1"], 0, "t1", rehydrated_from="archive/u1/c1.jsonl.gz"))
+    writer.submit(item("c1", ["q1", "a1"], 0, "t2"))
+    assert writer.flush(5)
+    assert table.batches[0][0]["rehydrated_from"] == "archive/u1/c1.jsonl.gz"
+
+
+def test_different_conversations_share_a_batch():
+    table = FakeTable()
+    writer = writer_for(table, flush_interval_s=0.5, batch_size=25)
+    for n in range(3):
+        writer.submit(item(f"c{n}", ["q"], 0, "t1"))
+    assert writer.flush(5)
+    assert [len(b) for b in table.batches] == [3]
+
+
+def test_failed_write_is_retried():
+    table = FakeTable(failures=1)
+    writer = writer_for(table)
+    writer.submit(item("c1", ["q1", "a1"], 0, "t1"))
+    assert writer.flush(5)
+    assert len(table.batches) == 2
+    snap = writer.snapshot()
+    assert (snap["retries"], snap["written"], snap["dropped"]) == (1, 1, 0)
+    assert writer.pending_item("u1", "c1") is None
+
+
+def test_write_is_dropped_after_max_attempts():
+    table = FakeTable(failures=10)
+    writer = writer_for(table, max_attempts=1)
+    writer.submit(item("c1", ["q1"], 0, "t1"))
+    assert writer.flush(5)
+    snap = writer.snapshot()
+    assert (snap["dropped"], snap["written"]) == (1, 0)
+
+
+def test_newer_version_takes_over_a_failed_write():
+    table = FakeTable(failures=1)
+    table.release.clear()
+    writer = writer_for(table)
+    writer.submit(item("c1", ["q1", "a1"], persisted=0, updated_at="t1"))
+    # While the first write is in flight (and about to fail), the next turn is queued
+    while writer.snapshot()["inflight"] == 0:
+        time.sleep(0.001)
+    assert writer.pending_item("u1", "c1")["updated_at"] == "t1"
+    writer.submit(item("c1", ["q1", "a1", "q2", "a2"], persisted=2, updated_at="t2"))
+    table.release.set()
+    assert writer.flush(5)
+
+    last = table.batches[-1][0]
+    assert last["updated_at"] == "t2"
+    assert last["persisted"] == 0
+    assert writer.snapshot()["written"] == 1
+
+
+def test_discard_drops_a_queued_write():
+    table = FakeTable()
+    writer = writer_for(table, flush_interval_s=0.5)
+    writer.submit(item("c1", ["q1"], 0, "t1"))
+    writer.discard("u1", "c1")
+    assert writer.pending_item("u1", "c1") is None
+    assert writer.flush(1)
+    assert table.batches == []
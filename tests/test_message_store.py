@@ -0,0 +1,78 @@
+"""
+Pure helpers behind the DynamoDB conversation store: the versioned message
+codec, paging an in-memory message list, and the sidebar's page cursors.
+Nothing here talks to AWS.
+
+    pytest tests/
+"""
+import pytest
+from boto3.dynamodb.types import Binary
+
+from aws.dynamodb import (
+    encode_message_body, decode_message_body, page_messages, conversation_item,
+    _encode_cursor, _decode_cursor, zstandard, CODEC_FORMAT, MESSAGE_COMPRESS_MIN_BYTES,
+)
+
+LONG = "Tuition for the BS in Business Administration depends on the enrolled units. " * 40
+CODECS = ["gzip"] + (["zstd"] if zstandard is not None else [])
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_long_bodies_are_compressed_and_round_trip(codec):
+    attrs = encode_message_body(LONG, codec=codec)
+    assert "content" not in attrs
+    assert attrs["codec"] == f"{codec}:{CODEC_FORMAT}"
+    assert len(attrs["body"]) < len(LONG.encode("utf-8"))
+    assert decode_message_body(attrs) == LONG
+    # boto3 hands binary attributes back wrapped in Binary
+    assert decode_message_body({**attrs, "body": Binary(attrs["body"])}) == LONG
+
+
+def test_short_and_uncompressed_bodies_stay_plain():
+    short = "x" * (MESSAGE_COMPRESS_MIN_BYTES - 1)
+    assert encode_message_body(short, codec="gzip") == {"content": short}
+    assert encode_message_body(LONG, codec="none") == {"content": LONG}
+
+
+def test_plain_legacy_items_decode_as_is():
+    assert decode_message_body({"content": "hello"}) == "hello"
+    assert decode_message_body({}) == ""
+
+
+def test_non_ascii_round_trips():
+    text = "Salamat po! Ang matrikula ay ₱12,500 — bayaran sa Accounting Office. " * 20
+    assert decode_message_body(encode_message_body(text, codec="gzip")) == text
+
+
+def test_newer_codec_version_is_refused():
+    attrs = encode_message_body(LONG, codec="gzip")
+    with pytest.raises(ValueError):
+        decode_message_body({**attrs, "codec": f"gzip:{CODEC_FORMAT + 1}"})
+    with pytest.raises(ValueError):
+        decode_message_body({**attrs, "codec": "brotli:1"})
+
+
+def test_page_messages_walks_back_from_the_latest():
+    messages = list(range(10))
+    assert page_messages(messages) == (messages, None)
+    assert page_messages(messages, limit=4) == ([6, 7, 8, 9], 6)
+    assert page_messages(messages, limit=4, before=6) == ([2, 3, 4, 5], 2)
+    assert page_messages(messages, limit=4, before=2) == ([0, 1], None)
+    assert page_messages(messages, limit=4, before=99) == ([6, 7, 8, 9], 6)
+
+
+def test_conversation_item_records_what_is_already_stored():
+    history = [{"role": "user", "content": "What are the admission requirements?"},
+               {"role": "assistant", "content": "Form 138 and a PSA birth certificate."}]
+    item = conversation_item("u1", "c1", history, "2024-06-01T00:00:00+00:00", persisted=1, updated_at="v2")
+    assert item["message_count"] == 2
+    assert item["persisted"] == 1
+    assert item["updated_at"] == "v2"
+    assert item["title"] == "What are the admission requirements?"[:40]
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    key = {"uid": "u1", "conv_id": "c1", "updated_at": "2024-06-01T00:00:00+00:00"}
+    assert _decode_cursor(_encode_cursor(key)) == key
+    with pytest.raises(ValueError):
+        _decode_cursor("not a cursor")
@@ -0,0 +1,60 @@
+"""
+Local query rewriter: self-contained questions must pass through untouched,
+follow-ups get terms from the conversation.
+
+    pytest tests/
+"""
+import pytest
+
+from rag.query_rewriter import LocalQueryRewriter, detect_reference_cues
+
+
+class SameVectorEmbeddings:
+    """Every text embeds to the same unit vector, so every earlier turn is a perfect match."""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+
+HISTORY = [
+    {"role": "user", "content": "What programs does the College of Business offer?"},
+    {"role": "assistant", "content": "The College of Business offers BS in Business Administration."},
+]
+
+
+@pytest.fixture
+def rewriter():
+    return LocalQueryRewriter(SameVectorEmbeddings())
+
+
+@pytest.mark.parametrize("question", [
+    "Is there a dormitory?",
+    "Are there scholarships for athletes?",
+    "What subjects are offered this semester?",
+    "Is this school accredited by CHED?",
+    "Does that office open on Saturdays?",
+    "Can I take more than one major?",
+    "Where is the library?",
+    "When was the college founded?",
+])
+def test_plain_questions_are_not_rewritten(rewriter, question):
+    assert detect_reference_cues(question) == []
+    result = rewriter.rewrite(question, HISTORY)
+    assert result.query == question
+    assert not result.ambiguous
+    assert result.injected_terms == []
+
+
+@pytest.mark.parametrize("question", [
+    "What are the admission requirements for it?",
+    "How do I apply for that?",
+    "How much is the tuition for that one?",
+    "What about the fees?",
+    "Requirements?",
+])
+def test_follow_ups_get_history_terms(rewriter, question):
+    result = rewriter.rewrite(question, HISTORY)
+    assert not result.ambiguous
+    assert result.injected_terms
+    assert result.query.startswith(question)
+    assert "Business" in result.injected_terms
@@ -0,0 +1,74 @@
+"""
+OpenRouter request scheduler: token bucket, priority reserve, overdraft debt
+and the 429 back-off parsing.
+
+    pytest tests/
+"""
+import time
+
+from src.rate_limiter import (
+    RateLimitScheduler, retry_after_seconds, INTERACTIVE, RERANK, INGESTION
+)
+
+# Slow enough that no token refills while a test runs
+TRICKLE = 0.001
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def drain(scheduler, n):
+    for _ in range(n):
+        assert scheduler.acquire(INTERACTIVE, timeout=0)
+
+
+def test_empty_bucket_times_out_without_overdraft():
+    scheduler = RateLimitScheduler(rate_per_s=TRICKLE, burst=2)
+    drain(scheduler, 2)
+    assert scheduler.acquire(RERANK, timeout=0.05) is False
+
+
+def test_overdraft_debt_is_capped_at_one_burst():
+    scheduler = RateLimitScheduler(rate_per_s=TRICKLE, burst=3)
+    drain(scheduler, 3)
+    for _ in range(20):
+        assert scheduler.acquire(INTERACTIVE, timeout=0, overdraft=True)
+    snap = scheduler.snapshot()
+    assert snap["overdrafts"] == 20
+    assert snap["tokens"] >= -3.0
+    assert snap["tokens"] < -2.9
+
+
+def test_debt_recovers_within_one_burst_of_refill():
+    scheduler = RateLimitScheduler(rate_per_s=100.0, burst=3)
+    drain(scheduler, 3)
+    for _ in range(50):
+        scheduler.acquire(INTERACTIVE, timeout=0, overdraft=True)
+    # Three tokens of debt plus the one needed take 40 ms at 100/s, however many overdrafts there were
+    started = time.monotonic()
+    assert scheduler.acquire(RERANK, timeout=1.0)
+    assert time.monotonic() - started < 0.5
+
+
+def test_ingestion_leaves_the_reserve_to_live_chat():
+    scheduler = RateLimitScheduler(rate_per_s=TRICKLE, burst=3, ingestion_reserve=2)
+    assert scheduler.acquire(INGESTION, timeout=0)         # 3 tokens: 1 + reserve of 2
+    assert not scheduler.acquire(INGESTION, timeout=0)     # 2 left, all reserved
+    assert scheduler.acquire(INTERACTIVE, timeout=0)
+
+
+def test_penalize_pauses_every_class():
+    scheduler = RateLimitScheduler(rate_per_s=TRICKLE, burst=5)
+    scheduler.penalize(10)
+    assert not scheduler.acquire(INTERACTIVE, timeout=0.05)
+    assert scheduler.snapshot()["paused_for_s"] > 9
+
+
+def test_retry_after_parsing():
+    assert retry_after_seconds(FakeResponse(200)) is None
+    assert retry_after_seconds(FakeResponse(429, {"Retry-After": "7"})) == 7.0
+    assert retry_after_seconds(FakeResponse(429), default=3.0) == 3.0
+    assert retry_after_seconds(FakeResponse(429, {"retry-after": "soon"}), default=4.0) == 4.0
@@ -0,0 +1,150 @@
+"""
+Resumable streams and SSE frame coalescing: resuming after Last-Event-ID, the
+snapshot sent to a client that fell out of the replay buffer, stop handling
+with several followers, and the frame windows of StreamWriter.
+
+    pytest tests/
+"""
+import asyncio
+import json
+import time
+
+from sc_assistant.replay import ReplayStream, KEEPALIVE
+from sc_assistant.stream_writer import StreamWriter
+
+
+def events(frames):
+    """(event id, payload) of each SSE frame, skipping keepalives."""
+    out = []
+    for frame in frames:
+        if frame == KEEPALIVE:
+            continue
+        head, data = frame.split("\n", 1)
+        out.append((int(head[len("id: "):]), json.loads(data[len("data: "):].strip())))
+    return out
+
+
+def finished_stream(texts, max_frames=100):
+    stream = ReplayStream("owner", max_frames=max_frames)
+    for text in texts:
+        stream.publish({"type": "chunk", "text": text})
+    stream.publish({"type": "done"})
+    stream.close()
+    return stream
+
+
+def test_follow_replays_everything_after_last_event_id():
+    stream = finished_stream(["a", "b", "c"])
+    assert [p.get("text") for _, p in events(stream.follow())] == ["a", "b", "c", None]
+    resumed = events(stream.follow(last_seq=1))
+    assert [seq for seq, _ in resumed] == [2, 3]
+    assert resumed[0][1] == {"type": "chunk", "text": "c"}
+
+
+def test_client_that_fell_out_of_the_buffer_gets_a_snapshot():
+    texts = [f"t{i} " for i in range(10)]
+    stream = finished_stream(texts, max_frames=4)     # keeps seqs 7..10: three chunks and done
+    resumed = events(stream.follow(last_seq=2))
+    seq, snapshot = resumed[0]
+    assert snapshot == {"type": "snapshot", "text": "".join(texts)}
+    assert seq == stream.last_chunk_seq == 9
+    # Only what came after the last chunk follows the snapshot
+    assert resumed[1:] == [(10, {"type": "done"})]
+
+
+def test_snapshot_mid_stream_continues_with_later_chunks():
+    stream = ReplayStream("owner", max_frames=3)
+    for text in ["a", "b", "c", "d", "e"]:
+        stream.publish({"type": "chunk", "text": text})
+    with stream._cond:
+        frames, done = stream._after(0)
+    resumed = events(frames)
+    assert not done
+    assert resumed[0] == (4, {"type": "snapshot", "text": "abcde"})
+    assert len(resumed) == 1
+
+
+def test_generation_stops_only_when_every_follower_stops():
+    stream = ReplayStream("a")
+    assert stream.subscribe("b")
+    stream.publish({"type": "chunk", "text": "one "})
+    stream.cancel("a")
+    assert not stream.cancelled.is_set()
+    stream.publish({"type": "chunk", "text": "two"})
+    stream.cancel("b")
+    assert stream.cancelled.is_set()
+    assert stream.answer_for("a") == ("one ", True)
+    assert stream.answer_for("b") == ("one two", True)
+    assert stream.answer_for("c") == ("one two", False)
+
+
+def test_subscribe_after_close_is_refused():
+    stream = finished_stream(["x"])
+    assert not stream.subscribe("late")
+
+
+def test_writer_sends_the_first_token_then_coalesces():
+    published = []
+    writer = StreamWriter(published.append, frame_ms=1000, max_bytes=1024)
+    for text in ["Hel", "lo", " wor", "ld"]:
+        writer.add(text)
+    assert published == [{"type": "chunk", "text": "Hel"}]
+    writer.flush()
+    assert published[1] == {"type": "chunk", "text": "lo world"}
+    assert writer.answer() == "Hello world"
+    assert writer.frames == 2
+
+
+def test_writer_flushes_at_max_bytes():
+    published = []
+    writer = StreamWriter(published.append, frame_ms=1000, max_bytes=4)
+    for text in ["a", "bb", "cc", "d"]:
+        writer.add(text)
+    assert [p["text"] for p in published] == ["a", "bbcc"]
+
+
+def test_zero_window_sends_every_token():
+    published = []
+    writer = StreamWriter(published.append, frame_ms=0)
+    for text in ["a", "b", "c"]:
+        writer.add(text)
+    assert [p["text"] for p in published] == ["a", "b", "c"]
+
+
+def test_follower_flushes_a_frame_the_stalled_producer_left_buffered():
+    stream = ReplayStream("owner")
+    writer = StreamWriter(stream.publish, frame_ms=30)
+    stream.attach_writer(writer)
+    writer.add("first")
+    writer.add(" buffered")       # the model now stalls: nothing else calls the writer
+
+    started = time.monotonic()
+    chunks = []
+    for frame in stream.follow():
+        for _seq, payload in events([frame]):
+            chunks.append(payload["text"])
+        if len(chunks) == 2 or time.monotonic() - started > 2.0:
+            break
+    assert chunks == ["first", " buffered"]
+    assert time.monotonic() - started < 1.0
+    assert writer.due_in() is None
+
+
+def test_async_follower_flushes_a_stalled_frame_too():
+    stream = ReplayStream("owner")
+    writer = StreamWriter(stream.publish, frame_ms=30)
+    stream.attach_writer(writer)
+    writer.add("first")
+    writer.add(" buffered")
+
+    async def first_two():
+        chunks = []
+        async for frame in stream.afollow():
+            for _seq, payload in events([frame]):
+                chunks.append(payload["text"])
+            if len(chunks) == 2:
+                return chunks
+
+    started = time.monotonic()
+    assert asyncio.run(asyncio.wait_for(first_two(), timeout=5)) == ["first", " buffered"]
+    assert time.monotonic() - started < 1.0